@@ -27,19 +27,24 @@ Author: tjado <https://github.com/tejado>
 
 import argparse
 import codecs
+import copy
 import json
 import logging
+import multiprocessing
 import os
 import ssl
 import sys
 import time
 import signal
+import threading
 from datetime import timedelta
 from getpass import getpass
 from pgoapi.exceptions import NotLoggedInException, ServerSideRequestThrottlingException, ServerBusyOrOfflineException
 from geopy.exc import GeocoderQuotaExceeded
+from eventlet import hubs
 
-from pokemongo_bot import PokemonGoBot, TreeConfigBuilder
+from pokemongo_bot import PokemonGoBot, TreeConfigBuilder, preload_static_data
+from pokemongo_bot.socketio_server.runner import start_embedded_server
 from pokemongo_bot.base_dir import _base_dir
 from pokemongo_bot.health_record import BotEvent
 from pokemongo_bot.plugin_loader import PluginLoader
@@ -63,7 +68,8 @@ logger.setLevel(logging.INFO)
 class SIGINTRecieved(Exception): pass
 
 def main():
-    bot = False
+    # the current bot of every account
+    bots = []
 
     def handle_sigint(*args):
         raise SIGINTRecieved
@@ -82,11 +88,64 @@ def main():
         health_record = BotEvent(config)
         health_record.login_success()
 
-        finished = False
+        configs = account_configs(config)
+        if len(configs) == 1:
+            bots.append(None)
+            run_bot(configs[0], health_record, bots, 0)
+        elif config.pool_processes > 1:
+            run_process_pool(configs, health_record, config.pool_processes, config.pool_drain_timeout)
+        else:
+            run_accounts(configs, health_record, bots)
+
+    except GeocoderQuotaExceeded:
+        raise Exception("Google Maps API key over requests limit.")
+    except SIGINTRecieved:
+        for bot in bots:
+            if bot:
+                bot.event_manager.emit(
+                    'bot_interrupted',
+                    sender=bot,
+                    level='info',
+                    formatted='Bot caught SIGINT. Shutting down.'
+                )
+                bot.stop_event_delivery()
+                bot.tick_profiler.stop()
+                bot.snapshot_writer.flush()
+                report_summary(bot)
+    except Exception as e:
+        # always report session summary and then raise exception
+        for bot in bots:
+            if bot:
+                report_summary(bot)
+
+        raise
+    finally:
+        # Cache here on SIGTERM, or Exception.  Check data is available and worth caching.
+        for bot in bots:
+            if bot:
+                # writes the profile summary and removes the sleep hook,
+                # does nothing when already stopped
+                bot.tick_profiler.stop()
+                # the snapshots delayed by their minimum interval
+                bot.snapshot_writer.flush()
+                cache_recent_forts(bot)
+
 
+def run_bot(config, health_record, bots, index):
+    """
+    Runs the bot of one account until it exits, re-creating it after API
+    errors. bots[index] is kept pointing to the current bot.
+    """
+    bot = False
+    finished = False
+
+    try:
         while not finished:
             try:
-                bot = PokemonGoBot(config)
+                if bot:
+                    # the delivery threads of the previous bot
+                    bot.stop_event_delivery()
+                bot = bots[index] = PokemonGoBot(config)
                 bot.start()
                 tree = TreeConfigBuilder(bot, config.raw_tasks).build()
                 bot.workers = tree
@@ -110,7 +169,9 @@ def main():
                     level='info',
                     formatted='Exiting bot.'
                 )
+                bot.stop_event_delivery()
                 finished = True
+                bot.tick_profiler.stop()
                 report_summary(bot)
 
             except NotLoggedInException:
@@ -145,48 +206,292 @@ def main():
             level='info',
             formatted='Probably permabanned, Game Over ! Play again at https://club.pokemon.com/us/pokemon-trainer-club/sign-up/'
          )
-    except GeocoderQuotaExceeded:
-        raise Exception("Google Maps API key over requests limit.")
+
+
+def run_accounts(configs, health_record, bots):
+    """
+    Runs the bots of several accounts in one process, each in its own thread
+    (a green thread, as eventlet patches threading). They share the static
+    data, the geocoded locations and the connection to the websocket server.
+    """
+    threads = start_accounts(configs, health_record, bots)
+
+    # wait in the main thread, which receives SIGINT
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(1)
+
+
+def start_accounts(configs, health_record, bots, crashed=None):
+    """
+    Starts the thread of every account. The usernames of the accounts whose
+    bot raised an unexpected exception are added to `crashed`.
+    """
+    # tell the accounts apart in the logs
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(logging.Formatter(
+            '%(asctime)s [%(processName)s/%(threadName)s] [%(name)10s] [%(levelname)s] %(message)s'
+        ))
+
+    def run_account(config, index):
+        try:
+            run_bot(config, health_record, bots, index)
+        except Exception:
+            logger.exception('The bot of {} crashed'.format(config.username))
+            if crashed is not None:
+                crashed.append(config.username)
+
+    threads = []
+    for index, config in enumerate(configs):
+        bots.append(None)
+        thread = threading.Thread(
+            target=run_account,
+            args=(config, index),
+            name=config.username
+        )
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+#
+# Process pool
+#
+# The parent process loads the static data once and forks the workers, which
+# share it copy-on-write. Every worker runs a slice of the accounts and sends
+# a report with their state and metrics through a pipe every
+# POOL_REPORT_INTERVAL seconds. A worker which stops reporting is killed, a
+# worker which dies is restarted after a growing delay. On SIGINT or SIGTERM
+# the workers get SIGTERM and have `pool.drain_timeout` seconds to save their
+# state before being killed.
+
+POOL_REPORT_INTERVAL = 10
+POOL_HEALTH_TIMEOUT = 120
+POOL_MIN_BACKOFF = 5
+POOL_MAX_BACKOFF = 300
+# a worker which ran that long before dying restarts without delay
+POOL_STABLE_TIME = 600
+
+
+class PoolWorker(object):
+    def __init__(self, index, configs):
+        self.index = index
+        self.configs = configs
+        self.process = None
+        self.connection = None
+        self.started = 0
+        self.last_report = 0
+        self.failures = 0
+        self.restart_at = None
+        self.finished = False
+        # username -> latest metrics
+        self.metrics = {}
+
+    def start(self, health_record):
+        reader, writer = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(
+            target=run_pool_worker,
+            args=(self.configs, health_record, writer),
+            name='worker-{}'.format(self.index)
+        )
+        self.process.start()
+        writer.close()
+        self.connection = reader
+        self.started = self.last_report = time.time()
+        self.restart_at = None
+
+    def receive_reports(self):
+        try:
+            while self.connection.poll():
+                report = self.connection.recv()
+                self.last_report = time.time()
+                for username, account in report['accounts'].iteritems():
+                    if account['metrics'] is not None:
+                        self.metrics[username] = account['metrics']
+        except (EOFError, IOError):
+            # the worker is gone
+            pass
+
+    def failed(self, reason):
+        now = time.time()
+        if now - self.started > POOL_STABLE_TIME:
+            self.failures = 0
+        delay = min(POOL_MAX_BACKOFF, POOL_MIN_BACKOFF * 2 ** self.failures) if self.failures else 0
+        self.failures += 1
+        self.restart_at = now + delay
+        logger.warning('Worker {} {}, restarting it in {} seconds'.format(self.index, reason, delay))
+
+
+def run_process_pool(configs, health_record, processes, drain_timeout):
+    if not hasattr(os, 'fork'):
+        raise Exception('The process pool needs os.fork, set pool.processes to 1')
+
+    preload_static_data()
+    if configs[0].websocket_start_embedded_server:
+        # one server for all the workers, which only connect to it
+        start_embedded_server(configs[0].websocket_server_url)
+        for config in configs:
+            config.websocket_start_embedded_server = False
+
+    workers = [PoolWorker(index, configs[index::processes]) for index in range(processes)]
+    workers = [worker for worker in workers if worker.configs]
+    for worker in workers:
+        worker.start(health_record)
+
+    def handle_sigterm(*args):
+        raise SIGINTRecieved
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    try:
+        while not all(worker.finished for worker in workers):
+            for worker in workers:
+                if worker.finished:
+                    continue
+                worker.receive_reports()
+
+                if worker.restart_at is not None:
+                    if time.time() >= worker.restart_at:
+                        worker.start(health_record)
+                elif worker.process.is_alive():
+                    if time.time() - worker.last_report > POOL_HEALTH_TIMEOUT:
+                        worker.process.terminate()
+                        worker.process.join(drain_timeout)
+                        _kill(worker.process)
+                        worker.failed('stopped reporting')
+                elif worker.process.exitcode == 0:
+                    worker.finished = True
+                else:
+                    worker.failed('exited with code {}'.format(worker.process.exitcode))
+            time.sleep(1)
+    except SIGINTRecieved:
+        drain_process_pool(workers, drain_timeout)
+
+    report_pool_summary(workers)
+
+
+def drain_process_pool(workers, drain_timeout):
+    alive = [worker for worker in workers if worker.process.is_alive()]
+    for worker in alive:
+        worker.process.terminate()
+
+    deadline = time.time() + drain_timeout
+    for worker in alive:
+        worker.process.join(max(0, deadline - time.time()))
+        worker.receive_reports()
+        _kill(worker.process)
+
+
+def _kill(process):
+    if process.is_alive():
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+
+
+def run_pool_worker(configs, health_record, connection):
+    # the eventlet hub of the parent can't be shared with it, get a new one
+    hubs.use_hub()
+    # the parent handles ^C and drains the workers with SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    def handle_sigterm(*args):
+        raise SIGINTRecieved
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    bots = []
+    crashed = []
+    threads = start_accounts(configs, health_record, bots, crashed)
+    try:
+        # a crashed account restarts the worker
+        while any(thread.is_alive() for thread in threads) and not crashed:
+            connection.send(pool_report(bots, threads))
+            time.sleep(POOL_REPORT_INTERVAL)
     except SIGINTRecieved:
-        if bot:
+        crashed = []
+    finally:
+        for bot in bots:
+            if bot:
+                bot.stop_event_delivery()
+                bot.tick_profiler.stop()
+                bot.snapshot_writer.flush()
+                cache_recent_forts(bot)
+        connection.send(pool_report(bots, threads))
+        connection.close()
+
+    sys.exit(1 if crashed else 0)
+
+
+def pool_report(bots, threads):
+    return {
+        'pid': os.getpid(),
+        'accounts': {
+            thread.name: {
+                'alive': thread.is_alive(),
+                'metrics': bot.metrics.snapshot() if bot else None
+            }
+            for bot, thread in zip(bots, threads)
+        }
+    }
+
+
+def report_pool_summary(workers):
+    totals = {'xp': 0, 'dust': 0, 'visits': 0, 'captures': 0, 'evolutions': 0, 'distance': 0}
+    accounts = 0
+    for worker in workers:
+        for metrics in worker.metrics.itervalues():
+            accounts += 1
+            for name in totals:
+                counter = metrics[name]
+                if counter['start'] is not None and counter['latest'] is not None:
+                    totals[name] += counter['latest'] - counter['start']
+
+    logger.info('')
+    logger.info('{} accounts earned {} XP and {} Stardust'.format(accounts, totals['xp'], totals['dust']))
+    logger.info('Travelled {:.2f}km, visited {} stops, caught {} pokemon, evolved {}'
+                .format(totals['distance'], totals['visits'], totals['captures'], totals['evolutions']))
+
+
+def account_configs(config):
+    """
+    Returns the configuration of every account: the main configuration, or
+    a copy of it updated by every entry of the "accounts" list.
+    """
+    if not config.accounts:
+        return [config]
+
+    configs = []
+    for account in config.accounts:
+        account_config = copy.copy(config)
+        for key, value in account.iteritems():
+            if key == 'tasks':
+                account_config.raw_tasks = value
+            else:
+                setattr(account_config, key.replace('.', '_'), value)
+        configs.append(account_config)
+    return configs
+
+
+def cache_recent_forts(bot):
+    if bot.recent_forts[-1] is not None and bot.config.forts_cache_recent_forts:
+        cached_forts_path = os.path.join(
+            _base_dir, 'data', 'recent-forts-%s.json' % bot.config.username
+        )
+        try:
+            with open(cached_forts_path, 'w') as outfile:
+                json.dump(bot.recent_forts, outfile)
             bot.event_manager.emit(
-                'bot_interrupted',
+                'cached_fort',
                 sender=bot,
-                level='info',
-                formatted='Bot caught SIGINT. Shutting down.'
+                level='debug',
+                formatted='Forts cached.',
             )
-            report_summary(bot)
-    except Exception as e:
-        # always report session summary and then raise exception
-        if bot:
-            report_summary(bot)
-
-        raise
-    finally:
-        # Cache here on SIGTERM, or Exception.  Check data is available and worth caching.
-        if bot:
-            if bot.recent_forts[-1] is not None and bot.config.forts_cache_recent_forts:
-                cached_forts_path = os.path.join(
-                    _base_dir, 'data', 'recent-forts-%s.json' % bot.config.username
+        except IOError as e:
+            bot.event_manager.emit(
+                'error_caching_forts',
+                sender=bot,
+                level='debug',
+                formatted='Error caching forts for {path}',
+                data={'path': cached_forts_path}
                 )
-                try:
-                    with open(cached_forts_path, 'w') as outfile:
-                        json.dump(bot.recent_forts, outfile)
-                    bot.event_manager.emit(
-                        'cached_fort',
-                        sender=bot,
-                        level='debug',
-                        formatted='Forts cached.',
-                    )
-                except IOError as e:
-                    bot.event_manager.emit(
-                        'error_caching_forts',
-                        sender=bot,
-                        level='debug',
-                        formatted='Error caching forts for {path}',
-                        data={'path': cached_forts_path}
-                        )
-
 
 
 def report_summary(bot):
@@ -210,6 +515,10 @@ def report_summary(bot):
         logger.info('Highest CP Pokemon: {}'.format(metrics.highest_cp['desc']))
     if metrics.most_perfect is not None:
         logger.info('Most Perfect Pokemon: {}'.format(metrics.most_perfect['desc']))
+    for queue in bot.event_queues:
+        stats = queue.stats()
+        logger.info('Events: {} delivered, {} dropped, {} coalesced, {} delayed'
+                    .format(stats['delivered'], stats['dropped'], stats['coalesced'], stats['delayed']))
 
 def init_config():
     parser = argparse.ArgumentParser()
@@ -492,12 +801,205 @@ def init_config():
         type=float,
         default=1
     )
+    add_config(
+        parser,
+        load,
+        long_flag="--websocket.batch_interval",
+        help="Send the events to the websocket server in batches every this many milliseconds (0 to disable)",
+        type=int,
+        default=0
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--websocket.batch_size",
+        help="Send the batch of events once it holds this many events (0 to disable)",
+        type=int,
+        default=0
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--websocket.encoding",
+        help="Encoding of the batches of events: json or msgpack (requires msgpack-python)",
+        type=str,
+        default='json'
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--events.dispatch_queue",
+        help="Deliver the events to the websocket server from a background thread",
+        type=bool,
+        default=False
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--events.queue_size",
+        help="Maximum number of events waiting to be delivered",
+        type=int,
+        default=1000
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--events.overflow",
+        help="What to do when the event queue is full: drop_oldest, coalesce (replace the queued event with the same name) or block",
+        type=str,
+        default='drop_oldest'
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--scheduler.tick_budget",
+        help="Seconds a tick may spend before tasks with an interval or triggers are pushed back to the next tick (0 to disable)",
+        type=float,
+        default=0.0
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--profiler.enabled",
+        help="Record per tick and per task timings, RPCs and allocations to data/profile-<username>.json",
+        type=bool,
+        default=False
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--profiler.window",
+        help="Number of ticks kept in the profiler summary",
+        type=int,
+        default=100
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--profiler.dump_interval",
+        help="Seconds between two writes of the profiler summary",
+        type=float,
+        default=60.0
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--profiler.sample_stacks",
+        help="Run some ticks under cProfile and dump the stacks of the slow ones",
+        type=bool,
+        default=False
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--profiler.sample_every",
+        help="Run one tick out of this many under cProfile",
+        type=int,
+        default=10
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--profiler.slow_tick",
+        help="Minimum duration in seconds of a sampled tick for its stacks to be dumped",
+        type=float,
+        default=5.0
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--state_api.url",
+        help="Serve the state of the bot as JSON over HTTP at the given host:port",
+        default=False
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--web.write_files",
+        help="Write the location, cells, inventory and catchable files read by the web interface",
+        type=bool,
+        default=True
+    )
+
+    add_config(
+        parser,
+        load,
+        long_flag="--pool.processes",
+        help="Number of worker processes the accounts are spread over",
+        type=int,
+        default=1
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--pool.drain_timeout",
+        help="Seconds the worker processes have to save their state when stopping",
+        type=float,
+        default=30.0
+    )
+
+    add_config(
+        parser,
+        load,
+        long_flag="--transfer.batch_size",
+        help="Maximum number of pokemons released in one request",
+        type=int,
+        default=10
+    )
+
+    add_config(
+        parser,
+        load,
+        long_flag="--coordination.backend",
+        help="Where the accounts keep their leases on forts, regions and Pokemon: none, memory or sqlite",
+        default='none'
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--coordination.path",
+        help="SQLite file of the sqlite coordination backend",
+        default=os.path.join(_base_dir, 'data', 'coordination.db')
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--coordination.lease_time",
+        help="Seconds a fort, region or Pokemon stays leased to an account",
+        type=float,
+        default=300.0
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--coordination.region_level",
+        help="S2 level of the regions leased to the accounts",
+        type=int,
+        default=14
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--world_cache.max_age",
+        help="Seconds the map cells seen by an account are reused by the accounts next to it, 0 to disable",
+        type=float,
+        default=0.0
+    )
+    add_config(
+        parser,
+        load,
+        long_flag="--world_cache.max_distance",
+        help="Maximum distance in meters to the account which saw the map cells reused",
+        type=float,
+        default=50.0
+    )
 
     # Start to parse other attrs
     config = parser.parse_args()
-    if not config.username and 'username' not in load:
+    config.accounts = load.get('accounts', [])
+    if not config.username and 'username' not in load and not config.accounts:
         config.username = raw_input("Username: ")
-    if not config.password and 'password' not in load:
+    if not config.password and 'password' not in load and not config.accounts:
         config.password = getpass("Password: ")
 
     config.encrypt_location = load.get('encrypt_location','')
@@ -511,6 +1013,28 @@ def init_config():
 
     config.vips = load.get('vips', {})
 
+    for account in config.accounts:
+        if 'username' not in account or 'password' not in account:
+            parser.error("Every entry of \"accounts\" needs a username and a password")
+            return None
+
+    if config.events_overflow not in ['drop_oldest', 'coalesce', 'block']:
+        parser.error("--events.overflow should be one of drop_oldest, coalesce or block")
+        return None
+
+    if config.transfer_batch_size < 1:
+        parser.error("--transfer.batch_size should be at least 1")
+        return None
+
+    if config.coordination_backend not in ['none', 'memory', 'sqlite']:
+        parser.error("--coordination.backend should be one of none, memory or sqlite")
+        return None
+
+    if config.pool_processes > 1 and config.state_api_url:
+        # every worker would serve the state of its own accounts on the same port
+        parser.error("--state_api.url can't be used with --pool.processes above 1")
+        return None
+
     if config.map_object_cache_time < 0.0:
         parser.error("--map_object_cache_time is out of range! (should be >= 0.0)")
         return None
@@ -18,25 +18,70 @@ from pgoapi.utilities import f2i, get_cell_ids
 
 import cell_workers
 from base_task import BaseTask
+from coordination import Coordinator
+from encounter_cache import EncounterCache
 from plugin_loader import PluginLoader
+from rules import compile_rules
 from api_wrapper import ApiWrapper
 from cell_workers.utils import distance
 from event_manager import EventManager
 from human_behaviour import sleep
 from item_list import Item
 from metrics import Metrics
-from pokemongo_bot.event_handlers import LoggingHandler, SocketIoHandler, ColoredLoggingHandler
-from pokemongo_bot.socketio_server.runner import SocketIoRunner
+from player_data import PlayerData
+from task_scheduler import TaskScheduler
+from snapshot_writer import MapSnapshot, SnapshotWriter
+from tick_profiler import TickProfiler
+import world_cache
+from pokemongo_bot.event_handlers import LoggingHandler, SocketIoHandler, ColoredLoggingHandler, QueuedEventHandler
+from pokemongo_bot.socketio_server.runner import start_embedded_server
 from pokemongo_bot.websocket_remote_control import WebsocketRemoteControl
+from pokemongo_bot.state_api import runner as state_api_runner
+from pokemongo_bot.state_api.store import StateStore
 from pokemongo_bot.base_dir import _base_dir
+from pokemongo_bot.services.evolution_planner import LUCKY_EGG_DURATION
 from worker_result import WorkerResult
 from tree_config_builder import ConfigException, MismatchTaskApiVersion, TreeConfigBuilder
+import inventory
 from inventory import init_inventory
 from sys import platform as _platform
 import struct
 
 
+# Read-only data shared by the bots of all the accounts running in the process
+_static_data = {}
+_geocoded_locations = {}
+_shared_data_lock = threading.Lock()
+
+
+def _load_static_data(filename):
+    with _shared_data_lock:
+        if filename not in _static_data:
+            with open(os.path.join(_base_dir, 'data', filename)) as data_file:
+                _static_data[filename] = json.load(data_file)
+        return _static_data[filename]
+
+
+def preload_static_data():
+    """
+    Loads the data shared by the bots, before forking worker processes which
+    then share it copy-on-write.
+    """
+    for filename in ('pokemon.json', 'items.json'):
+        _load_static_data(filename)
+    for component in (inventory.Types, inventory.LevelToCPm, inventory.FastAttacks,
+                      inventory.ChargedAttacks, inventory.Items, inventory.Pokemons):
+        component.init_static_data()
+
+
 class PokemonGoBot(object):
+    # Age in seconds under which the player data received with the heartbeat
+    # is current enough to not be requested again
+    PLAYER_DATA_MAX_AGE = 10
+    # Age in seconds above which a tick sends the heartbeat, the walkers
+    # send it at every step but the bot doesn't always walk
+    PLAYER_DATA_REFRESH_INTERVAL = 60
+
     @property
     def position(self):
         return self.api._position_lat, self.api._position_lng, 0
@@ -52,17 +97,41 @@ class PokemonGoBot(object):
         :return: The player data.
         :rtype: dict
         """
-        return self._player
+        return self.player_store.raw
 
     def __init__(self, config):
         self.config = config
         self.fort_timeouts = dict()
-        self.pokemon_list = json.load(
-            open(os.path.join(_base_dir, 'data', 'pokemon.json'))
-        )
-        self.item_list = json.load(open(os.path.join(_base_dir, 'data', 'items.json')))
+        self.pokemon_list = _load_static_data('pokemon.json')
+        self.item_list = _load_static_data('items.json')
+        # the catch, release and vips rules of every species
+        self.rules = compile_rules(config, self.pokemon_list)
         self.metrics = Metrics(self)
+        self.tick_profiler = TickProfiler.from_config(self, config)
+        self.snapshot_writer = SnapshotWriter(
+            disabled_kinds=() if config.web_write_files else SnapshotWriter.WEB_KINDS
+        )
+        # in memory state served over HTTP, see publish_state
+        self.state_store = StateStore() if config.state_api_url else None
+        # leases keeping the accounts running side by side apart
+        self.coordinator = Coordinator.from_config(config)
+        # map cells seen by the accounts of this process
+        self.world_cache = world_cache.shared_cache() if config.world_cache_max_age > 0 else None
+        # outcome of the encounters, to not encounter the same pokemon twice
+        self.encounter_cache = EncounterCache()
+        # end of the window of the last lucky egg used, see use_lucky_egg
+        self.lucky_egg_until = 0
+        self._inventory_changed = True
         self.latest_inventory = None
+        self.latest_inventory_time = 0
+        # player data of the last GET_PLAYER, kept up to date by the heartbeat
+        self.player_store = PlayerData()
+        self.player_store.subscribe(self._on_player_changed)
+        self._player_changed = True
+        # refresh of the player and inventory asked by other threads, see
+        # request_player_refresh
+        self._player_refresh = None
+        self._player_refresh_lock = threading.Lock()
         self.cell = None
         self.recent_forts = [None] * config.forts_max_circle_size
         self.tick_count = 0
@@ -75,21 +144,38 @@ class PokemonGoBot(object):
         # Make our own copy of the workers for this instance
         self.workers = []
 
-        # Theading setup for file writing
+        # Theading setup for file writing, the thread only ever gets the
+        # latest map snapshot published by the main thread
+        self.map_snapshot = None
         self.web_update_queue = Queue.Queue(maxsize=1)
         self.web_update_thread = threading.Thread(target=self.update_web_location_worker)
         self.web_update_thread.start()
 
     def start(self):
+        self.tick_profiler.start()
         self._setup_event_system()
+        if self.state_store is not None:
+            state_api_runner.serve(self.config.state_api_url, self.state_store)
         self._setup_logging()
         self._setup_api()
         self._load_recent_forts()
 
         random.seed()
 
+    def stop_event_delivery(self):
+        """
+        Delivers the events still queued, sends the pending websocket batch
+        and stops the delivery threads.
+        """
+        for queue in getattr(self, 'event_queues', []):
+            queue.stop()
+        if getattr(self, 'websocket_handler', None) is not None:
+            self.websocket_handler.stop()
+
     def _setup_event_system(self):
         handlers = []
+        self.event_queues = []
+        self.websocket_handler = None
         if self.config.logging_color:
             handlers.append(ColoredLoggingHandler())
         else:
@@ -97,18 +183,32 @@ class PokemonGoBot(object):
 
         if self.config.websocket_server_url:
             if self.config.websocket_start_embedded_server:
-                self.sio_runner = SocketIoRunner(self.config.websocket_server_url)
-                self.sio_runner.start_listening_async()
+                self.sio_runner = start_embedded_server(self.config.websocket_server_url)
 
             websocket_handler = SocketIoHandler(
                 self,
-                self.config.websocket_server_url
+                self.config.websocket_server_url,
+                batch_interval=self.config.websocket_batch_interval,
+                batch_size=self.config.websocket_batch_size,
+                encoding=self.config.websocket_encoding
             )
+            self.websocket_handler = websocket_handler
+            if self.config.events_dispatch_queue:
+                # don't let a slow socket.io server slow the bot down
+                websocket_handler = QueuedEventHandler(
+                    websocket_handler,
+                    max_size=self.config.events_queue_size,
+                    overflow=self.config.events_overflow
+                )
+                self.event_queues.append(websocket_handler)
             handlers.append(websocket_handler)
 
             if self.config.websocket_remote_control:
                 remote_control = WebsocketRemoteControl(self).start()
 
+        self.task_scheduler = TaskScheduler(self, self.config.scheduler_tick_budget)
+        handlers.append(self.task_scheduler)
+
         self.event_manager = EventManager(*handlers)
         self._register_events()
         if self.config.show_events:
@@ -395,6 +495,10 @@ class PokemonGoBot(object):
             'pokemon_release',
             parameters=('pokemon', 'iv', 'cp', 'ncp', 'dps')
         )
+        self.event_manager.register_event(
+            'pokemon_release_failed',
+            parameters=('pokemon', 'cp', 'iv')
+        )
 
         # polyline walker
         self.event_manager.register_event(
@@ -472,20 +576,39 @@ class PokemonGoBot(object):
         )
 
     def tick(self):
-        self.health_record.heartbeat()
-        self.cell = self.get_meta_cell()
+        self.tick_profiler.start_tick()
+        try:
+            self._tick()
+        finally:
+            self.tick_profiler.end_tick()
+        self.publish_state()
+        self._refresh_player_if_requested()
+
+    def _tick(self):
+        profiler = self.tick_profiler
+
+        with profiler.phase('heartbeat'):
+            self.health_record.heartbeat()
+            if self.player_store.age() > self.PLAYER_DATA_REFRESH_INTERVAL:
+                self.heartbeat()
+        with profiler.phase('get_meta_cell'):
+            self.cell = self.get_meta_cell()
         self.tick_count += 1
 
         # Check if session token has expired
-        self.check_session(self.position[0:2])
+        with profiler.phase('check_session'):
+            self.check_session(self.position[0:2])
 
-        for worker in self.workers:
-            if worker.work() == WorkerResult.RUNNING:
+        for worker in self.task_scheduler.due_tasks(self.workers):
+            with profiler.phase(type(worker).__name__):
+                result = self.task_scheduler.run_task(worker)
+            if result == WorkerResult.RUNNING:
                 return
 
     def get_meta_cell(self):
         location = self.position[0:2]
         cells = self.find_close_cells(*location)
+        self._publish_map_snapshot(cells, *location)
 
         # Combine all cells into a single dict of the items we care about.
         forts = []
@@ -514,7 +637,51 @@ class PokemonGoBot(object):
                 "catchable_pokemons": catchable_pokemons
             }
 
-    def update_web_location(self, cells=[], lat=None, lng=None, alt=None):
+    def _publish_map_snapshot(self, cells, lat, lng):
+        """
+        Hands the cells over to the web update thread. The list is copied
+        since the cached map objects are sorted again in place.
+        """
+        version = self.map_snapshot.version + 1 if self.map_snapshot else 1
+        self.map_snapshot = MapSnapshot(version, lat, lng, 0, tuple(cells))
+
+        # replace the snapshot the thread didn't get to yet
+        try:
+            self.web_update_queue.get_nowait()
+        except Queue.Empty:
+            pass
+        try:
+            self.web_update_queue.put_nowait(self.map_snapshot)
+        except Queue.Full:
+            pass
+
+    def publish_state(self):
+        """
+        Publishes the state that changed during the tick to the state store.
+        """
+        if self.state_store is None:
+            return
+
+        lat, lng, alt = self.position
+        self.state_store.update('position', {'lat': lat, 'lng': lng, 'alt': alt})
+        if self.cell is not None:
+            # the workers sort these lists in place
+            self.state_store.update('cell', {key: list(value) for key, value in self.cell.iteritems()})
+        if self._inventory_changed:
+            self._inventory_changed = False
+            self.state_store.update('inventory', inventory.snapshot())
+        if self._player_changed:
+            self._player_changed = False
+            self.state_store.update('player', self.player_store.snapshot())
+        self.state_store.update('metrics', self.metrics.snapshot())
+
+    def _on_inventory_changed(self, event, **kwargs):
+        self._inventory_changed = True
+
+    def _on_player_changed(self, field, value, previous):
+        self._player_changed = True
+
+    def update_web_location(self, cells=None, lat=None, lng=None, alt=None):
         # we can call the function with no arguments and still get the position
         # and map_cells
         if lat is None:
@@ -524,51 +691,73 @@ class PokemonGoBot(object):
         if alt is None:
             alt = 0
 
-        if cells == []:
-            location = self.position[0:2]
-            cells = self.find_close_cells(*location)
+        if cells is None:
+            if self.map_snapshot is not None:
+                cells = self.map_snapshot.cells
+            else:
+                location = self.position[0:2]
+                cells = self.find_close_cells(*location)
 
-        user_data_cells = os.path.join(_base_dir, 'data', 'cells-%s.json' % self.config.username)
-        with open(user_data_cells, 'w') as outfile:
-            json.dump(cells, outfile)
+        if not {'cells', 'location'} <= self.snapshot_writer.disabled_kinds:
+            # serialize the cells once for both files
+            cells_payload = self.snapshot_writer.serialize(cells)
 
-        user_web_location = os.path.join(
-            _base_dir, 'web', 'location-%s.json' % self.config.username
-        )
-        # alt is unused atm but makes using *location easier
-        try:
-            with open(user_web_location, 'w') as outfile:
-                json.dump({
-                    'lat': lat,
-                    'lng': lng,
-                    'alt': alt,
-                    'cells': cells
-                }, outfile)
-        except IOError as e:
-            self.logger.info('[x] Error while opening location file: %s' % e)
+            user_data_cells = os.path.join(_base_dir, 'data', 'cells-%s.json' % self.config.username)
+            self.snapshot_writer.write(user_data_cells, payload=cells_payload, kind='cells')
+
+            user_web_location = os.path.join(
+                _base_dir, 'web', 'location-%s.json' % self.config.username
+            )
+            # alt is unused atm but makes using *location easier
+            location_payload = '{{"lat": {}, "lng": {}, "alt": {}, "cells": {}}}'.format(
+                json.dumps(lat), json.dumps(lng), json.dumps(alt), cells_payload
+            )
+            self.snapshot_writer.write(user_web_location, payload=location_payload, kind='location')
 
         user_data_lastlocation = os.path.join(
             _base_dir, 'data', 'last-location-%s.json' % self.config.username
         )
-        try:
-            with open(user_data_lastlocation, 'w') as outfile:
-                json.dump({'lat': lat, 'lng': lng, 'start_position': self.start_position}, outfile)
-        except IOError as e:
-            self.logger.info('[x] Error while opening location file: %s' % e)
+        self.snapshot_writer.write(
+            user_data_lastlocation,
+            {'lat': lat, 'lng': lng, 'start_position': self.start_position},
+            kind='last_location'
+        )
 
     def find_close_cells(self, lat, lng):
         cellid = get_cell_ids(lat, lng)
-        timestamp = [0, ] * len(cellid)
-        response_dict = self.get_map_objects(lat, lng, timestamp, cellid)
-        map_objects = response_dict.get(
-            'responses', {}
-        ).get('GET_MAP_OBJECTS', {})
-        status = map_objects.get('status', None)
-
-        map_cells = []
-        if status and status == 1:
-            map_cells = map_objects['map_cells']
-            position = (lat, lng, 0)
+        map_cells = None
+        if self.world_cache is not None:
+            # another account may have just seen these cells from nearby
+            map_cells = self.world_cache.lookup(
+                cellid, lat, lng,
+                self.config.world_cache_max_age,
+                self.config.world_cache_max_distance
+            )
+
+        if map_cells is None:
+            timestamp = [0, ] * len(cellid)
+            response_dict = self.get_map_objects(lat, lng, timestamp, cellid)
+            map_objects = response_dict.get(
+                'responses', {}
+            ).get('GET_MAP_OBJECTS', {})
+            status = map_objects.get('status', None)
+
+            map_cells = []
+            if status and status == 1:
+                map_cells = map_objects['map_cells']
+                if self.world_cache is not None:
+                    self.world_cache.store(map_cells, lat, lng)
+            elif self.world_cache is not None:
+                # the forts and lures seen by the other accounts are still
+                # good, whatever their age
+                map_cells = self.world_cache.lookup(
+                    cellid, lat, lng,
+                    self.config.world_cache_max_age,
+                    self.config.world_cache_max_distance,
+                    pokemons_required=False
+                ) or []
+
+        if map_cells:
             map_cells.sort(
                 key=lambda x: distance(
                     lat,
@@ -605,6 +794,10 @@ class PokemonGoBot(object):
             level=log_level,
             format='%(asctime)s [%(name)10s] [%(levelname)s] %(message)s'
         )
+
+        # the logging handlers filter events based on the logging level
+        self.event_manager.update_levels()
+
     def check_session(self, position):
         # Check session expiry
         if self.api._auth_provider and self.api._auth_provider._ticket_expire:
@@ -625,7 +818,7 @@ class PokemonGoBot(object):
                     formatted='Session stale, re-logging in.'
                 )
                 position = self.position
-                self.api = ApiWrapper()
+                self.api = ApiWrapper(profiler=self.tick_profiler)
                 self.position = position
                 self.login()
                 self.api.activate_signature(self.get_encryption_lib())
@@ -695,7 +888,7 @@ class PokemonGoBot(object):
 
     def _setup_api(self):
         # instantiate pgoapi
-        self.api = ApiWrapper()
+        self.api = ApiWrapper(profiler=self.tick_profiler)
 
         # provide player position on the earth
         self._set_starting_position()
@@ -703,45 +896,34 @@ class PokemonGoBot(object):
         self.login()
         # chain subrequests (methods) into one RPC call
 
-        self._print_character_info()
         self.api.activate_signature(self.get_encryption_lib())
         self.logger.info('')
         self.update_inventory()
+        self._print_character_info()
         # send empty map_cells and then our position
         self.update_web_location()
 
     def _print_character_info(self):
-        # get player profile call
-        # ----------------------
-        response_dict = self.api.get_player()
-        # print('Response dictionary: \n\r{}'.format(json.dumps(response_dict, indent=2)))
-        currency_1 = "0"
-        currency_2 = "0"
-
-        if response_dict:
-            self._player = response_dict['responses']['GET_PLAYER']['player_data']
-            player = self._player
-        else:
-            self.logger.info(
-                "The API didn't return player info, servers are unstable - "
-                "retrying.", 'red'
-            )
-            sleep(5)
-            self._print_character_info()
+        # the player data comes with the heartbeat, it is only requested
+        # when none was received yet
+        while self.player_store.time is None:
+            if not self.refresh_player():
+                self.logger.info(
+                    "The API didn't return player info, servers are unstable - "
+                    "retrying.", 'red'
+                )
+                sleep(5)
+        player = self.player_store.raw
 
         # @@@ TODO: Convert this to d/m/Y H:M:S
         creation_date = datetime.datetime.fromtimestamp(
             player['creation_timestamp_ms'] / 1e3)
         creation_date = creation_date.strftime("%Y/%m/%d %H:%M:%S")
 
-        pokecoins = '0'
-        stardust = '0'
+        pokecoins = self.player_store.pokecoins
+        stardust = self.player_store.stardust
         items_stock = self.current_inventory()
 
-        if 'amount' in player['currencies'][0]:
-            pokecoins = player['currencies'][0]['amount']
-        if 'amount' in player['currencies'][1]:
-            stardust = player['currencies'][1]['amount']
         self.logger.info('')
         self.logger.info('--- {username} ---'.format(**player))
         self.get_player_info()
@@ -796,16 +978,40 @@ class PokemonGoBot(object):
         self.logger.info('')
 
     def use_lucky_egg(self):
-        return self.api.use_item_xp_boost(item_id=301)
+        """
+        Uses a lucky egg, records the end of its window and takes it out of
+        the cached inventory when the server accepted it.
+        """
+        response_dict = self.api.use_item_xp_boost(item_id=Item.ITEM_LUCKY_EGG.value)
+        result = (response_dict or {}).get('responses', {}).get('USE_ITEM_XP_BOOST', {}).get('result', 0)
+        if result == 1:
+            self.lucky_egg_until = time.time() + LUCKY_EGG_DURATION
+            lucky_egg = inventory.items().get(Item.ITEM_LUCKY_EGG.value)
+            if lucky_egg.count > 0:
+                lucky_egg.remove(1)
+        return response_dict
+
+    def lucky_egg_window(self):
+        """
+        Seconds left of the window of the lucky egg in use, 0 without one.
+        """
+        return max(0, self.lucky_egg_until - time.time())
 
     def get_inventory(self):
         if self.latest_inventory is None:
             self.latest_inventory = self.api.get_inventory()
+            self.latest_inventory_time = time.time()
         return self.latest_inventory
 
     def update_inventory(self):
         # TODO: transition to using this inventory class everywhere
         init_inventory(self)
+        self._inventory_changed = True
+        if self.state_store is not None:
+            for event in (inventory.POKEMON_ADDED, inventory.POKEMON_REMOVED, inventory.POKEMON_UPDATED,
+                          inventory.EGG_ADDED, inventory.EGG_HATCHED, inventory.ITEM_COUNT_CHANGED,
+                          inventory.CANDY_CHANGED):
+                inventory.subscribe(event, self._on_inventory_changed)
         response = self.get_inventory()
         self.inventory = list()
         inventory_items = response.get('responses', {}).get('GET_INVENTORY', {}).get(
@@ -822,9 +1028,7 @@ class PokemonGoBot(object):
             'inventory_delta']['inventory_items']
 
         user_web_inventory = os.path.join(_base_dir, 'web', 'inventory-%s.json' % self.config.username)
-
-        with open(user_web_inventory, 'w') as outfile:
-            json.dump(inventory_dict, outfile)
+        self.snapshot_writer.write(user_web_inventory, inventory_dict, kind='inventory')
 
         # get player items stock
         # ----------------------
@@ -998,10 +1202,13 @@ class PokemonGoBot(object):
                 )
                 return float(possible_coordinates[0]), float(possible_coordinates[1]), float("0.0")
 
-        geolocator = GoogleV3(api_key=self.config.gmapkey)
-        loc = geolocator.geocode(location_name, timeout=10)
+        # accounts often start from the same place
+        if location_name not in _geocoded_locations:
+            geolocator = GoogleV3(api_key=self.config.gmapkey)
+            loc = geolocator.geocode(location_name, timeout=10)
+            _geocoded_locations[location_name] = float(loc.latitude), float(loc.longitude), float(loc.altitude)
 
-        return float(loc.latitude), float(loc.longitude), float(loc.altitude)
+        return _geocoded_locations[location_name]
 
     def heartbeat(self):
         # Remove forts that we can now spin again.
@@ -1011,33 +1218,92 @@ class PokemonGoBot(object):
         request = self.api.create_request()
         request.get_player()
         request.check_awarded_badges()
-        request.call()
-        try:
-            self.web_update_queue.put_nowait(True)  # do this outside of thread every tick
-        except Queue.Full:
-            pass
+        response_dict = request.call()
+        responses = response_dict.get('responses', {}) if response_dict else {}
+        if 'player_data' in responses.get('GET_PLAYER', {}):
+            self.player_store.update(responses['GET_PLAYER']['player_data'])
+
+    def refresh_player(self):
+        """
+        Requests the player data on its own, for when the heartbeat didn't
+        bring any yet. Returns whether it was received.
+        """
+        response_dict = self.api.get_player()
+        responses = response_dict.get('responses', {}) if response_dict else {}
+        if 'player_data' not in responses.get('GET_PLAYER', {}):
+            return False
+        self.player_store.update(responses['GET_PLAYER']['player_data'])
+        return True
 
     def update_web_location_worker(self):
+        # never calls the API, which isn't thread safe
+        last_version = 0
         while True:
-            self.web_update_queue.get()
-            self.update_web_location()
+            snapshot = self.web_update_queue.get()
+            if snapshot.version <= last_version:
+                continue
+            last_version = snapshot.version
+            self.update_web_location(snapshot.cells, snapshot.lat, snapshot.lng, snapshot.alt)
+
+    def player_state_age(self):
+        """
+        Seconds since the player data or the raw inventory was last received.
+        """
+        if self.latest_inventory is None:
+            return float('inf')
+        return max(self.player_store.age(), time.time() - self.latest_inventory_time)
+
+    def request_player_refresh(self):
+        """
+        Asks the main thread to refresh the player data and the inventory at
+        the end of the current tick, as the API can't be used from other
+        threads. The player data is only requested when the heartbeat didn't
+        bring it recently. Returns an Event set once done, shared by all the
+        requests made before the refresh so they are answered by a single
+        RPC.
+        """
+        with self._player_refresh_lock:
+            if self._player_refresh is None:
+                self._player_refresh = threading.Event()
+            return self._player_refresh
+
+    def _refresh_player_if_requested(self):
+        with self._player_refresh_lock:
+            done = self._player_refresh
+            self._player_refresh = None
+        if done is None:
+            return
+
+        try:
+            request = self.api.create_request()
+            if self.player_store.age() > self.PLAYER_DATA_MAX_AGE:
+                request.get_player()
+            request.get_inventory()
+            response_dict = request.call()
+            responses = response_dict.get('responses', {}) if response_dict else {}
+            if 'player_data' in responses.get('GET_PLAYER', {}):
+                self.player_store.update(responses['GET_PLAYER']['player_data'])
+            if 'GET_INVENTORY' in responses:
+                inventory.refresh_inventory(response_dict)
+                self.latest_inventory_time = time.time()
+        finally:
+            done.set()
 
     def get_inventory_count(self, what):
+        if 'item' in what:
+            return inventory.Items.get_space_used()
+
         response_dict = self.get_inventory()
         inventory_items = response_dict.get('responses', {}).get('GET_INVENTORY', {}).get(
             'inventory_delta', {}).get('inventory_items', {})
         if inventory_items:
             pokecount = 0
-            itemcount = 1
             for item in inventory_items:
                 if 'inventory_item_data' in item:
                     if 'pokemon_data' in item['inventory_item_data']:
                         pokecount += 1
-                    itemcount += item['inventory_item_data'].get('item', {}).get('count', 0)
         if 'pokemon' in what:
             return pokecount
-        if 'item' in what:
-            return itemcount
         return '0'
 
     def get_player_info(self):
@@ -1072,13 +1338,7 @@ class PokemonGoBot(object):
                                 **playerdata))
 
     def has_space_for_loot(self):
-        number_of_things_gained_by_stop = 5
-        enough_space = (
-            self.get_inventory_count('item') <
-            self._player['max_item_storage'] - number_of_things_gained_by_stop
-        )
-
-        return enough_space
+        return inventory.Items.has_space_for_loot()
 
     def get_forts(self, order_by_distance=False):
         forts = [fort
@@ -14,21 +14,25 @@ class PermaBannedException(Exception):
     pass
 
 class ApiWrapper(PGoApi):
-    def __init__(self):
+    def __init__(self, profiler=None):
         PGoApi.__init__(self)
         self.useVanillaRequest = False
+        self.profiler = profiler
 
     def create_request(self):
         RequestClass = ApiRequest
         if self.useVanillaRequest:
             RequestClass = PGoApiRequest
 
-        return RequestClass(
+        request = RequestClass(
             self,
             self._position_lat,
             self._position_lng,
             self._position_alt
         )
+        if RequestClass is ApiRequest:
+            request.profiler = self.profiler
+        return request
 
     def login(self, *args):
         # login needs base class "create_request"
@@ -48,6 +52,7 @@ class ApiRequest(PGoApiRequest):
         self.request_callers = []
         self.last_api_request_time = None
         self.requests_per_seconds = 2
+        self.profiler = None
 
     def can_call(self):
         if not self._req_method_list:
@@ -113,12 +118,16 @@ class ApiRequest(PGoApiRequest):
             self._req_method_list = [req_method for req_method in api_req_method_list]
             should_throttle_retry = False
             should_unexpected_response_retry = False
+            rpc_start = time.time()
             try:
                 result = self._call()
             except ServerSideRequestThrottlingException:
                 should_throttle_retry = True
             except UnexpectedResponseException:
                 should_unexpected_response_retry = True
+            finally:
+                if self.profiler:
+                    self.profiler.record_rpc(request_callers, time.time() - rpc_start)
 
             if should_throttle_retry:
                 throttling_retry += 1
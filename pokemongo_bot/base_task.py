@@ -4,6 +4,14 @@ import logging
 class BaseTask(object):
   TASK_API_VERSION = 1
 
+  # Scheduling defaults, see TaskScheduler. They can be overridden with the
+  # "schedule" key of the task configuration.
+  RUN_INTERVAL = 0
+  TRIGGER_EVENTS = ()
+  TRIGGER_DISTANCE = 0
+  PRIORITY = 0
+  TIME_BUDGET = None
+
   def __init__(self, bot, config):
     self.bot = bot
     self.config = config
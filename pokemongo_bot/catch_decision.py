@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+from collections import namedtuple
+
+from item_list import Item
+
+BALLS = (Item.ITEM_POKE_BALL.value, Item.ITEM_GREAT_BALL.value, Item.ITEM_ULTRA_BALL.value)
+BERRY = Item.ITEM_RAZZ_BERRY.value
+
+# cost of the items, in poke balls
+ITEM_COSTS = {
+    Item.ITEM_POKE_BALL.value: 1.0,
+    Item.ITEM_GREAT_BALL.value: 2.0,
+    Item.ITEM_ULTRA_BALL.value: 4.0,
+    Item.ITEM_RAZZ_BERRY.value: 1.5
+}
+# cost of a request to the server, a berry is thrown in the same request as
+# the ball so it doesn't add any
+RPC_COST = 0.5
+# catch rate multiplier of a razz berry
+BERRY_MULTIPLIER = 1.5
+
+# value of a catch, in poke balls
+POKEMON_VALUE = 10.0
+VIP_VALUE = 40.0
+
+# the catch rates are rounded to 5%, the flee rates to 1%
+PROBABILITY_STEPS = 20
+FLEE_STEPS = 100
+
+# lowest item count of each inventory bucket, and how much more an item
+# costs in it: the last items are kept for the encounters needing them
+INVENTORY_BUCKETS = (0, 1, 10, 50)
+SCARCITY = (None, 3.0, 1.5, 1.0)
+
+Throw = namedtuple('Throw', ['ball', 'use_berry', 'catch_rate'])
+
+
+def probability_bucket(rate):
+    return max(0, min(PROBABILITY_STEPS, int(round(rate * PROBABILITY_STEPS))))
+
+
+def inventory_bucket(count):
+    bucket = 0
+    for index, lowest in enumerate(INVENTORY_BUCKETS):
+        if count >= lowest:
+            bucket = index
+    return bucket
+
+
+def throw_score(catch_rate, flee_rate, value, cost):
+    """
+    Expected value of an encounter where the same throw is repeated until
+    the Pokémon is caught or flees: each throw costs `cost`, catches with
+    `catch_rate` and the Pokémon flees after a miss with `flee_rate`.
+    """
+    keep_going = (1 - catch_rate) * (1 - flee_rate)
+    if keep_going >= 1:
+        return -float('inf')
+    return (value * catch_rate - cost) / (1 - keep_going)
+
+
+class CatchDecisionTable(object):
+    """
+    Best throw for an encounter, from tables computed once per flee rate and
+    value of the Pokémon.
+
+    For every ball, catch rate bucket and inventory buckets of the ball and
+    of the berries, the table holds the score of the throw and whether a
+    berry should go with it. A decision is then one lookup per ball.
+    """
+
+    def __init__(self, flee_rate, value):
+        self.flee_rate = flee_rate
+        self.value = value
+        # ball -> [probability bucket][ball bucket][berry bucket] -> (score, use_berry)
+        self._entries = {ball: self._build(ball) for ball in BALLS}
+
+    def _build(self, ball):
+        entries = []
+        for probability in range(PROBABILITY_STEPS + 1):
+            catch_rate = float(probability) / PROBABILITY_STEPS
+            berry_catch_rate = min(1.0, catch_rate * BERRY_MULTIPLIER)
+
+            by_ball_bucket = [None]
+            for ball_scarcity in SCARCITY[1:]:
+                cost = ITEM_COSTS[ball] * ball_scarcity + RPC_COST
+                score = throw_score(catch_rate, self.flee_rate, self.value, cost)
+
+                by_berry_bucket = [(score, False)]
+                for berry_scarcity in SCARCITY[1:]:
+                    berry_cost = cost + ITEM_COSTS[BERRY] * berry_scarcity
+                    berry_score = throw_score(berry_catch_rate, self.flee_rate, self.value, berry_cost)
+                    by_berry_bucket.append(max((score, False), (berry_score, True)))
+                by_ball_bucket.append(by_berry_bucket)
+            entries.append(by_ball_bucket)
+        return entries
+
+    def decide(self, catch_rate_by_ball, ball_count, berry_count):
+        """
+        Returns the Throw with the best expected value, None without balls.
+
+        `catch_rate_by_ball` and `ball_count` are indexed by ball id.
+        """
+        berry_bucket = inventory_bucket(berry_count)
+        best = None
+        for ball in BALLS:
+            ball_bucket = inventory_bucket(ball_count.get(ball, 0))
+            if ball_bucket == 0:
+                continue
+            score, use_berry = self._entries[ball][probability_bucket(catch_rate_by_ball[ball])][ball_bucket][berry_bucket]
+            if best is None or score > best[0]:
+                best = (score, ball, use_berry)
+
+        if best is None:
+            return None
+        _, ball, use_berry = best
+        catch_rate = catch_rate_by_ball[ball]
+        if use_berry:
+            catch_rate = min(1.0, catch_rate * BERRY_MULTIPLIER)
+        return Throw(ball, use_berry, catch_rate)
+
+
+# (flee bucket, value) -> table, shared by the bots of all the accounts
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def table_for(flee_rate, value):
+    flee_bucket = int(round(flee_rate * FLEE_STEPS))
+    key = (flee_bucket, value)
+    table = _tables.get(key)
+    if table is None:
+        with _tables_lock:
+            table = _tables.get(key)
+            if table is None:
+                table = _tables[key] = CatchDecisionTable(float(flee_bucket) / FLEE_STEPS, value)
+    return table
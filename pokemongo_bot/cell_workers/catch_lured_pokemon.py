@@ -38,7 +38,8 @@ class CatchLuredPokemon(BaseTask):
             )
 
             encounter_id = fort.get('lure_info', {}).get('encounter_id', None)
-            if distance_to_fort < Constants.MAX_DISTANCE_FORT_IS_REACHABLE and encounter_id:
+            if distance_to_fort < Constants.MAX_DISTANCE_FORT_IS_REACHABLE and encounter_id \
+                    and self.bot.encounter_cache.outcome(encounter_id) is None:
                 forts_in_range.append(fort)
 
 
@@ -54,7 +55,8 @@ class CatchLuredPokemon(BaseTask):
                 'fort_id': fort['id'],
                 'fort_name': u"{}".format(fort_name),
                 'latitude': fort['latitude'],
-                'longitude': fort['longitude']
+                'longitude': fort['longitude'],
+                'expiration_timestamp_ms': fort['lure_info'].get('lure_expires_timestamp_ms', 0)
             }
             pokemon_to_catch.append(result)
 
@@ -1,4 +1,3 @@
-import json
 import os
 
 from pokemongo_bot.base_task import BaseTask
@@ -12,27 +11,26 @@ class CatchVisiblePokemon(BaseTask):
     SUPPORTED_TASK_API_VERSION = 1
 
     def work(self):
-        num_catchable_pokemon = 0
-        if 'catchable_pokemons' in self.bot.cell:
-            num_catchable_pokemon = len(self.bot.cell['catchable_pokemons'])
+        # skip the pokemon already encountered, without touching the cell
+        # the other tasks see
+        catchable_pokemons = self.bot.encounter_cache.unknown(self.bot.cell.get('catchable_pokemons', []))
+        wild_pokemons = self.bot.encounter_cache.unknown(self.bot.cell.get('wild_pokemons', []))
 
-        num_wild_pokemon = 0
-        if 'wild_pokemons' in self.bot.cell:
-            num_wild_pokemon = len(self.bot.cell['wild_pokemons'])
+        num_catchable_pokemon = len(catchable_pokemons)
+        num_wild_pokemon = len(wild_pokemons)
 
         num_available_pokemon = num_catchable_pokemon + num_wild_pokemon
 
         if num_catchable_pokemon > 0:
             # Sort all by distance from current pos- eventually this should
             # build graph & A* it
-            self.bot.cell['catchable_pokemons'].sort(
+            catchable_pokemons.sort(
                 key=
                 lambda x: distance(self.bot.position[0], self.bot.position[1], x['latitude'], x['longitude'])
             )
             user_web_catchable = os.path.join(_base_dir, 'web', 'catchable-{}.json'.format(self.bot.config.username))
-            for pokemon in self.bot.cell['catchable_pokemons']:
-                with open(user_web_catchable, 'w') as outfile:
-                    json.dump(pokemon, outfile)
+            for pokemon in catchable_pokemons:
+                self.bot.snapshot_writer.write(user_web_catchable, pokemon, kind='catchable')
                 self.emit_event(
                     'catchable_pokemon',
                     level='debug',
@@ -46,7 +44,8 @@ class CatchVisiblePokemon(BaseTask):
                     }
                 )
 
-            self.catch_pokemon(self.bot.cell['catchable_pokemons'].pop(0))
+            # the encounter cache then skips it at the next run
+            self.catch_pokemon(catchable_pokemons[0])
             if num_catchable_pokemon > 1:
                 return WorkerResult.RUNNING
             else:
@@ -55,10 +54,10 @@ class CatchVisiblePokemon(BaseTask):
         if num_available_pokemon > 0:
             # Sort all by distance from current pos- eventually this should
             # build graph & A* it
-            self.bot.cell['wild_pokemons'].sort(
+            wild_pokemons.sort(
                 key=
                 lambda x: distance(self.bot.position[0], self.bot.position[1], x['latitude'], x['longitude']))
-            self.catch_pokemon(self.bot.cell['wild_pokemons'].pop(0))
+            self.catch_pokemon(wild_pokemons[0])
 
             if num_catchable_pokemon > 1:
                 return WorkerResult.RUNNING
@@ -3,6 +3,7 @@ from pokemongo_bot.base_task import BaseTask
 
 class CollectLevelUpReward(BaseTask):
     SUPPORTED_TASK_API_VERSION = 1
+    RUN_INTERVAL = 60
 
     current_level = 0
     previous_level = 0
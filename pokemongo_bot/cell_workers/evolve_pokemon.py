@@ -1,12 +1,14 @@
 from pokemongo_bot import inventory
-from pokemongo_bot.human_behaviour import sleep
-from pokemongo_bot.inventory import Pokemon
 from pokemongo_bot.item_list import Item
 from pokemongo_bot.base_task import BaseTask
+from pokemongo_bot.services.evolve_executor import EvolveExecutor
+from pokemongo_bot.services.evolution_planner import EvolutionJob, plan_lucky_egg_window
+from pokemongo_bot.worker_result import WorkerResult
 
 
 class EvolvePokemon(BaseTask):
     SUPPORTED_TASK_API_VERSION = 1
+    TRIGGER_EVENTS = ('inventory_changed',)
 
     def initialize(self):
         self.api = self.bot.api
@@ -17,6 +19,10 @@ class EvolvePokemon(BaseTask):
         self.evolve_above_iv = self.config.get('evolve_above_iv', 0.8)
         self.cp_iv_logic = self.config.get('logic', 'or')
         self.use_lucky_egg = self.config.get('use_lucky_egg', False)
+        self.minimum_evolve_for_lucky_egg = self.config.get('minimum_evolve_for_lucky_egg', 1)
+        # the session in progress, run a step at a time
+        self.job = None
+        self.executor = None
         self._validate_config()
 
     def _validate_config(self):
@@ -24,8 +30,20 @@ class EvolvePokemon(BaseTask):
             self.evolve_all = [str(pokemon_name).strip() for pokemon_name in self.evolve_all.split(',')]
 
     def work(self):
-        if not self._should_run():
-            return
+        if self.job is None:
+            self.job = self._plan_job()
+            if self.job is None:
+                return WorkerResult.SUCCESS
+
+        if not self.job.run():
+            # the next evolutions aren't due yet
+            return WorkerResult.RUNNING
+        self.job = None
+        return WorkerResult.SUCCESS
+
+    def _plan_job(self):
+        if not self.evolve_all or self.evolve_all[0] == 'none':
+            return None
 
         evolve_list = self._sort_and_filter()
 
@@ -33,49 +51,52 @@ class EvolvePokemon(BaseTask):
             # filter out non-listed pokemons
             evolve_list = filter(lambda x: x.name in self.evolve_all, evolve_list)
 
-        cache = {}
-        for pokemon in evolve_list:
-            if pokemon.can_evolve_now():
-                self._execute_pokemon_evolve(pokemon, cache)
-
-    def _should_run(self):
-        if not self.evolve_all or self.evolve_all[0] == 'none':
-            return False
+        # without egg left the pokemons are evolved anyway, and an egg in
+        # use is filled before using another one
+        lucky_eggs, active_window = 0, 0
+        if self.use_lucky_egg:
+            lucky_eggs = inventory.items().get(Item.ITEM_LUCKY_EGG.value).count
+            active_window = self.bot.lucky_egg_window()
+        plan = plan_lucky_egg_window(
+            evolve_list,
+            {family_id: inventory.candies().get(family_id).quantity
+             for family_id in set(pokemon.first_evolution_id for pokemon in evolve_list)},
+            evolve_latency=self.evolve_speed,
+            lucky_eggs=lucky_eggs,
+            minimum_evolutions=self.minimum_evolve_for_lucky_egg,
+            active_window=active_window
+        )
+
+        if plan.deferred and not plan.evolutions:
+            self.emit_event(
+                'skip_evolve',
+                formatted='Skipping evolve until there are enough Pokemon for a lucky egg.'
+            )
+            return None
 
-        # Evolve all is used - Use Lucky egg only at the first tick
-        if self.bot.tick_count is not 1 or not self.use_lucky_egg:
-            return True
+        self.executor = EvolveExecutor(self.bot, self.evolve_speed)
+        return EvolutionJob(plan, None, self._use_lucky_egg, self._evolve_pokemons,
+                            lucky_egg_until=self.bot.lucky_egg_until if active_window else None)
 
-        lucky_egg_count = self.bot.item_inventory_count(Item.ITEM_LUCKY_EGG.value)
-
-        # Make sure the user has a lucky egg and skip if not
-        if lucky_egg_count > 0:
-            response_dict_lucky_egg = self.bot.use_lucky_egg()
-            if response_dict_lucky_egg:
-                result = response_dict_lucky_egg.get('responses', {}).get('USE_ITEM_XP_BOOST', {}).get('result', 0)
-                if result is 1:  # Request success
-                    self.emit_event(
-                        'used_lucky_egg',
-                        formatted='Used lucky egg ({amount_left} left).',
-                        data={
-                             'amount_left': lucky_egg_count - 1
-                        }
-                    )
-                    return True
-                else:
-                    self.emit_event(
-                        'lucky_egg_error',
-                        level='error',
-                        formatted='Failed to use lucky egg!'
-                    )
-                    return False
-        else:
-            # Skipping evolve so they aren't wasted
+    def _use_lucky_egg(self):
+        response_dict_lucky_egg = self.bot.use_lucky_egg()
+        result = (response_dict_lucky_egg or {}).get('responses', {}).get('USE_ITEM_XP_BOOST', {}).get('result', 0)
+        if result is 1:  # Request success
             self.emit_event(
-                'skip_evolve',
-                formatted='Skipping evolve because has no lucky egg.'
+                'used_lucky_egg',
+                formatted='Used lucky egg ({amount_left} left).',
+                data={
+                     'amount_left': inventory.items().get(Item.ITEM_LUCKY_EGG.value).count
+                }
             )
-            return False
+            return True
+
+        self.emit_event(
+            'lucky_egg_error',
+            level='error',
+            formatted='Failed to use lucky egg!'
+        )
+        return False
 
     def _sort_and_filter(self):
         pokemons = []
@@ -95,12 +116,15 @@ class EvolvePokemon(BaseTask):
 
         return pokemons
 
-    def _execute_pokemon_evolve(self, pokemon, cache):
-        if pokemon.name in cache:
-            return False
+    def _evolve_pokemons(self, pokemons, limit):
+        results, left_over = self.executor.evolve(pokemons, limit)
 
-        response_dict = self.api.evolve_pokemon(pokemon_id=pokemon.id)
-        if response_dict.get('responses', {}).get('EVOLVE_POKEMON', {}).get('result', 0) == 1:
+        evolved = []
+        for result in results:
+            if not result.evolved:
+                continue
+
+            pokemon = result.pokemon
             self.emit_event(
                 'pokemon_evolved',
                 formatted="Successfully evolved {pokemon} with CP {cp} and IV {iv}!",
@@ -110,18 +134,9 @@ class EvolvePokemon(BaseTask):
                     'cp': pokemon.cp,
                     'ncp': '?',
                     'dps': '?',
-                    'xp': '?'
+                    'xp': result.xp
                 }
             )
-            awarded_candies = response_dict.get('responses', {}).get('EVOLVE_POKEMON', {}).get('candy_awarded', 0)
-            inventory.candies().get(pokemon.pokemon_id).consume(pokemon.evolution_cost - awarded_candies)
-            inventory.pokemons().remove(pokemon.id)
-            pokemon = Pokemon(response_dict.get('responses', {}).get('EVOLVE_POKEMON', {}).get('evolved_pokemon_data', {}))
-            inventory.pokemons().add(pokemon)
-            sleep(self.evolve_speed)
-            return True
-        else:
-            # cache pokemons we can't evolve. Less server calls
-            cache[pokemon.name] = 1
-            sleep(0.7)
-            return False
+            evolved.append(pokemon)
+
+        return evolved, left_over
@@ -1,11 +1,17 @@
+from pokemongo_bot import inventory
 from pokemongo_bot.human_behaviour import sleep
 from pokemongo_bot.base_task import BaseTask
 
 
 class IncubateEggs(BaseTask):
     SUPPORTED_TASK_API_VERSION = 1
+    RUN_INTERVAL = 60
+    TRIGGER_EVENTS = ('inventory_changed',)
+    TRIGGER_DISTANCE = 100
 
-    last_km_walked = 0
+    # username -> km walked when the next hatch was last announced, kept
+    # when the bot is re-created after an error
+    last_km_walked = {}
 
     def initialize(self):
         self.ready_incubators = []
@@ -17,16 +23,27 @@ class IncubateEggs(BaseTask):
 
         self._process_config()
 
+        # The raw inventory only needs to be scanned again once it has been
+        # refreshed from the server
+        self.inventory_changed = True
+        for event in (inventory.INVENTORY_REFRESHED, inventory.EGG_ADDED, inventory.EGG_HATCHED):
+            inventory.subscribe(event, self._on_inventory_changed)
+
+    def _on_inventory_changed(self, event, **kwargs):
+        self.inventory_changed = True
+
     def _process_config(self):
         self.longer_eggs_first = self.config.get("longer_eggs_first", True)
 
     def work(self):
-        try:
-            self._check_inventory()
-        except:
-            return
+        if self.inventory_changed:
+            try:
+                self._check_inventory()
+            except:
+                return
+            self.inventory_changed = False
 
-        if self.used_incubators and IncubateEggs.last_km_walked != self.km_walked:
+        if self.used_incubators and IncubateEggs.last_km_walked.get(self.bot.config.username) != self.km_walked:
             self.used_incubators.sort(key=lambda x: x.get("km"))
             km_left = self.used_incubators[0]['km']-self.km_walked
             if km_left <= 0:
@@ -39,7 +56,7 @@ class IncubateEggs(BaseTask):
                         'distance_in_km': km_left
                     }
                 )
-            IncubateEggs.last_km_walked = self.km_walked
+            IncubateEggs.last_km_walked[self.bot.config.username] = self.km_walked
 
         sorting = self.longer_eggs_first
         self.eggs.sort(key=lambda x: x.get("km"), reverse=sorting)
@@ -168,7 +185,8 @@ class IncubateEggs(BaseTask):
         candy = result.get('candy_awarded', "error")
         xp = result.get('experience_awarded', "error")
         sleep(self.hatching_animation_delay)
-        self.bot.latest_inventory = None
+        # publishes the hatched eggs and the new pokemons to the other tasks
+        inventory.refresh_inventory()
         try:
             pokemon_data = self._check_inventory(pokemon_ids)
             for pokemon in pokemon_data:
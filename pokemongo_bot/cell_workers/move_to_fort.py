@@ -39,6 +39,10 @@ class MoveToFort(BaseTask):
         if nearest_fort is None:
             return WorkerResult.SUCCESS
 
+        if not self.bot.coordinator.claim_fort(nearest_fort):
+            # another account is heading to it, the next tick picks another fort
+            return WorkerResult.RUNNING
+
         lat = nearest_fort['latitude']
         lng = nearest_fort['longitude']
         fortID = nearest_fort['id']
@@ -83,6 +87,7 @@ class MoveToFort(BaseTask):
             if not step_walker.step():
                 return WorkerResult.RUNNING
 
+        self.bot.coordinator.release_fort(nearest_fort)
         self.emit_event(
             'arrived_at_fort',
             formatted='Arrived at fort.'
@@ -135,6 +140,9 @@ class MoveToFort(BaseTask):
         # Remove stops that are still on timeout
         forts = filter(lambda x: x["id"] not in self.bot.fort_timeouts, forts)
 
+        # Remove stops other accounts are heading to, or in their region
+        forts = self.bot.coordinator.available_forts(forts)
+
         next_attracted_pts, lure_distance = self._get_nearest_fort_on_lure_way(forts)
 
         # Remove all forts which were spun in the last ticks to avoid circles if set
@@ -127,7 +127,7 @@ class MoveToMapPokemon(BaseTask):
             if pokemon['disappear_time'] < (now + self.config['min_time']):
                 continue
 
-            if self.was_caught(pokemon):
+            if self.was_caught(pokemon) or self.bot.encounter_cache.known(pokemon):
                 continue
 
             pokemon['priority'] = self.config['catch'].get(pokemon['name'], 0)
@@ -240,7 +240,7 @@ class MoveToMapPokemon(BaseTask):
         self.update_map_location()
         self.dump_caught_pokemon()
 
-        pokemon_list = self.get_pokemon_from_map()
+        pokemon_list = self.bot.coordinator.available_pokemon(self.get_pokemon_from_map())
         pokemon_list.sort(key=lambda x: x['dist'])
         if self.config['mode'] == 'priority':
             pokemon_list.sort(key=lambda x: x['priority'], reverse=True)
@@ -256,6 +256,10 @@ class MoveToMapPokemon(BaseTask):
         if (pokeballs + superballs) < self.min_ball and not pokemon['is_vip']:
             return WorkerResult.SUCCESS
 
+        if not self.bot.coordinator.claim_pokemon(pokemon):
+            # another account is already after it
+            return WorkerResult.RUNNING
+
         if self.config['snipe']:
             if self.config['snipe_high_prio_only']:
                 if self.config['snipe_high_prio_threshold'] < pokemon['priority'] or pokemon['is_vip']:
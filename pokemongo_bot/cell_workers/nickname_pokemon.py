@@ -5,6 +5,7 @@ import os
 import json
 from pokemongo_bot.base_task import BaseTask
 from pokemongo_bot.human_behaviour import sleep
+from pokemongo_bot import inventory
 from pokemongo_bot.inventory import pokemons, Pokemon, Attack
 
 import re
@@ -201,11 +202,32 @@ class NicknamePokemon(BaseTask):
             if os.path.isfile(fn):
                 self.translate = json.load(open(fn))
 
+        # Pokemons to (re)nickname by id, None until the first run which
+        # goes through all of them
+        self._pending = None
+        inventory.subscribe(inventory.POKEMON_ADDED, self._on_pokemon_changed)
+        inventory.subscribe(inventory.POKEMON_UPDATED, self._on_pokemon_changed)
+        inventory.subscribe(inventory.POKEMON_REMOVED, self._on_pokemon_removed)
+
+    def _on_pokemon_changed(self, event, pokemon):
+        if self._pending is not None:
+            self._pending[pokemon.id] = pokemon
+
+    def _on_pokemon_removed(self, event, pokemon):
+        if self._pending is not None:
+            self._pending.pop(pokemon.id, None)
+
     def work(self):
         """
-        Iterate over all user pokemons and nickname if needed
+        Iterate over the new or changed user pokemons and nickname if needed
         """
-        for pokemon in pokemons().all():  # type: Pokemon
+        if self._pending is None:
+            changed = pokemons().all()
+        else:
+            changed = self._pending.values()
+        self._pending = {}
+
+        for pokemon in changed:  # type: Pokemon
             if not pokemon.is_favorite or not self.ignore_favorites:
                 self._nickname_pokemon(pokemon)
 
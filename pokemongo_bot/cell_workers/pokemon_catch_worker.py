@@ -2,8 +2,9 @@
 
 import time
 from random import random
-from pokemongo_bot import inventory
+from pokemongo_bot import catch_decision, inventory
 from pokemongo_bot.base_task import BaseTask
+from pokemongo_bot.encounter_cache import EncounterCache
 from pokemongo_bot.human_behaviour import sleep
 from pokemongo_bot.inventory import Pokemon
 from pokemongo_bot.worker_result import WorkerResult
@@ -21,11 +22,6 @@ ITEM_GREATBALL = 2
 ITEM_ULTRABALL = 3
 ITEM_RAZZBERRY = 701
 
-LOGIC_TO_FUNCTION = {
-    'or': lambda x, y: x or y,
-    'and': lambda x, y: x and y
-}
-
 
 class PokemonCatchWorker(BaseTask):
 
@@ -57,6 +53,7 @@ class PokemonCatchWorker(BaseTask):
             response = responses[self.response_key]
             if response[self.response_status_key] != ENCOUNTER_STATUS_SUCCESS:
                 if response[self.response_status_key] == ENCOUNTER_STATUS_NOT_IN_RANGE:
+                    self.bot.encounter_cache.record(self.pokemon, EncounterCache.OUT_OF_RANGE)
                     self.emit_event('pokemon_not_in_range', formatted='Pokemon went out of range!')
                 elif response[self.response_status_key] == ENCOUNTER_STATUS_POKEMON_INVENTORY_FULL:
                     self.emit_event('pokemon_inventory_full', formatted='Your Pokemon inventory is full! Could not catch!')
@@ -70,6 +67,7 @@ class PokemonCatchWorker(BaseTask):
 
         # skip ignored pokemon
         if not self._should_catch_pokemon(pokemon):
+            self.bot.encounter_cache.record(self.pokemon, EncounterCache.REJECTED)
             return WorkerResult.SUCCESS
 
         # log encounter
@@ -138,177 +136,88 @@ class PokemonCatchWorker(BaseTask):
     # helpers
     ############################################################################
 
-    def _pokemon_matches_config(self, config, pokemon, default_logic='and'):
-        pokemon_config = config.get(pokemon.name, config.get('any'))
-
-        if not pokemon_config:
-            return False
-
-        catch_results = {
-            'cp': False,
-            'iv': False,
-        }
-
-        if pokemon_config.get('never_catch', False):
-            return False
-
-        if pokemon_config.get('always_catch', False):
-            return True
-
-        catch_cp = pokemon_config.get('catch_above_cp', 0)
-        if pokemon.cp > catch_cp:
-            catch_results['cp'] = True
-
-        catch_iv = pokemon_config.get('catch_above_iv', 0)
-        if pokemon.iv > catch_iv:
-            catch_results['iv'] = True
-
-        return LOGIC_TO_FUNCTION[pokemon_config.get('logic', default_logic)](*catch_results.values())
-
     def _should_catch_pokemon(self, pokemon):
-        return self._pokemon_matches_config(self.config.catch, pokemon)
+        return self.bot.rules.catch.matches(pokemon)
 
     def _is_vip_pokemon(self, pokemon):
-        # having just a name present in the list makes them vip
-        if self.config.vips.get(pokemon.name) == {}:
-            return True
-        return self._pokemon_matches_config(self.config.vips, pokemon, default_logic='or')
+        return self.bot.rules.vips.matches(pokemon)
 
     def _pct(self, rate_by_ball):
         return '{0:.2f}'.format(rate_by_ball * 100)
 
-    def _use_berry(self, berry_id, berry_count, encounter_id, catch_rate_by_ball, current_ball):
-        new_catch_rate_by_ball = []
-        self.emit_event(
-            'pokemon_catch_rate',
-            level='debug',
-            formatted='Catch rate of {catch_rate} with {ball_name} is low. Throwing {berry_name} (have {berry_count})',
-            data={
-                'catch_rate': self._pct(catch_rate_by_ball[current_ball]),
-                'ball_name': self.inventory.get(current_ball).name,
-                'berry_name': self.inventory.get(berry_id).name,
-                'berry_count': berry_count
-            }
-        )
-
-        response_dict = self.api.use_item_capture(
-            item_id=berry_id,
-            encounter_id=encounter_id,
-            spawn_point_id=self.spawn_point_guid
-        )
-        responses = response_dict['responses']
-
+    def _berry_thrown(self, response_dict, throw):
+        """
+        Handles the response to a berry thrown with a ball, returns True when
+        the berry was used.
+        """
         if response_dict and response_dict['status_code'] == 1:
-
-            # update catch rates using multiplier
-            if 'item_capture_mult' in responses['USE_ITEM_CAPTURE']:
-                for rate in catch_rate_by_ball:
-                    new_catch_rate_by_ball.append(rate * responses['USE_ITEM_CAPTURE']['item_capture_mult'])
+            use_item_capture = response_dict['responses'].get('USE_ITEM_CAPTURE', {})
+            if 'item_capture_mult' in use_item_capture:
                 self.emit_event(
                     'threw_berry',
                     formatted="Threw a {berry_name}! Catch rate with {ball_name} is now: {new_catch_rate}",
                     data={
-                        'berry_name': self.inventory.get(berry_id).name,
-                        'ball_name': self.inventory.get(current_ball).name,
-                        'new_catch_rate': self._pct(new_catch_rate_by_ball[current_ball])
+                        'berry_name': self.inventory.get(ITEM_RAZZBERRY).name,
+                        'ball_name': self.inventory.get(throw.ball).name,
+                        'new_catch_rate': self._pct(throw.catch_rate)
                     }
                 )
+                return True
 
             # softban?
-            else:
-                new_catch_rate_by_ball = catch_rate_by_ball
-                self.bot.softban = True
-                self.emit_event(
-                    'softban',
-                    level='warning',
-                    formatted='Failed to use berry. You may be softbanned.'
-                )
+            self.bot.softban = True
+            self.emit_event(
+                'softban',
+                level='warning',
+                formatted='Failed to use berry. You may be softbanned.'
+            )
 
         # unknown status code
         else:
-            new_catch_rate_by_ball = catch_rate_by_ball
             self.emit_event(
                 'threw_berry_failed',
                 formatted='Unknown response when throwing berry: {status_code}.',
                 data={
-                    'status_code': response_dict['status_code']
+                    'status_code': response_dict['status_code'] if response_dict else None
                 }
             )
-
-        return new_catch_rate_by_ball
+        return False
 
     def _do_catch(self, pokemon, encounter_id, catch_rate_by_ball, is_vip=False):
-        # settings that may be exposed at some point
         """
+        Throws balls until the pokemon is caught or flees, each of them picked
+        by the catch decision table of the pokemon with a berry when it is
+        worth it. The berry is sent in the same request as the ball.
 
         :type pokemon: Pokemon
         """
-        berry_id = ITEM_RAZZBERRY
-        maximum_ball = ITEM_ULTRABALL if is_vip else ITEM_GREATBALL
-        ideal_catch_rate_before_throw = 0.9 if is_vip else 0.35
+        value = catch_decision.VIP_VALUE if is_vip else catch_decision.POKEMON_VALUE
+        decision_table = catch_decision.table_for(pokemon.static.flee_rate, value)
 
         berry_count = self.inventory.get(ITEM_RAZZBERRY).count
         ball_count = {}
         for ball_id in [ITEM_POKEBALL, ITEM_GREATBALL, ITEM_ULTRABALL]:
             ball_count[ball_id] = self.inventory.get(ball_id).count
 
-        # use `min_ultraball_to_keep` from config if is not None
-        min_ultraball_to_keep = ball_count[ITEM_ULTRABALL]
-        if self.config.min_ultraball_to_keep is not None:
-            if self.config.min_ultraball_to_keep >= 0 and self.config.min_ultraball_to_keep < min_ultraball_to_keep:
-                min_ultraball_to_keep = self.config.min_ultraball_to_keep
+        # keep `min_ultraball_to_keep` ultraballs for the vip pokemon, all of
+        # them until the other balls run out when it isn't set
+        ultraballs_to_keep = 0
+        if not is_vip and self.config.min_ultraball_to_keep is not None and self.config.min_ultraball_to_keep >= 0:
+            ultraballs_to_keep = min(self.config.min_ultraball_to_keep, ball_count[ITEM_ULTRABALL])
 
         while True:
+            usable_ball_count = dict(ball_count)
+            if not is_vip and self.config.min_ultraball_to_keep is None:
+                if ball_count[ITEM_POKEBALL] + ball_count[ITEM_GREATBALL] > 0:
+                    usable_ball_count[ITEM_ULTRABALL] = 0
+            else:
+                usable_ball_count[ITEM_ULTRABALL] -= ultraballs_to_keep
 
-            # find lowest available ball
-            current_ball = ITEM_POKEBALL
-            while ball_count[current_ball] == 0 and current_ball < maximum_ball:
-                current_ball += 1
-            if ball_count[current_ball] == 0:
+            throw = decision_table.decide(catch_rate_by_ball, usable_ball_count, berry_count)
+            if throw is None:
                 self.emit_event('no_pokeballs', formatted='No usable pokeballs found!')
-
-                # use untraball if there is no other balls with constraint to `min_ultraball_to_keep`
-                if maximum_ball != ITEM_ULTRABALL and ball_count[ITEM_ULTRABALL] > min_ultraball_to_keep:
-                    maximum_ball = ITEM_ULTRABALL
-                    continue
-                else:
-                    break
-
-            # check future ball count
-            num_next_balls = 0
-            next_ball = current_ball
-            while next_ball < maximum_ball:
-                next_ball += 1
-                num_next_balls += ball_count[next_ball]
-
-            # check if we've got berries to spare
-            berries_to_spare = berry_count > 0 if is_vip else berry_count > num_next_balls + 30
-
-            # use a berry if we are under our ideal rate and have berries to spare
-            used_berry = False
-            if catch_rate_by_ball[current_ball] < ideal_catch_rate_before_throw and berries_to_spare:
-                new_catch_rate_by_ball = self._use_berry(berry_id, berry_count, encounter_id, catch_rate_by_ball, current_ball)
-                if new_catch_rate_by_ball != catch_rate_by_ball:
-                    catch_rate_by_ball = new_catch_rate_by_ball
-                    self.inventory.get(ITEM_RAZZBERRY).remove(1)
-                    berry_count -= 1
-                    used_berry = True
-
-            # pick the best ball to catch with
-            best_ball = current_ball
-            while best_ball < maximum_ball:
-                best_ball += 1
-                if catch_rate_by_ball[current_ball] < ideal_catch_rate_before_throw and ball_count[best_ball] > 0:
-                    # if current ball chance to catch is under our ideal rate, and player has better ball - then use it
-                    current_ball = best_ball
-
-            # if the rate is still low and we didn't throw a berry before, throw one
-            if catch_rate_by_ball[current_ball] < ideal_catch_rate_before_throw and berry_count > 0 and not used_berry:
-                new_catch_rate_by_ball = self._use_berry(berry_id, berry_count, encounter_id, catch_rate_by_ball, current_ball)
-                if new_catch_rate_by_ball != catch_rate_by_ball:
-                    catch_rate_by_ball = new_catch_rate_by_ball
-                    self.inventory.get(ITEM_RAZZBERRY).remove(1)
-                    berry_count -= 1
+                break
+            current_ball = throw.ball
 
             # Randomize the quality of the throw
             # Default structure
@@ -319,8 +228,44 @@ class PokemonCatchWorker(BaseTask):
             self.generate_spin_parameter(throw_parameters)
             self.generate_throw_quality_parameters(throw_parameters)
 
+            request = self.api.create_request()
+            if throw.use_berry:
+                self.emit_event(
+                    'pokemon_catch_rate',
+                    level='debug',
+                    formatted='Catch rate of {catch_rate} with {ball_name} is low. Throwing {berry_name} (have {berry_count})',
+                    data={
+                        'catch_rate': self._pct(catch_rate_by_ball[current_ball]),
+                        'ball_name': self.inventory.get(current_ball).name,
+                        'berry_name': self.inventory.get(ITEM_RAZZBERRY).name,
+                        'berry_count': berry_count
+                    }
+                )
+                request.use_item_capture(
+                    item_id=ITEM_RAZZBERRY,
+                    encounter_id=encounter_id,
+                    spawn_point_id=self.spawn_point_guid
+                )
+
             # try to catch pokemon!
             # TODO : Log which type of throw we selected
+            request.catch_pokemon(
+                encounter_id=encounter_id,
+                pokeball=current_ball,
+                normalized_reticle_size=throw_parameters['normalized_reticle_size'],
+                spawn_point_id=self.spawn_point_guid,
+                hit_pokemon=1,
+                spin_modifier=throw_parameters['spin_modifier'],
+                normalized_hit_position=throw_parameters['normalized_hit_position']
+            )
+            response_dict = request.call()
+
+            catch_rate = catch_rate_by_ball[current_ball]
+            if throw.use_berry and self._berry_thrown(response_dict, throw):
+                self.inventory.get(ITEM_RAZZBERRY).remove(1)
+                berry_count -= 1
+                catch_rate = throw.catch_rate
+
             ball_count[current_ball] -= 1
             self.inventory.get(current_ball).remove(1)
             self.emit_event(
@@ -328,21 +273,11 @@ class PokemonCatchWorker(BaseTask):
                 formatted='Used {ball_name}, with chance {success_percentage} ({count_left} left)',
                 data={
                     'ball_name': self.inventory.get(current_ball).name,
-                    'success_percentage': self._pct(catch_rate_by_ball[current_ball]),
+                    'success_percentage': self._pct(catch_rate),
                     'count_left': ball_count[current_ball]
                 }
             )
 
-            response_dict = self.api.catch_pokemon(
-                encounter_id=encounter_id,
-                pokeball=current_ball,
-                normalized_reticle_size=throw_parameters['normalized_reticle_size'],
-                spawn_point_id=self.spawn_point_guid,
-                hit_pokemon=1,
-                spin_modifier=throw_parameters['spin_modifier'],
-                normalized_hit_position=throw_parameters['normalized_hit_position']
-            )
-
             try:
                 catch_pokemon_status = response_dict['responses']['CATCH_POKEMON']['status']
             except KeyError:
@@ -360,6 +295,7 @@ class PokemonCatchWorker(BaseTask):
 
             # abandon if pokemon vanished
             elif catch_pokemon_status == CATCH_STATUS_VANISHED:
+                self.bot.encounter_cache.record(self.pokemon, EncounterCache.FLED)
                 self.emit_event(
                     'pokemon_vanished',
                     formatted='{pokemon} vanished!',
@@ -376,6 +312,7 @@ class PokemonCatchWorker(BaseTask):
 
             # pokemon caught!
             elif catch_pokemon_status == CATCH_STATUS_SUCCESS:
+                self.bot.encounter_cache.record(self.pokemon, EncounterCache.CAUGHT)
                 pokemon.id = response_dict['responses']['CATCH_POKEMON']['captured_pokemon_id']
                 self.bot.metrics.captured_pokemon(pokemon.name, pokemon.cp, pokemon.iv_display, pokemon.iv)
                 inventory.pokemons().add(pokemon)
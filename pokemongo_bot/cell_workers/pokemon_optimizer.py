@@ -1,10 +1,13 @@
 import copy
+import heapq
 import logging
 
 from pokemongo_bot import inventory
 from pokemongo_bot.base_task import BaseTask
-from pokemongo_bot.human_behaviour import sleep, action_delay
 from pokemongo_bot.item_list import Item
+from pokemongo_bot.services.evolve_executor import EvolveExecutor, EvolveResult
+from pokemongo_bot.services.evolution_planner import EvolutionJob, plan_lucky_egg_window
+from pokemongo_bot.services.transfer_executor import ReleaseResult, TransferExecutor
 from pokemongo_bot.worker_result import WorkerResult
 
 
@@ -12,7 +15,16 @@ class PokemonOptimizer(BaseTask):
     SUPPORTED_TASK_API_VERSION = 1
 
     def initialize(self):
-        self.family_by_family_id = {}
+        # family id -> {pokemon id: pokemon}, None until the first parse of
+        # the inventory, then kept up to date by the inventory events
+        self.family_by_family_id = None
+        # family id -> (transfer, evo_best, evo_crap) planned for the family,
+        # only the families changed since are planned again
+        self.plan_by_family_id = {}
+        self.changed_families = set()
+        # the evolution session in progress, run a step at a time
+        self.evolution_job = None
+        self.evolve_executor = None
         self.last_pokemon_count = 0
         self.logger = logging.getLogger(self.__class__.__name__)
 
@@ -22,31 +34,71 @@ class PokemonOptimizer(BaseTask):
         self.config_use_lucky_egg = self.config.get("use_lucky_egg", False)
         self.config_evolve_only_with_lucky_egg = self.config.get("evolve_only_with_lucky_egg", True)
         self.config_minimum_evolve_for_lucky_egg = self.config.get("minimum_evolve_for_lucky_egg", 90)
+        self.config_evolve_speed = self.config.get("evolve_speed", 20)
         self.config_keep = self.config.get("keep", [{"top": 1, "evolve": True, "sort": ["iv"]},
                                                     {"top": 1, "evolve": True, "sort": ["ncp"]},
                                                     {"top": 1, "evolve": False, "sort": ["cp"]}])
 
+        # Only optimize again when pokemons or candies changed since the
+        # last optimization
+        self.inventory_changed = True
+        for event in (inventory.POKEMON_ADDED, inventory.POKEMON_REMOVED,
+                      inventory.POKEMON_UPDATED, inventory.CANDY_CHANGED):
+            inventory.subscribe(event, self._on_inventory_changed)
+
+    def _on_inventory_changed(self, event, pokemon=None, candy=None, **kwargs):
+        self.inventory_changed = True
+        if self.family_by_family_id is None:
+            return
+
+        if candy is not None:
+            self.changed_families.add(candy.family_id)
+            return
+
+        family_id = pokemon.first_evolution_id
+        family = self.family_by_family_id.setdefault(family_id, {})
+        if event == inventory.POKEMON_REMOVED:
+            family.pop(pokemon.id, None)
+        else:
+            self.prepare_pokemon(pokemon)
+            family[pokemon.id] = pokemon
+        self.changed_families.add(family_id)
+
     def get_pokemon_slot_left(self):
         pokemon_count = len(inventory.pokemons()._data)
         
         if pokemon_count != self.last_pokemon_count:
             self.last_pokemon_count = pokemon_count
-            self.logger.info("Pokemon Bag: %s/%s", pokemon_count, self.bot._player["max_pokemon_storage"])
+            self.logger.info("Pokemon Bag: %s/%s", pokemon_count, self.bot.player_store.max_pokemon_storage)
         
-        return self.bot._player["max_pokemon_storage"] - pokemon_count
+        return self.bot.player_store.max_pokemon_storage - pokemon_count
 
     def work(self):
+        if self.evolution_job is not None:
+            return self.run_evolution_job()
+
         if self.get_pokemon_slot_left() > 5:
             return WorkerResult.SUCCESS
 
-        self.parse_inventory()
+        if not self.inventory_changed:
+            return WorkerResult.SUCCESS
+
+        if self.family_by_family_id is None:
+            self.parse_inventory()
+
+        for family_id in self.changed_families:
+            family = self.family_by_family_id.get(family_id)
+            if family:
+                self.plan_by_family_id[family_id] = self.get_family_optimized(family_id, family.values())
+            else:
+                self.plan_by_family_id.pop(family_id, None)
+        self.changed_families = set()
 
         transfer_all = []
         evo_all_best = []
         evo_all_crap = []
 
-        for family_id, family in self.family_by_family_id.items():
-            transfer, evo_best, evo_crap = self.get_family_optimized(family_id, family)
+        for transfer, evo_best, evo_crap in self.plan_by_family_id.itervalues():
             transfer_all += transfer
             evo_all_best += evo_best
             evo_all_crap += evo_crap
@@ -54,21 +106,40 @@ class PokemonOptimizer(BaseTask):
         evo_all = evo_all_best + evo_all_crap
 
         self.apply_optimization(transfer_all, evo_all)
+        return self.run_evolution_job()
+
+    def run_evolution_job(self):
+        job = self.evolution_job
+        if job is not None:
+            if not job.run():
+                # the next evolutions aren't due yet
+                return WorkerResult.RUNNING
+            if job.left_over:
+                self.logger.info("Lucky egg expired, %s Pokemons left to evolve", len(job.left_over))
+            self.evolution_job = None
+
         inventory.refresh_inventory()
 
+        # the changes made by this optimization don't call for another one
+        self.inventory_changed = False
+
         return WorkerResult.SUCCESS
 
     def parse_inventory(self):
-        self.family_by_family_id.clear()
+        self.family_by_family_id = {}
 
         for pokemon in inventory.pokemons().all():
-            family_id = pokemon.first_evolution_id
-            setattr(pokemon, "ncp", pokemon.cp_percent)
-            setattr(pokemon, "dps", pokemon.moveset.dps)
-            setattr(pokemon, "dps_attack", pokemon.moveset.dps_attack)
-            setattr(pokemon, "dps_defense", pokemon.moveset.dps_defense)
+            self.prepare_pokemon(pokemon)
+            self.family_by_family_id.setdefault(pokemon.first_evolution_id, {})[pokemon.id] = pokemon
+
+        self.plan_by_family_id = {}
+        self.changed_families = set(self.family_by_family_id)
 
-            self.family_by_family_id.setdefault(family_id, []).append(pokemon)
+    def prepare_pokemon(self, pokemon):
+        setattr(pokemon, "ncp", pokemon.cp_percent)
+        setattr(pokemon, "dps", pokemon.moveset.dps)
+        setattr(pokemon, "dps_attack", pokemon.moveset.dps_attack)
+        setattr(pokemon, "dps_defense", pokemon.moveset.dps_defense)
 
     def get_family_optimized(self, family_id, family):
         if family_id == 133:  # "Eevee"
@@ -92,8 +163,10 @@ class PokemonOptimizer(BaseTask):
         # Transfer each group of senior independently
         senior_family = [p for p in family if not p.has_next_evolution()]
         other_family = [p for p in family if p.has_next_evolution()]
-        senior_pids = set(p.pokemon_id for p in senior_family)
-        senior_grouped_family = {pid: [p for p in senior_family if p.pokemon_id == pid] for pid in senior_pids}
+        senior_grouped_family = {}
+        for p in senior_family:
+            senior_grouped_family.setdefault(p.pokemon_id, []).append(p)
+        senior_pids = set(senior_grouped_family)
 
         transfer_senior = []
 
@@ -115,7 +188,7 @@ class PokemonOptimizer(BaseTask):
                 for f in senior_grouped_family.values():
                     top += self.get_top_rank(f, criteria)
 
-                worst = self.get_sorted_family(top, criteria)[-1]
+                worst = min(top, key=lambda p: self.get_rank(p, criteria))
 
                 if criteria.get("evolve", True):
                     evolve_best += self.get_better_rank(family, criteria, worst)
@@ -131,12 +204,14 @@ class PokemonOptimizer(BaseTask):
         return (transfer, evo_best, evo_crap)
 
     def get_top_rank(self, family, criteria):
-        sorted_family = self.get_sorted_family(family, criteria)
-        worst = sorted_family[criteria.get("top", 1) - 1]
-        return [p for p in sorted_family if self.get_rank(p, criteria) >= self.get_rank(worst, criteria)]
+        best = heapq.nlargest(criteria.get("top", 1), family, key=lambda p: self.get_rank(p, criteria))
+        if not best:
+            return []
+        return self.get_better_rank(family, criteria, best[-1])
 
     def get_better_rank(self, family, criteria, worst):
-        return [p for p in self.get_sorted_family(family, criteria) if self.get_rank(p, criteria) >= self.get_rank(worst, criteria)]
+        worst_rank = self.get_rank(worst, criteria)
+        return self.get_sorted_family([p for p in family if self.get_rank(p, criteria) >= worst_rank], criteria)
 
     def get_sorted_family(self, family, criteria):
         return sorted(family, key=lambda p: self.get_rank(p, criteria), reverse=True)
@@ -155,9 +230,8 @@ class PokemonOptimizer(BaseTask):
         candies = inventory.candies().get(family_id).quantity
 
         # All the rest is crap, for now
-        crap = family[:]
-        crap = [p for p in crap if p not in evolve_best]
-        crap = [p for p in crap if p not in keep_best]
+        best_ids = set(p.id for p in evolve_best) | set(p.id for p in keep_best)
+        crap = [p for p in family if p.id not in best_ids]
         crap.sort(key=lambda p: p.iv, reverse=True)
 
         candies += len(crap)
@@ -201,7 +275,8 @@ class PokemonOptimizer(BaseTask):
                 keep_for_evo = 0
 
             evo_crap = [p for p in crap if p.has_next_evolution() and p.evolution_cost == junior_evolution_cost][:keep_for_evo]
-            transfer = [p for p in crap if p not in evo_crap]
+            evo_crap_ids = set(p.id for p in evo_crap)
+            transfer = [p for p in crap if p.id not in evo_crap_ids]
         else:
             evo_crap = []
             transfer = crap
@@ -209,56 +284,57 @@ class PokemonOptimizer(BaseTask):
         return (transfer, can_evolve_best, evo_crap)
 
     def apply_optimization(self, transfer, evo):
-        for pokemon in transfer:
-            self.transfer_pokemon(pokemon)
-
-        if len(evo) == 0:
-            return
-
-        if self.config_evolve and self.config_use_lucky_egg and (not self.bot.config.test):
-            lucky_egg = inventory.items().get(Item.ITEM_LUCKY_EGG.value)  # @UndefinedVariable
-
-            if self.config_evolve_only_with_lucky_egg and (lucky_egg.count == 0):
+        use_lucky_egg = self.config_evolve and self.config_use_lucky_egg and (not self.bot.config.test)
+        lucky_eggs = inventory.items().get(Item.ITEM_LUCKY_EGG.value).count if use_lucky_egg else 0  # @UndefinedVariable
+        # an egg in use is filled before using another one
+        active_window = self.bot.lucky_egg_window() if use_lucky_egg else 0
+
+        plan = plan_lucky_egg_window(evo,
+                                     {family_id: inventory.candies().get(family_id).quantity
+                                      for family_id in set(p.first_evolution_id for p in evo)},
+                                     transfers=transfer,
+                                     evolve_latency=self.config_evolve_speed,
+                                     lucky_eggs=lucky_eggs,
+                                     minimum_evolutions=self.config_minimum_evolve_for_lucky_egg,
+                                     require_lucky_egg=use_lucky_egg and self.config_evolve_only_with_lucky_egg,
+                                     active_window=active_window)
+
+        if len(evo) > 0:
+            if use_lucky_egg and self.config_evolve_only_with_lucky_egg and (lucky_eggs == 0) and not active_window:
                 self.logger.info("Skipping evolution step. No lucky egg available")
-                return
-
-            if len(evo) < self.config_minimum_evolve_for_lucky_egg:
-                self.logger.info("Skipping evolution step. Not enough Pokemons (%s) to evolve", len(evo))
-                return
-
-            self.use_lucky_egg()
-
-        self.logger.info("Evolving %s Pokemons", len(evo))
+            elif not plan.evolutions:
+                self.logger.info("Skipping evolution step. Not enough Pokemons (%s) to evolve", len(plan.deferred))
+            else:
+                self.logger.info("Evolving %s Pokemons for %s xp", len(plan.evolutions), plan.expected_xp)
 
-        for pokemon in evo:
-            self.evolve_pokemon(pokemon)
+        self.evolve_executor = EvolveExecutor(self.bot, self.config_evolve_speed)
+        self.evolution_job = EvolutionJob(plan, self.transfer_pokemons, self.use_lucky_egg, self.evolve_pokemons,
+                                          lucky_egg_until=self.bot.lucky_egg_until if active_window else None)
 
-    def transfer_pokemon(self, pokemon):
+    def transfer_pokemons(self, pokemons):
         if self.config_transfer and (not self.bot.config.test):
-            response_dict = self.bot.api.release_pokemon(pokemon_id=pokemon.id)
+            results = TransferExecutor(self.bot).release(pokemons)
         else:
-            response_dict = {"responses": {"RELEASE_POKEMON": {"candy_awarded": 0}}}
-
-        if not response_dict:
-            return False
-
-        self.emit_event("pokemon_release",
-                        formatted="Exchanged {pokemon} [IV {iv}] [CP {cp}] [NCP {ncp}] [DPS {dps}]",
-                        data={"pokemon": pokemon.name,
-                              "iv": pokemon.iv,
-                              "cp": pokemon.cp,
-                              "ncp": round(pokemon.ncp, 2),
-                              "dps": round(pokemon.dps, 2)})
-
-        if self.config_transfer and (not self.bot.config.test):
-            candy = response_dict.get("responses", {}).get("RELEASE_POKEMON", {}).get("candy_awarded", 0)
-
-            inventory.candies().get(pokemon.pokemon_id).add(candy)
-            inventory.pokemons().remove(pokemon.id)
+            results = [ReleaseResult(pokemon, True, 0) for pokemon in pokemons]
+
+        for pokemon, released, _ in results:
+            if not released:
+                self.emit_event("pokemon_release_failed",
+                                formatted="Failed to exchange {pokemon} [CP {cp}] [IV {iv}].",
+                                data={"pokemon": pokemon.name,
+                                      "cp": pokemon.cp,
+                                      "iv": pokemon.iv})
+                continue
 
-            action_delay(self.bot.config.action_wait_min, self.bot.config.action_wait_max)
+            self.emit_event("pokemon_release",
+                            formatted="Exchanged {pokemon} [IV {iv}] [CP {cp}] [NCP {ncp}] [DPS {dps}]",
+                            data={"pokemon": pokemon.name,
+                                  "iv": pokemon.iv,
+                                  "cp": pokemon.cp,
+                                  "ncp": round(pokemon.ncp, 2),
+                                  "dps": round(pokemon.dps, 2)})
 
-        return True
+        return all(result.released for result in results)
 
     def use_lucky_egg(self):
         lucky_egg = inventory.items().get(Item.ITEM_LUCKY_EGG.value)  # @UndefinedVariable
@@ -277,8 +353,7 @@ class PokemonOptimizer(BaseTask):
         result = response_dict.get("responses", {}).get("USE_ITEM_XP_BOOST", {}).get("result", 0)
 
         if result == 1:
-            lucky_egg.remove(1)
-
+            # the bot took it out of the inventory
             self.emit_event("used_lucky_egg",
                             formatted="Used lucky egg ({amount_left} left).",
                             data={"amount_left": lucky_egg.count})
@@ -289,40 +364,25 @@ class PokemonOptimizer(BaseTask):
                             formatted="Failed to use lucky egg!")
             return False
 
-    def evolve_pokemon(self, pokemon):
+    def evolve_pokemons(self, pokemons, limit=None):
         if self.config_evolve and (not self.bot.config.test):
-            response_dict = self.bot.api.evolve_pokemon(pokemon_id=pokemon.id)
+            results, left_over = self.evolve_executor.evolve(pokemons, limit)
         else:
-            response_dict = {"responses": {"EVOLVE_POKEMON": {"result": 1}}}
+            results, left_over = [EvolveResult(pokemon, True, None, 0, 0) for pokemon in pokemons], []
 
-        if not response_dict:
-            return False
-
-        result = response_dict.get("responses", {}).get("EVOLVE_POKEMON", {}).get("result", 0)
-
-        if result != 1:
-            return False
-
-        xp = response_dict.get("responses", {}).get("EVOLVE_POKEMON", {}).get("experience_awarded", 0)
-        candy = response_dict.get("responses", {}).get("EVOLVE_POKEMON", {}).get("candy_awarded", 0)
-        evolution = response_dict.get("responses", {}).get("EVOLVE_POKEMON", {}).get("evolved_pokemon_data", {})
-
-        self.emit_event("pokemon_evolved",
-                        formatted="Evolved {pokemon} [IV {iv}] [CP {cp}] [NCP {ncp}] [DPS {dps}] [+{xp} xp]",
-                        data={"pokemon": pokemon.name,
-                              "iv": pokemon.iv,
-                              "cp": pokemon.cp,
-                              "ncp": round(pokemon.ncp, 2),
-                              "dps": round(pokemon.dps, 2),
-                              "xp": xp})
-
-        if self.config_evolve and (not self.bot.config.test):
-            inventory.candies().get(pokemon.pokemon_id).consume(pokemon.evolution_cost - candy)
-            inventory.pokemons().remove(pokemon.id)
-
-            new_pokemon = inventory.Pokemon(evolution)
-            inventory.pokemons().add(new_pokemon)
-
-            sleep(20)
+        evolved = []
+        for pokemon, success, _, xp, _ in results:
+            if not success:
+                continue
 
-        return True
+            self.emit_event("pokemon_evolved",
+                            formatted="Evolved {pokemon} [IV {iv}] [CP {cp}] [NCP {ncp}] [DPS {dps}] [+{xp} xp]",
+                            data={"pokemon": pokemon.name,
+                                  "iv": pokemon.iv,
+                                  "cp": pokemon.cp,
+                                  "ncp": round(pokemon.ncp, 2),
+                                  "dps": round(pokemon.dps, 2),
+                                  "xp": xp})
+            evolved.append(pokemon)
+
+        return evolved, left_over
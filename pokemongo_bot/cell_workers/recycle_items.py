@@ -6,6 +6,7 @@ from pokemongo_bot.base_dir import _base_dir
 from pokemongo_bot.base_task import BaseTask
 from pokemongo_bot.human_behaviour import action_delay
 from pokemongo_bot.services.item_recycle_worker import ItemRecycler
+from pokemongo_bot.services.recycle_planner import plan_recycling
 from pokemongo_bot.tree_config_builder import ConfigException
 from pokemongo_bot.worker_result import WorkerResult
 
@@ -43,6 +44,8 @@ class RecycleItems(BaseTask):
     }
     """
     SUPPORTED_TASK_API_VERSION = 1
+    RUN_INTERVAL = 300
+    TRIGGER_EVENTS = ('inventory_changed',)
 
 
     def initialize(self):
@@ -53,6 +56,8 @@ class RecycleItems(BaseTask):
         self.max_berries_keep = self.config.get('max_berries_keep', None)
         self.max_revives_keep = self.config.get('max_revives_keep', None)
         self._validate_item_filter()
+        self.keep_by_item_id = self._get_keep_by_item_id()
+        self.category_caps = self._get_category_caps()
 
     def _validate_item_filter(self):
         """
@@ -85,130 +90,51 @@ class RecycleItems(BaseTask):
         :return: Returns whether or not the task went well
         :rtype: WorkerResult
         """
-
-        # TODO: Use new inventory everywhere and then remove this inventory update
-        inventory.refresh_inventory()
-
         worker_result = WorkerResult.SUCCESS
-        if self.should_run():
-
-            if not (self.max_balls_keep is None):
-                worker_result = self.recycle_excess_category_max(self.max_balls_keep, [1,2,3,4])
-            if not (self.max_potions_keep is None):
-                worker_result = self.recycle_excess_category_max(self.max_potions_keep, [101,102,103,104])
-            if not (self.max_berries_keep is None):
-                worker_result = self.recycle_excess_category_max(self.max_berries_keep, [701,702,703,704,705])
-            if not (self.max_revives_keep is None):
-                worker_result = self.recycle_excess_category_max(self.max_revives_keep, [201,202])
-
-            inventory.refresh_inventory()
-
-            for item_in_inventory in inventory.items().all():
-
-                if self.item_should_be_recycled(item_in_inventory):
-                    # Make the bot appears more human
-                    action_delay(self.bot.config.action_wait_min, self.bot.config.action_wait_max)
-                    # If at any recycling process call we got an error, we consider that the result of this task is error too.
-                    if ItemRecycler(self.bot, item_in_inventory, self.get_amount_to_recycle(item_in_inventory)).work() == WorkerResult.ERROR:
-                        worker_result = WorkerResult.ERROR
-
-        return worker_result
-
-    def recycle_excess_category_max(self, category_max, category_items_list):
-        """
-        Recycle the item which excess the category max
-        :param category_max:
-        :param category_items_list:
-        :return: none:
-        :rtype: None
-        """
-        worker_result = WorkerResult.SUCCESS
-        category_inventory = self.get_category_inventory_list(category_items_list)
-        category_count = 0
-        for i in category_inventory:
-           category_count = category_count + i[1]
-        items_to_recycle = self.get_category_items_to_recycle(category_inventory, category_count, category_max)
-        for item in items_to_recycle:
-            action_delay(self.bot.config.action_wait_min, self.bot.config.action_wait_max)
-            if ItemRecycler(self.bot, inventory.items().get(item[0]), item[1]).work() == WorkerResult.ERROR:
+        if not self.should_run():
+            return worker_result
+
+        items = inventory.items()
+        amounts = plan_recycling(
+            {item.id: item.count for item in items.all()},
+            self.keep_by_item_id,
+            self.category_caps
+        )
+
+        for index, (item_id, amount) in enumerate(amounts.iteritems()):
+            if index > 0:
+                # Make the bot appears more human
+                action_delay(self.bot.config.action_wait_min, self.bot.config.action_wait_max)
+            # If at any recycling process call we got an error, we consider that the result of this task is error too.
+            if ItemRecycler(self.bot, items.get(item_id), amount).work() == WorkerResult.ERROR:
                 worker_result = WorkerResult.ERROR
-        return worker_result
-
-    def get_category_inventory_list(self, category_inventory):
-        """
-        Returns an array of items with the item id and item count.
-        :param category_inventory:
-        :return: array of items within a category:
-        :rtype: array
-        """
-        x = 0
-        category_inventory_list = []
-        for c in category_inventory:
-            category_inventory_list.append([])
-            category_inventory_list[x].append(c)
-            category_inventory_list[x].append(inventory.items().get(c).count)
-            x = x + 1
-        return category_inventory_list
-
-    def get_category_items_to_recycle(self, category_inventory, category_count, category_max):
-        """
-        Returns an array to be recycle within a category of items with the item id and item count.
-        :param category_inventory:
-        :param category_count:
-        :param category_max:
-        :return: array of items to be recycle.
-        :rtype: array
-        """
-        x = 0
-        items_to_recycle = []
-        if category_count > category_max:
-            items_to_be_recycled = category_count - category_max
-
-            for item in category_inventory:
-                if items_to_be_recycled == 0: 
-                    break
-                if items_to_be_recycled >= item[1]:
-                    items_to_recycle.append([])
-                    items_to_recycle[x].append(item[0])
-                    items_to_recycle[x].append(item[1])
-                else:
-                    items_to_recycle.append([])
-                    items_to_recycle[x].append(item[0])
-                    items_to_recycle[x].append(items_to_be_recycled)
-                items_to_be_recycled = items_to_be_recycled - items_to_recycle[x][1]      
-                x = x + 1
-        return items_to_recycle
 
-    def item_should_be_recycled(self, item):
-        """
-        Returns a value indicating whether the item should be recycled.
-        :param item: The Item to test
-        :return: True if the title should be recycled; otherwise, False.
-        :rtype: bool
-        """
-        return (item.name in self.items_filter or str(item.id) in self.items_filter) and self.get_amount_to_recycle(item) > 0
-
-    def get_amount_to_recycle(self, item):
-        """
-        Determine the amount to recycle accordingly to user config
-        :param item: Item to determine the amount to recycle.
-        :return: The amount to recycle
-        :rtype: int
-        """
-        amount_to_keep = self.get_amount_to_keep(item)
-        return 0 if amount_to_keep is None else item.count - amount_to_keep
+        return worker_result
 
-    def get_amount_to_keep(self, item):
-        """
-        Determine item's amount to keep in inventory.
-        :param item:
-        :return: Item's amount to keep in inventory.
-        :rtype: int
-        """
-        item_filter_config = self.items_filter.get(item.name, 0)
-        if item_filter_config is not 0:
-            return item_filter_config.get('keep', 20)
-        else:
-            item_filter_config = self.items_filter.get(str(item.id), 0)
-            if item_filter_config is not 0:
-                return item_filter_config.get('keep', 20)
+    def _get_keep_by_item_id(self):
+        """
+        Resolve the amount to keep of every item of the item filter.
+        :return: Item's ID -> amount to keep.
+        :rtype: dict
+        """
+        inventory.Items.init_static_data()
+        keep_by_item_id = {}
+        for item_id, item_name in inventory.Items.STATIC_DATA.iteritems():
+            item_filter_config = self.items_filter.get(item_name, self.items_filter.get(item_id))
+            if item_filter_config is not None:
+                keep_by_item_id[int(item_id)] = item_filter_config.get('keep', 20)
+        return keep_by_item_id
+
+    def _get_category_caps(self):
+        """
+        List the maximum of every category configured with the items it includes.
+        :return: List of (maximum, item ids).
+        :rtype: list
+        """
+        categories = [
+            (self.max_balls_keep, [1, 2, 3, 4]),
+            (self.max_potions_keep, [101, 102, 103, 104]),
+            (self.max_berries_keep, [701, 702, 703, 704, 705]),
+            (self.max_revives_keep, [201, 202])
+        ]
+        return [(maximum, item_ids) for maximum, item_ids in categories if maximum is not None]
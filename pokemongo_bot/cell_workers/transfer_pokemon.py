@@ -2,19 +2,46 @@ import json
 import os
 
 from pokemongo_bot import inventory
-from pokemongo_bot.human_behaviour import action_delay
 from pokemongo_bot.base_task import BaseTask
 from pokemongo_bot.inventory import Pokemons, Pokemon
+from pokemongo_bot.rules import AND, OR
+from pokemongo_bot.services.transfer_executor import TransferExecutor
 
 
 class TransferPokemon(BaseTask):
     SUPPORTED_TASK_API_VERSION = 1
 
+    def initialize(self):
+        # Species having new or changed pokemons since the last run, None
+        # until the first run which goes through all of them
+        self.changed_species = None
+        inventory.subscribe(inventory.POKEMON_ADDED, self._on_pokemon_changed)
+        inventory.subscribe(inventory.POKEMON_UPDATED, self._on_pokemon_changed)
+
+    def _on_pokemon_changed(self, event, pokemon):
+        if self.changed_species is not None:
+            self.changed_species.add(pokemon.pokemon_id)
+
     def work(self):
-        pokemon_groups = self._release_pokemon_get_groups()
+        if self.changed_species is not None and not self.changed_species:
+            return
+
+        species = self.changed_species
+        self.changed_species = set()
+
+        pokemon_groups = self._release_pokemon_get_groups(species)
+
+        # evaluate the release rules of all the candidates in one pass
+        candidates = [pokemon for group in pokemon_groups.itervalues() for pokemon in group]
+        matches = self.bot.rules.release.matches_many(candidates)
+        rule_matches = {pokemon.id: matched for pokemon, matched in zip(candidates, matches)}
+
+        # released together at the end, several of them per request
+        to_release = []
+
         for pokemon_id, group in pokemon_groups.iteritems():
             pokemon_name = Pokemons.name_for(pokemon_id)
-            keep_best, keep_best_cp, keep_best_iv = self._validate_keep_best_config(pokemon_name)
+            keep_best, keep_best_cp, keep_best_iv = self._validate_keep_best_config(pokemon_id)
 
             if keep_best:
                 best_pokemon_ids = set()
@@ -43,7 +70,8 @@ class TransferPokemon(BaseTask):
                             all_pokemons.remove(pokemon)
                             best_pokemons.append(pokemon)
 
-                transfer_pokemons = [pokemon for pokemon in all_pokemons if self.should_release_pokemon(pokemon,True)]
+                transfer_pokemons = [pokemon for pokemon in all_pokemons
+                                     if self.should_release_pokemon(pokemon, True, rule_matches[pokemon.id])]
 
                 if transfer_pokemons:
                     if best_pokemons:
@@ -56,21 +84,24 @@ class TransferPokemon(BaseTask):
                                 'criteria': order_criteria
                             }
                         )
-                    for pokemon in transfer_pokemons:
-                        self.release_pokemon(pokemon)
+                    to_release.extend(transfer_pokemons)
             else:
                 group = sorted(group, key=lambda x: x.cp, reverse=True)
                 for pokemon in group:
-                    if self.should_release_pokemon(pokemon):
-                        self.release_pokemon(pokemon)
+                    if self.should_release_pokemon(pokemon, matched=rule_matches[pokemon.id]):
+                        to_release.append(pokemon)
+
+        self.release_pokemons(to_release)
 
-    def _release_pokemon_get_groups(self):
+    def _release_pokemon_get_groups(self, species=None):
         pokemon_groups = {}
-        # TODO: Use new inventory everywhere and then remove the inventory update
-        for pokemon in inventory.pokemons(True).all():
+        for pokemon in inventory.pokemons().all():
             if pokemon.in_fort or pokemon.is_favorite:
                 continue
 
+            if species is not None and pokemon.pokemon_id not in species:
+                continue
+
             group_id = pokemon.pokemon_id
 
             if group_id not in pokemon_groups:
@@ -80,45 +111,20 @@ class TransferPokemon(BaseTask):
 
         return pokemon_groups
 
-    def should_release_pokemon(self, pokemon, keep_best_mode = False):
-        release_config = self._get_release_config_for(pokemon.name)
-
-        if (keep_best_mode
-            and not release_config.has_key('never_release')
-            and not release_config.has_key('always_release')
-            and not release_config.has_key('release_below_cp')
-            and not release_config.has_key('release_below_iv')):
-            return True
-
-        cp_iv_logic = release_config.get('logic')
-        if not cp_iv_logic:
-            cp_iv_logic = self._get_release_config_for('any').get('logic', 'and')
-
-        release_results = {
-            'cp': False,
-            'iv': False,
-        }
-
-        if release_config.get('never_release', False):
-            return False
+    def should_release_pokemon(self, pokemon, keep_best_mode=False, matched=None):
+        """
+        `matched` is the result of the release rule of the pokemon when it
+        was already evaluated.
+        """
+        rule = self.bot.rules.release.rule(pokemon.pokemon_id)
 
-        if release_config.get('always_release', False):
+        if keep_best_mode and not rule.has_condition:
             return True
 
-        release_cp = release_config.get('release_below_cp', 0)
-        if pokemon.cp < release_cp:
-            release_results['cp'] = True
+        if matched is None:
+            matched = rule.matches(pokemon.cp, pokemon.iv)
 
-        release_iv = release_config.get('release_below_iv', 0)
-        if pokemon.iv < release_iv:
-            release_results['iv'] = True
-
-        logic_to_function = {
-            'or': lambda x, y: x or y,
-            'and': lambda x, y: x and y
-        }
-
-        if logic_to_function[cp_iv_logic](*release_results.values()):
+        if matched and rule.mode in (AND, OR):
             self.emit_event(
                 'future_pokemon_release',
                 formatted="Releasing {pokemon} [CP {cp}] [IV {iv}] based on rule: CP < {below_cp} {cp_iv_logic} IV < {below_iv}",
@@ -126,58 +132,57 @@ class TransferPokemon(BaseTask):
                     'pokemon': pokemon.name,
                     'cp': pokemon.cp,
                     'iv': pokemon.iv,
-                    'below_cp': release_cp,
-                    'cp_iv_logic': cp_iv_logic.upper(),
-                    'below_iv': release_iv
+                    'below_cp': rule.cp_limit,
+                    'cp_iv_logic': rule.logic.upper(),
+                    'below_iv': rule.iv_limit
                 }
             )
 
-        return logic_to_function[cp_iv_logic](*release_results.values())
+        return bool(matched)
 
     def release_pokemon(self, pokemon):
         """
 
         :type pokemon: Pokemon
         """
-        try:
-            if self.bot.config.test:
-                candy_awarded = 1
-            else:
-                response_dict = self.bot.api.release_pokemon(pokemon_id=pokemon.id)
-                candy_awarded = response_dict['responses']['RELEASE_POKEMON']['candy_awarded']
-        except KeyError:
-            return
+        self.release_pokemons([pokemon])
+
+    def release_pokemons(self, pokemons):
+        """
+
+        :type pokemons: list of Pokemon
+        """
+        for result in TransferExecutor(self.bot).release(pokemons):
+            pokemon = result.pokemon
+            if not result.released:
+                self.emit_event(
+                    'pokemon_release_failed',
+                    formatted='Failed to exchange {pokemon} [CP {cp}] [IV {iv}].',
+                    data={
+                        'pokemon': pokemon.name,
+                        'cp': pokemon.cp,
+                        'iv': pokemon.iv
+                    }
+                )
+                continue
+
+            self.bot.metrics.released_pokemon()
+            self.emit_event(
+                'pokemon_release',
+                formatted='Exchanged {pokemon} [CP {cp}] [IV {iv}] for candy.',
+                data={
+                    'pokemon': pokemon.name,
+                    'cp': pokemon.cp,
+                    'iv': pokemon.iv,
+                    'ncp': pokemon.cp_percent,
+                    'dps': pokemon.moveset.dps
+                }
+            )
 
-        # We could refresh here too, but adding 1 saves a inventory request
-        candy = inventory.candies().get(pokemon.pokemon_id)
-        candy.add(candy_awarded)
-        inventory.pokemons().remove(pokemon.id)
-        self.bot.metrics.released_pokemon()
-        self.emit_event(
-            'pokemon_release',
-            formatted='Exchanged {pokemon} [CP {cp}] [IV {iv}] for candy.',
-            data={
-                'pokemon': pokemon.name,
-                'cp': pokemon.cp,
-                'iv': pokemon.iv,
-                'ncp': pokemon.cp_percent,
-                'dps': pokemon.moveset.dps
-            }
-        )
-        action_delay(self.bot.config.action_wait_min, self.bot.config.action_wait_max)
-
-    def _get_release_config_for(self, pokemon):
-        release_config = self.bot.config.release.get(pokemon)
-        if not release_config:
-            release_config = self.bot.config.release.get('any')
-        if not release_config:
-            release_config = {}
-        return release_config
-
-    def _validate_keep_best_config(self, pokemon_name):
+    def _validate_keep_best_config(self, pokemon_id):
         keep_best = False
 
-        release_config = self._get_release_config_for(pokemon_name)
+        release_config = self.bot.rules.release.rule(pokemon_id).config
 
         keep_best_cp = release_config.get('keep_best_cp', 0)
         keep_best_iv = release_config.get('keep_best_iv', 0)
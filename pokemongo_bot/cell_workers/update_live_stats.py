@@ -58,6 +58,8 @@ class UpdateLiveStats(BaseTask):
     - most_perfect_pokemon : The most perfect caught pokemon since the bot started.
     """
     SUPPORTED_TASK_API_VERSION = 1
+    RUN_INTERVAL = 10
+    TRIGGER_EVENTS = ('level_up',)
 
     def __init__(self, bot, config):
         """
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+import sqlite3
+import threading
+import time
+
+from s2sphere import CellId, LatLng
+
+
+class MemoryLeaseStore(object):
+    """
+    Leases shared by the accounts running in the same process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (kind, key) -> (owner, expiration time)
+        self._leases = {}
+
+    def claim(self, kind, key, owner, ttl):
+        """
+        Gives the lease of `key` to `owner` for `ttl` seconds, unless another
+        owner holds it. Returns True when `owner` holds the lease.
+        """
+        now = time.time()
+        with self._lock:
+            current = self._leases.get((kind, key))
+            if current is not None and current[0] != owner and current[1] > now:
+                return False
+            self._leases[(kind, key)] = (owner, now + ttl)
+            return True
+
+    def release(self, kind, key, owner):
+        with self._lock:
+            current = self._leases.get((kind, key))
+            if current is not None and current[0] == owner:
+                del self._leases[(kind, key)]
+
+    def holders(self, kind):
+        """
+        Returns the owner of every live lease of this kind, by key.
+        """
+        now = time.time()
+        with self._lock:
+            for lease, (_, expires) in self._leases.items():
+                if expires <= now:
+                    del self._leases[lease]
+            return {
+                key: owner
+                for (lease_kind, key), (owner, _) in self._leases.iteritems()
+                if lease_kind == kind
+            }
+
+
+class SqliteLeaseStore(object):
+    """
+    Leases kept in a SQLite file, shared by the accounts of every process
+    using the same file.
+    """
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self.logger = logging.getLogger(type(self).__name__)
+        # sqlite connections can't be shared between threads
+        self._local = threading.local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS leases ('
+            'kind TEXT, key TEXT, owner TEXT, expires REAL, '
+            'PRIMARY KEY (kind, key))'
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # autocommit, the transactions are opened explicitly
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            self._local.connection = connection
+        return connection
+
+    def claim(self, kind, key, owner, ttl):
+        """
+        Same as MemoryLeaseStore.claim, the lease isn't given when the
+        database stays locked longer than `timeout`.
+        """
+        now = time.time()
+        connection = self._connection()
+        try:
+            # takes the write lock right away, so no other process can claim
+            # the same key between the select and the insert
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute('DELETE FROM leases WHERE expires <= ?', (now,))
+            row = connection.execute(
+                'SELECT owner FROM leases WHERE kind = ? AND key = ?', (kind, key)
+            ).fetchone()
+            if row is not None and row[0] != owner:
+                connection.execute('ROLLBACK')
+                return False
+            connection.execute(
+                'INSERT OR REPLACE INTO leases VALUES (?, ?, ?, ?)', (kind, key, owner, now + ttl)
+            )
+            connection.execute('COMMIT')
+        except sqlite3.OperationalError as e:
+            self.logger.warning('Could not claim the {} {}: {}'.format(kind, key, e))
+            self._rollback(connection)
+            return False
+        except sqlite3.Error:
+            self._rollback(connection)
+            raise
+        return True
+
+    def _rollback(self, connection):
+        try:
+            connection.execute('ROLLBACK')
+        except sqlite3.Error:
+            # no transaction was opened
+            pass
+
+    def release(self, kind, key, owner):
+        self._connection().execute(
+            'DELETE FROM leases WHERE kind = ? AND key = ? AND owner = ?', (kind, key, owner)
+        )
+
+    def holders(self, kind):
+        rows = self._connection().execute(
+            'SELECT key, owner FROM leases WHERE kind = ? AND expires > ?', (kind, time.time())
+        )
+        return {key: owner for key, owner in rows}
+
+
+# one store per process and backend, shared by the bots of all the accounts
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(backend, path=None):
+    if backend == 'none':
+        return None
+    with _stores_lock:
+        store = _stores.get((backend, path))
+        if store is None:
+            if backend == 'memory':
+                store = MemoryLeaseStore()
+            elif backend == 'sqlite':
+                store = SqliteLeaseStore(path)
+            else:
+                raise ValueError('Unknown coordination backend {}'.format(backend))
+            _stores[(backend, path)] = store
+        return store
+
+
+class Coordinator(object):
+    """
+    Keeps the accounts running side by side out of each other's way.
+
+    Moving to a fort leases it and the S2 cell around it (the region) to the
+    account, the other accounts ignore the forts of that region until the
+    lease expires. The Pokémon an account walks to are leased the same way, by
+    encounter id.
+
+    Without a store every fort and Pokémon is available.
+    """
+
+    def __init__(self, store, owner, lease_time=300, region_level=14):
+        self.store = store
+        self.owner = owner
+        self.lease_time = lease_time
+        self.region_level = region_level
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            open_store(config.coordination_backend, config.coordination_path),
+            config.username,
+            lease_time=config.coordination_lease_time,
+            region_level=config.coordination_region_level
+        )
+
+    @property
+    def enabled(self):
+        return self.store is not None
+
+    def region_of(self, latitude, longitude):
+        cell_id = CellId.from_lat_lng(LatLng.from_degrees(latitude, longitude))
+        return '{}'.format(cell_id.parent(self.region_level).id())
+
+    def available_forts(self, forts):
+        """
+        Returns the forts which are not leased to another account, and not in
+        the region of another account.
+        """
+        if not self.enabled or not forts:
+            return forts
+        taken_forts = self._taken('fort')
+        taken_regions = self._taken('region')
+        return [
+            fort for fort in forts
+            if fort['id'] not in taken_forts and
+            self.region_of(fort['latitude'], fort['longitude']) not in taken_regions
+        ]
+
+    def claim_fort(self, fort):
+        """
+        Leases the fort and its region, returns False when another account
+        got one of them first. Then neither is kept.
+        """
+        if not self.enabled:
+            return True
+        region = self.region_of(fort['latitude'], fort['longitude'])
+        if not self.store.claim('region', region, self.owner, self.lease_time):
+            return False
+        if not self.store.claim('fort', fort['id'], self.owner, self.lease_time):
+            self.store.release('region', region, self.owner)
+            return False
+        return True
+
+    def release_fort(self, fort):
+        if self.enabled:
+            self.store.release('fort', fort['id'], self.owner)
+            self.store.release('region', self.region_of(fort['latitude'], fort['longitude']), self.owner)
+
+    def available_pokemon(self, pokemons):
+        if not self.enabled or not pokemons:
+            return pokemons
+        taken = self._taken('pokemon')
+        return [pokemon for pokemon in pokemons if '{}'.format(pokemon['encounter_id']) not in taken]
+
+    def claim_pokemon(self, pokemon):
+        if not self.enabled:
+            return True
+        return self.store.claim('pokemon', '{}'.format(pokemon['encounter_id']), self.owner, self.lease_time)
+
+    def _taken(self, kind):
+        return {key for key, owner in self.store.holders(kind).iteritems() if owner != self.owner}
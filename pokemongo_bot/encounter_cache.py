@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import time
+from collections import OrderedDict
+
+
+class EncounterCache(object):
+    """
+    Outcome of the encounters of the account by encounter id, so the Pokémon
+    it already caught, saw flee or decided not to catch are not encountered
+    again while they are still on the map.
+
+    An outcome is kept until the Pokémon disappears, or `default_ttl`
+    seconds when its expiration is unknown. A Pokémon out of range may come
+    in range once the bot moves, its outcome only lasts `out_of_range_ttl`
+    seconds. At most `max_size` outcomes are kept, the oldest go first.
+    """
+
+    REJECTED = 'rejected'
+    FLED = 'fled'
+    CAUGHT = 'caught'
+    OUT_OF_RANGE = 'out_of_range'
+
+    def __init__(self, max_size=1000, default_ttl=900, out_of_range_ttl=60):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.out_of_range_ttl = out_of_range_ttl
+        # encounter id -> (outcome, expiration time), oldest first
+        self._outcomes = OrderedDict()
+
+    @staticmethod
+    def expiration_of(pokemon):
+        """
+        Time the Pokémon disappears from the map, None when unknown.
+        """
+        if pokemon.get('expiration_timestamp_ms', 0) > 0:
+            return pokemon['expiration_timestamp_ms'] / 1000.0
+        if pokemon.get('time_till_hidden_ms', 0) > 0 and 'last_modified_timestamp_ms' in pokemon:
+            return (pokemon['last_modified_timestamp_ms'] + pokemon['time_till_hidden_ms']) / 1000.0
+        if 'disappear_time' in pokemon:
+            return pokemon['disappear_time']
+        return None
+
+    def record(self, pokemon, outcome):
+        now = time.time()
+        expiration = self.expiration_of(pokemon) or now + self.default_ttl
+        if outcome == self.OUT_OF_RANGE:
+            expiration = min(expiration, now + self.out_of_range_ttl)
+        if expiration <= now:
+            return
+
+        encounter_id = pokemon['encounter_id']
+        self._outcomes.pop(encounter_id, None)
+        self._outcomes[encounter_id] = (outcome, expiration)
+        while len(self._outcomes) > self.max_size:
+            self._outcomes.popitem(last=False)
+
+    def outcome(self, encounter_id):
+        """
+        Returns the outcome of the encounter, None if it is unknown or
+        expired.
+        """
+        entry = self._outcomes.get(encounter_id)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del self._outcomes[encounter_id]
+            return None
+        return entry[0]
+
+    def known(self, pokemon):
+        return self.outcome(pokemon['encounter_id']) is not None
+
+    def unknown(self, pokemons):
+        """
+        Returns the Pokémon without a known outcome.
+        """
+        return [pokemon for pokemon in pokemons if not self.known(pokemon)]
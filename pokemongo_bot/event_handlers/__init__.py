@@ -1,3 +1,4 @@
 from logging_handler import LoggingHandler
 from socketio_handler import SocketIoHandler
 from colored_logging_handler import ColoredLoggingHandler
+from queued_handler import QueuedEventHandler
@@ -101,6 +101,10 @@ class ColoredLoggingHandler(EventHandler):
         'reset':   '\033[0m'
     }
 
+    def min_level(self):
+        # loggers are named after the senders and don't have their own level
+        return logging.getLogger().getEffectiveLevel()
+
     def handle_event(self, event, sender, level, formatted_msg, data):
         logger = logging.getLogger(type(sender).__name__)
 
@@ -9,6 +9,10 @@ from pokemongo_bot.event_manager import EventHandler
 
 class LoggingHandler(EventHandler):
 
+    def min_level(self):
+        # loggers are named after the senders and don't have their own level
+        return logging.getLogger().getEffectiveLevel()
+
     def handle_event(self, event, sender, level, formatted_msg, data):
         logger = logging.getLogger(type(sender).__name__)
         if formatted_msg:
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+from collections import deque
+
+from pokemongo_bot.event_manager import EventHandler
+
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+BLOCK = 'block'
+OVERFLOW_POLICIES = (DROP_OLDEST, COALESCE, BLOCK)
+
+
+class QueuedEventHandler(EventHandler):
+    """
+    Wraps a slow handler (e.g. one sending events over the network) so that
+    emitting an event only appends it to a bounded queue. A background thread
+    delivers the queued events to the wrapped handler in order.
+
+    When the queue is full, the overflow policy decides what happens:
+      drop_oldest: the oldest queued event is dropped
+      coalesce:    the queued event with the same name is replaced by the new
+                   one, the oldest event is dropped if there is none
+      block:       the emitter waits up to `block_timeout` seconds for some
+                   room, then drops the oldest event
+
+    Events delivered more than `max_delay` seconds after being emitted are
+    counted as delayed.
+    """
+
+    def __init__(self, handler, max_size=1000, overflow=DROP_OLDEST,
+                 block_timeout=5.0, max_delay=1.0):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('Overflow policy needs to be in: {}'.format(OVERFLOW_POLICIES))
+
+        self.handler = handler
+        self.max_size = max_size
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.max_delay = max_delay
+        self.logger = logging.getLogger(type(handler).__name__)
+
+        self.counters = {
+            'queued': 0,
+            'delivered': 0,
+            'dropped': 0,
+            'coalesced': 0,
+            'blocked': 0,
+            'delayed': 0,
+            'errors': 0
+        }
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._deliver)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def min_level(self):
+        return self.handler.min_level()
+
+    def handle_event(self, event, sender, level, formatted_msg, data):
+        entry = (event, sender, level, formatted_msg, data, time.time())
+
+        with self._condition:
+            if len(self._queue) >= self.max_size:
+                self._make_room(event)
+
+            self._queue.append(entry)
+            self.counters['queued'] += 1
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self.counters)
+            stats['pending'] = len(self._queue)
+        return stats
+
+    def stop(self, timeout=5.0):
+        """
+        Stops the delivery thread once the queue has been flushed, or after
+        `timeout` seconds.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def _make_room(self, event):
+        # called with the condition acquired
+        if self.overflow == COALESCE:
+            for index in xrange(len(self._queue) - 1, -1, -1):
+                if self._queue[index][0] == event:
+                    del self._queue[index]
+                    self.counters['coalesced'] += 1
+                    return
+
+        elif self.overflow == BLOCK:
+            self.counters['blocked'] += 1
+            deadline = time.time() + self.block_timeout
+            while len(self._queue) >= self.max_size and self._running:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            if len(self._queue) < self.max_size:
+                return
+
+        self._queue.popleft()
+        self.counters['dropped'] += 1
+
+    def _deliver(self):
+        while True:
+            with self._condition:
+                while not self._queue and self._running:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                event, sender, level, formatted_msg, data, emitted_at = self._queue.popleft()
+                # wake up a blocked emitter
+                self._condition.notify_all()
+
+            if time.time() - emitted_at > self.max_delay:
+                self.counters['delayed'] += 1
+
+            try:
+                self.handler.handle_event(event, sender, level, formatted_msg, data)
+                self.counters['delivered'] += 1
+            except Exception as e:
+                self.counters['errors'] += 1
+                self.logger.warning('Error while delivering event {}: {}'.format(event, e))
@@ -1,30 +1,171 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import logging
+import threading
+import time
 
 from socketIO_client import SocketIO
 
 from pokemongo_bot.event_manager import EventHandler
 
+try:
+    import msgpack
+except ImportError:
+    # Run `pip install msgpack-python` to use the msgpack encoding
+    msgpack = None
+
+# Seconds a partial batch waits at most when only `batch_size` is set
+DEFAULT_BATCH_LATENCY = 1.0
+
+# url -> _Connection, the bots of all the accounts running in the process
+# share one connection to the server
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+class _Connection(object):
+    """
+    A connection shared by several bots. The server forgets the bots
+    registered on a connection when it drops, so the registrations are sent
+    again whenever it (re)connects.
+    """
+
+    def __init__(self, host, port):
+        self.sio = SocketIO(host, port)
+        # reentrant: the (re)connect callbacks can run during an emit
+        self.lock = threading.RLock()
+        self.registrations = []
+        self.sio.on('connect', self._register_all)
+        self.sio.on('reconnect', self._register_all)
+
+    def register(self, registration):
+        with self.lock:
+            self.registrations.append(registration)
+            self.sio.emit('bot:register', registration)
+
+    def _register_all(self, *args):
+        with self.lock:
+            for registration in self.registrations:
+                self.sio.emit('bot:register', registration)
+
+
+def _connect(host, port):
+    with _connections_lock:
+        if (host, port) not in _connections:
+            _connections[(host, port)] = _Connection(host, port)
+        return _connections[(host, port)]
+
 
 class SocketIoHandler(EventHandler):
+    """
+    Sends the events to the socket.io server.
+
+    By default every event is sent in its own `bot:broadcast` message. When
+    `batch_interval` (in milliseconds) or `batch_size` is set, events are
+    buffered and sent together in a `bot:broadcast_batch` frame once the
+    interval has elapsed or the buffer holds `batch_size` events. With only
+    `batch_size` set, a partial batch is sent after DEFAULT_BATCH_LATENCY
+    seconds. Within a frame only the latest of the COALESCED_EVENTS is kept.
+    Frames can be encoded with msgpack instead of JSON. `stop` sends the
+    pending events and stops the periodic flush.
+    """
 
+    # State events only the latest value of which matters
+    COALESCED_EVENTS = ('position_update',)
 
-    def __init__(self, bot, url):
+    def __init__(self, bot, url, batch_interval=0, batch_size=0, encoding='json'):
         self.bot = bot
         self.host, port_str = url.split(':')
         self.port = int(port_str)
-        self.sio = SocketIO(self.host, self.port)
+        connection = _connect(self.host, self.port)
+        self.sio, self._send_lock = connection.sio, connection.lock
+        # only sends events, don't receive the ones of the other bots
+        connection.register({'account': self.bot.config.username})
+        self.logger = logging.getLogger(type(self).__name__)
+
+        self.batch_interval = batch_interval / 1000.0
+        self.batch_size = batch_size
+        self.encoding = encoding
+        if encoding == 'msgpack' and msgpack is None:
+            self.logger.warning('msgpack is not installed, falling back to JSON')
+            self.encoding = 'json'
+
+        self._lock = threading.Lock()
+        self._pending = []
+        self._coalesced = {}
+        self._first_pending = None
+
+        self._stopped = threading.Event()
+        if self.batching:
+            flusher = threading.Thread(target=self._flush_periodically)
+            flusher.daemon = True
+            flusher.start()
+
+    @property
+    def batching(self):
+        return self.batch_interval > 0 or self.batch_size > 0
 
     def handle_event(self, event, sender, level, msg, data):
         if msg:
-            data['msg'] = msg
-
-        self.sio.emit(
-            'bot:broadcast',
-            {
-                'event': event,
-                'account': self.bot.config.username,
-                'data': data
-            }
-        )
+            # the other handlers get the same dict
+            data = dict(data, msg=unicode(msg))
+
+        if not self.batching:
+            with self._send_lock:
+                self.sio.emit(
+                    'bot:broadcast',
+                    {
+                        'event': event,
+                        'account': self.bot.config.username,
+                        'data': data
+                    }
+                )
+            return
+
+        with self._lock:
+            if event in self._coalesced:
+                # drop the superseded value, the latest one goes at the end
+                self._pending[self._coalesced[event]] = None
+            if event in self.COALESCED_EVENTS:
+                self._coalesced[event] = len(self._pending)
+            self._pending.append({'event': event, 'data': data})
+            if self._first_pending is None:
+                self._first_pending = time.time()
+
+            should_flush = self.batch_size and len(self._pending) >= self.batch_size
+
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            events = [e for e in self._pending if e is not None]
+            self._pending = []
+            self._coalesced = {}
+            self._first_pending = None
+
+        if not events:
+            return
+
+        frame = {
+            'account': self.bot.config.username,
+            'events': events
+        }
+        if self.encoding == 'msgpack':
+            frame = bytearray(msgpack.packb(frame, use_bin_type=True))
+        # flush is called from both the bot and the periodic flusher, and the
+        # connection can be shared with other bots
+        with self._send_lock:
+            self.sio.emit('bot:broadcast_batch', frame)
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+    def _flush_periodically(self):
+        latency = self.batch_interval or DEFAULT_BATCH_LATENCY
+        while not self._stopped.wait(latency):
+            first_pending = self._first_pending
+            if first_pending is not None and time.time() - first_pending >= latency:
+                self.flush()
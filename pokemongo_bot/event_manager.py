@@ -1,6 +1,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import logging
+
+LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'critical': logging.CRITICAL
+}
+
 
 class EventNotRegisteredException(Exception):
     pass
@@ -15,51 +25,120 @@ class EventHandler(object):
     def __init__(self):
         pass
 
-    def handle_event(self, event, kwargs):
+    def handle_event(self, event, sender, level, formatted_msg, data):
         raise NotImplementedError("Please implement")
 
+    def min_level(self):
+        """
+        Lowest level (as a logging level number) of the events the handler
+        does something with. Events below the level of every handler are
+        dropped before being formatted.
+        """
+        return logging.DEBUG
+
+
+class LazyMessage(object):
+    """
+    Message of an event, only formatted the first time a handler uses it as
+    text. It is falsy when the formatted message is empty.
+    """
+    __slots__ = ('template', 'data', '_text')
+
+    def __init__(self, template, data):
+        self.template = template
+        self.data = data
+        self._text = None
+
+    def __unicode__(self):
+        if self._text is None:
+            self._text = self.template.format(**self.data)
+        return self._text
+
+    def __str__(self):
+        return unicode(self).encode('utf-8')
+
+    def __format__(self, format_spec):
+        return format(unicode(self), format_spec)
+
+    def __nonzero__(self):
+        return bool(unicode(self))
+
+    def __eq__(self, other):
+        return unicode(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class _EventDescriptor(object):
+    __slots__ = ('name', 'parameter_names', 'parameters')
+
+    def __init__(self, name, parameters):
+        self.name = name
+        self.parameter_names = tuple(parameters)
+        self.parameters = frozenset(parameters) if parameters else None
+
+    def validate(self, data):
+        if self.parameters is None or not data:
+            return
+        for k in data:
+            if k not in self.parameters:
+                raise EventMalformedException("Event %s does not require parameter %s" % (self.name, k))
+
 
 class EventManager(object):
 
     def __init__(self, *handlers):
         self._registered_events = dict()
         self._handlers = list(handlers) or []
+        self.update_levels()
 
     def event_report(self):
-        for event, parameters in self._registered_events.iteritems():
+        for event, descriptor in self._registered_events.iteritems():
             print '-'*80
             print 'Event: {}'.format(event)
-            if parameters:
+            if descriptor.parameter_names:
                 print 'Parameters:'
-                for parameter in parameters:
+                for parameter in descriptor.parameter_names:
                     print '* {}'.format(parameter)
 
     def add_handler(self, event_handler):
         self._handlers.append(event_handler)
+        self.update_levels()
+
+    def update_levels(self):
+        """
+        Caches the minimum level of every handler. Has to be called again when
+        the levels of the handlers change, e.g. after configuring logging.
+        """
+        self._handler_levels = [(handler, handler.min_level()) for handler in self._handlers]
+        self._min_level = min([level for _, level in self._handler_levels] or [logging.CRITICAL + 1])
 
     def register_event(self, name, parameters=[]):
-        self._registered_events[name] = parameters
+        self._registered_events[name] = _EventDescriptor(name, parameters)
 
     def emit(self, event, sender=None, level='info', formatted='', data={}):
         if not sender:
-            raise ArgumentError('Event needs a sender!')
+            raise ValueError('Event needs a sender!')
 
-        levels = ['info', 'warning', 'error', 'critical', 'debug']
-        if not level in levels:
-            raise ArgumentError('Event level needs to be in: {}'.format(levels))
+        level_number = LEVELS.get(level)
+        if level_number is None:
+            raise ValueError('Event level needs to be in: {}'.format(LEVELS.keys()))
 
-        if event not in self._registered_events:
+        descriptor = self._registered_events.get(event)
+        if descriptor is None:
             raise EventNotRegisteredException("Event %s not registered..." % event)
 
+        # nobody wants events of this level
+        if level_number < self._min_level:
+            return
+
         # verify params match event
-        parameters = self._registered_events[event]
-        if parameters:
-            for k, v in data.iteritems():
-                if k not in parameters:
-                    raise EventMalformedException("Event %s does not require parameter %s" % (event, k))
+        descriptor.validate(data)
 
-        formatted_msg = formatted.format(**data)
+        formatted_msg = LazyMessage(formatted, data) if formatted else ''
 
         # send off to the handlers
-        for handler in self._handlers:
-            handler.handle_event(event, sender, level, formatted_msg, data)
+        for handler, handler_level in self._handler_levels:
+            if level_number >= handler_level:
+                handler.handle_event(event, sender, level, formatted_msg, data)
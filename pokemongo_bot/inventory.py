@@ -3,6 +3,8 @@ import logging
 import os
 from collections import OrderedDict
 
+from eventlet.corolocal import local
+
 from pokemongo_bot.base_dir import _base_dir
 
 '''
@@ -65,7 +67,14 @@ class _BaseInventoryComponent(_StaticInventoryComponent):
         return ret
 
     def refresh(self, inventory):
+        previous = self._data
         self._data = self.retrieve_data(inventory)
+        if previous:
+            self.publish_changes(previous, self._data)
+
+    def publish_changes(self, previous, current):
+        # optional hook publishing the differences between two refreshes
+        pass
 
     def get(self, object_id):
         return self._data.get(object_id)
@@ -93,6 +102,15 @@ class Candies(_BaseInventoryComponent):
         candy = item['candy'] if 'candy' in item else 0
         return Candy(item['family_id'], candy)
 
+    def publish_changes(self, previous, current):
+        if not has_listeners(CANDY_CHANGED):
+            return
+        for family_id, candy in current.iteritems():
+            old = previous.get(family_id)
+            old_quantity = old.quantity if old else 0
+            if candy.quantity != old_quantity:
+                _publish(CANDY_CHANGED, candy=candy, previous=old_quantity)
+
 
 class Pokedex(_BaseInventoryComponent):
     TYPE = 'pokedex_entry'
@@ -111,19 +129,22 @@ class Item(object):
     """
     Representation of an item.
     """
-    def __init__(self, item_id, item_count):
+    def __init__(self, item_id, item_count, items=None):
         """
         Initialise an instance of an item
         :param item_id: ID of the item
         :type item_id: int
         :param item_count: Quantity of the item
         :type item_count: int
+        :param items: The cached items holding this one, whose space used is kept up to date
+        :type items: Items
         :return: An item
         :rtype: Item
         """
         self.id = item_id
         self.name = Items.name_for(self.id)
         self.count = item_count
+        self._items = items
 
     def remove(self, amount):
         """
@@ -137,6 +158,9 @@ class Item(object):
         if self.count < amount:
             raise Exception('Tried to remove more {} than you have'.format(self.name))
         self.count -= amount
+        if self._items is not None:
+            self._items.space_used -= amount
+        _publish(ITEM_COUNT_CHANGED, item=self, previous=self.count + amount)
 
     def add(self, amount):
         """
@@ -149,6 +173,9 @@ class Item(object):
         if amount < 0:
             raise Exception('Must add positive amount of {}'.format(self.name))
         self.count += amount
+        if self._items is not None:
+            self._items.space_used += amount
+        _publish(ITEM_COUNT_CHANGED, item=self, previous=self.count - amount)
 
     def __str__(self):
         return self.name + " : " + str(self.count)
@@ -159,6 +186,12 @@ class Items(_BaseInventoryComponent):
     ID_FIELD = 'item_id'
     STATIC_DATA_FILE = os.path.join(_base_dir, 'data', 'items.json')
 
+    def __init__(self):
+        # Space used by the items, maintained by refresh and by the items
+        # themselves so the space checks don't count the items every time
+        self.space_used = 1
+        super(Items, self).__init__()
+
     def parse(self, item_data):
         """
         Make an instance of an Item from raw item data.
@@ -168,7 +201,21 @@ class Items(_BaseInventoryComponent):
         """
         item_id = item_data.get(Items.ID_FIELD, None)
         item_count = item_data['count'] if 'count' in item_data else 0
-        return Item(item_id, item_count)
+        return Item(item_id, item_count, self)
+
+    def refresh(self, inventory):
+        super(Items, self).refresh(inventory)
+        self.space_used = 1 + sum(item.count for item in self._data.itervalues())
+
+    def publish_changes(self, previous, current):
+        if not has_listeners(ITEM_COUNT_CHANGED):
+            return
+        for item_id in set(previous) | set(current):
+            old = previous.get(item_id)
+            new = current.get(item_id) or Item(item_id, 0)
+            old_count = old.count if old else 0
+            if new.count != old_count:
+                _publish(ITEM_COUNT_CHANGED, item=new, previous=old_count)
 
     def all(self):
         """
@@ -185,7 +232,10 @@ class Items(_BaseInventoryComponent):
         :return: Instance of the item from the cached inventory
         :rtype: Item
         """
-        return self._data.setdefault(item_id, Item(item_id, 0))
+        item = self._data.get(item_id)
+        if item is None:
+            item = self._data[item_id] = Item(item_id, 0, self)
+        return item
 
     @classmethod
     def name_for(cls, item_id):
@@ -200,14 +250,11 @@ class Items(_BaseInventoryComponent):
     @classmethod
     def get_space_used(cls):
         """
-        Counts the space used in item inventory.
+        Space used in item inventory.
         :return: The space used in item inventory.
         :rtype: int
         """
-        space_used = 1
-        for item_in_inventory in _inventory.items.all():
-            space_used += item_in_inventory.count
-        return space_used
+        return _account.inventory.items.space_used
 
     @classmethod
     def get_space_left(cls):
@@ -216,8 +263,7 @@ class Items(_BaseInventoryComponent):
         :return: The space left in item inventory. 0 if the player has more item than his item inventory can carry.
         :rtype: int
         """
-        _inventory.retrieve_item_inventory_size()
-        space_left = _inventory.item_inventory_size - cls.get_space_used()
+        space_left = get_item_inventory_size() - cls.get_space_used()
         # Space left should never be negative. Returning 0 if the computed value is negative.
         return space_left if space_left >= 0 else 0
 
@@ -297,6 +343,37 @@ class Pokemons(_BaseInventoryComponent):
             return Egg(item)
         return Pokemon(item)
 
+    def retrieve_data(self, inventory):
+        # Building a Pokemon is expensive (moveset, perfection...), reuse the
+        # instances whose raw data did not change since the last refresh
+        ret = {}
+        for item in inventory:
+            data = item['inventory_item_data']
+            if self.TYPE in data:
+                item = data[self.TYPE]
+                key = item[self.ID_FIELD]
+                known = self._data.get(key)
+                if known is not None and known._data == item:
+                    ret[key] = known
+                else:
+                    ret[key] = self.parse(item)
+        return ret
+
+    def publish_changes(self, previous, current):
+        for pokemon_id, pokemon in previous.iteritems():
+            if pokemon_id not in current:
+                if isinstance(pokemon, Egg):
+                    _publish(EGG_HATCHED, egg=pokemon)
+                else:
+                    _publish(POKEMON_REMOVED, pokemon=pokemon)
+
+        for pokemon_id, pokemon in current.iteritems():
+            known = previous.get(pokemon_id)
+            if known is None:
+                _publish(EGG_ADDED if isinstance(pokemon, Egg) else POKEMON_ADDED, pokemon=pokemon)
+            elif known is not pokemon and not isinstance(pokemon, Egg):
+                _publish(POKEMON_UPDATED, pokemon=pokemon)
+
     def all(self):
         # by default don't include eggs in all pokemon (usually just
         # makes caller's lives more difficult)
@@ -308,11 +385,13 @@ class Pokemons(_BaseInventoryComponent):
         if pokemon.id in self._data:
             raise ValueError("Pokemon already present in the inventory")
         self._data[pokemon.id] = pokemon
+        _publish(POKEMON_ADDED, pokemon=pokemon)
 
     def remove(self, pokemon_id):
         if pokemon_id not in self._data:
             raise ValueError("Pokemon not present in the inventory")
-        self._data.pop(pokemon_id)
+        pokemon = self._data.pop(pokemon_id)
+        _publish(POKEMON_REMOVED, pokemon=pokemon)
 
 
 #
@@ -551,6 +630,7 @@ class Type(object):
 
 class Candy(object):
     def __init__(self, family_id, quantity):
+        self.family_id = family_id
         self.type = Pokemons.name_for(family_id)
         self.quantity = quantity
 
@@ -558,11 +638,13 @@ class Candy(object):
         if self.quantity < amount:
             raise Exception('Tried to consume more {} candy than you have'.format(self.type))
         self.quantity -= amount
+        _publish(CANDY_CHANGED, candy=self, previous=self.quantity + amount)
 
     def add(self, amount):
         if amount < 0:
             raise Exception('Must add positive amount of candy')
         self.quantity += amount
+        _publish(CANDY_CHANGED, candy=self, previous=self.quantity - amount)
 
 
 class Egg(object):
@@ -810,6 +892,8 @@ class Pokemon(object):
     def update_nickname(self, new_nickname):
         self.nickname_raw = new_nickname
         self.nickname = self.nickname_raw or self.name
+        # not published: the tasks listening to POKEMON_UPDATED would queue
+        # the pokemon again for every rename
 
     def can_evolve_now(self):
         return self.has_next_evolution() and \
@@ -1060,29 +1144,45 @@ class Inventory(object):
         self.items = Items()
         self.pokemons = Pokemons()
         self.refresh()
-        self.item_inventory_size = None
 
-    def refresh(self):
+    def refresh(self, response=None):
+        """
+        Refreshes the cached inventory, from `response` when the inventory
+        was already requested along with other subrequests.
+        """
         # TODO: it would be better if this class was used for all
         # inventory management. For now, I'm just clearing the old inventory field
-        self.bot.latest_inventory = None
+        self.bot.latest_inventory = response
         inventory = self.bot.get_inventory()['responses']['GET_INVENTORY']['inventory_delta']['inventory_items']
         for i in (self.pokedex, self.candy, self.items, self.pokemons):
             i.refresh(inventory)
+        # the level isn't part of the player data, it comes with the inventory
+        for item in inventory:
+            player_stats = item['inventory_item_data'].get('player_stats')
+            if player_stats:
+                self.bot.player_store.update_stats(player_stats)
+                break
+        _publish(INVENTORY_REFRESHED)
 
         user_web_inventory = os.path.join(_base_dir, 'web', 'inventory-%s.json' % (self.bot.config.username))
-        with open(user_web_inventory, 'w') as outfile:
-            json.dump(inventory, outfile)
+        self.bot.snapshot_writer.write(user_web_inventory, inventory, kind='inventory')
+
+    @property
+    def item_inventory_size(self):
+        """
+        The item inventory size, from the player data kept by the bot.
+        :rtype: int
+        """
+        return self.bot.player_store.max_item_storage
 
     def retrieve_item_inventory_size(self):
         """
-        Retrieves the item inventory size
+        Retrieves the item inventory size, only when no player data was received yet
         :return: Nothing.
         :rtype: None
         """
-        # TODO: Force update of _item_inventory_size if the player upgrades its size
         if self.item_inventory_size is None:
-           self.item_inventory_size = self.bot.api.get_player()['responses']['GET_PLAYER']['player_data']['max_item_storage']
+            self.bot.refresh_player()
 
 
 #
@@ -1097,7 +1197,67 @@ EFFECTIVENESS_FACTOR = 1.25
 RESISTANCE_FACTOR = 0.8
 
 
-_inventory = None  # type: Inventory
+class _AccountState(local):
+    """
+    The cached inventory and the change listeners of the account whose bot
+    runs in the current thread, several accounts can run in one process.
+    The accounts run in green threads once eventlet patched the threading
+    module, which threading.local, captured before, doesn't tell apart.
+    """
+    def __init__(self):
+        self.inventory = None  # type: Inventory
+        self.listeners = {}
+
+
+_account = _AccountState()
+
+
+#
+# Change notifications
+#
+# Listeners are called with the event name and keyword arguments:
+#   pokemon_added, pokemon_removed, pokemon_updated: pokemon
+#   egg_added: pokemon, egg_hatched: egg
+#   item_count_changed: item, previous (count before the change)
+#   candy_changed: candy, previous (quantity before the change)
+#   inventory_refreshed: no argument, sent after every server refresh
+# Local changes (add, remove, consume...) are published right away, changes
+# coming from the server are published when the inventory is refreshed.
+
+POKEMON_ADDED = 'pokemon_added'
+POKEMON_REMOVED = 'pokemon_removed'
+POKEMON_UPDATED = 'pokemon_updated'
+EGG_ADDED = 'egg_added'
+EGG_HATCHED = 'egg_hatched'
+ITEM_COUNT_CHANGED = 'item_count_changed'
+CANDY_CHANGED = 'candy_changed'
+INVENTORY_REFRESHED = 'inventory_refreshed'
+
+
+def subscribe(event, listener):
+    """
+    Registers a listener for an inventory change event.
+    :param event: One of the change events, e.g. POKEMON_ADDED
+    :type event: str
+    :param listener: Callable receiving the event name and its keyword arguments
+    :return: Nothing.
+    :rtype: None
+    """
+    _account.listeners.setdefault(event, []).append(listener)
+
+
+def unsubscribe(event, listener):
+    if listener in _account.listeners.get(event, []):
+        _account.listeners[event].remove(listener)
+
+
+def has_listeners(event):
+    return bool(_account.listeners.get(event))
+
+
+def _publish(event, **kwargs):
+    for listener in list(_account.listeners.get(event, [])):
+        listener(event, **kwargs)
 
 
 def _calc_cp(base_attack, base_defense, base_stamina,
@@ -1159,17 +1319,20 @@ def init_inventory(bot):
     :return: Nothing.
     :rtype: None
     """
-    global _inventory
-    _inventory = Inventory(bot)
+    # a new inventory comes with a new set of tasks, which subscribe again
+    _account.listeners = {}
+    _account.inventory = Inventory(bot)
 
 
-def refresh_inventory():
+def refresh_inventory(response=None):
     """
     Refreshes the cached inventory, retrieves data from the server.
+    :param response: Response of a request including GET_INVENTORY, to avoid requesting it again.
+    :type response: dict
     :return: Nothing.
     :rtype: None
     """
-    _inventory.refresh()
+    _account.inventory.refresh(response)
 
 def get_item_inventory_size():
     """
@@ -1177,8 +1340,8 @@ def get_item_inventory_size():
     :return: Item inventory size.
     :rtype: int
     """
-    _inventory.retrieve_item_inventory_size()
-    return _inventory.item_inventory_size
+    _account.inventory.retrieve_item_inventory_size()
+    return _account.inventory.item_inventory_size
 
 def pokedex():
     """
@@ -1186,7 +1349,7 @@ def pokedex():
     :return:
     :rtype: Pokedex
     """
-    return _inventory.pokedex
+    return _account.inventory.pokedex
 
 
 def candies(refresh=False):
@@ -1198,7 +1361,7 @@ def candies(refresh=False):
     """
     if refresh:
         refresh_inventory()
-    return _inventory.candy
+    return _account.inventory.candy
 
 
 def pokemons(refresh=False):
@@ -1210,7 +1373,7 @@ def pokemons(refresh=False):
     """
     if refresh:
         refresh_inventory()
-    return _inventory.pokemons
+    return _account.inventory.pokemons
 
 
 def items():
@@ -1219,7 +1382,33 @@ def items():
     :return: Instance of the cached item inventory.
     :rtype: Items
     """
-    return _inventory.items
+    return _account.inventory.items
+
+
+def snapshot():
+    """
+    Copy of the cached inventory made of plain data, which can be handed over
+    to other threads or serialized.
+    :return: Items and candies counts by id, pokemon and eggs data.
+    :rtype: dict
+    """
+    pokemons = []
+    eggs = []
+    for pokemon in _account.inventory.pokemons._data.itervalues():
+        data = dict(pokemon._data)
+        if isinstance(pokemon, Egg):
+            eggs.append(data)
+        else:
+            # the nickname can have been changed locally since the refresh
+            data['nickname'] = pokemon.nickname_raw
+            pokemons.append(data)
+
+    return {
+        'items': {item.id: item.count for item in _account.inventory.items.all()},
+        'candies': {candy.family_id: candy.quantity for candy in _account.inventory.candy.all()},
+        'pokemons': pokemons,
+        'eggs': eggs
+    }
 
 
 def types_data():
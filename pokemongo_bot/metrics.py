@@ -78,17 +78,19 @@ class Metrics(object):
         self.releases += count
 
     def capture_stats(self):
-        request = self.bot.api.create_request()
-        request.get_inventory()
-        request.get_player()
-        response_dict = request.call()
-        try:
-            self.dust['latest'] = response_dict['responses']['GET_PLAYER']['player_data']['currencies'][1]['amount']
+        # the player data comes with the heartbeat
+        player_store = self.bot.player_store
+        if player_store.stardust is not None:
+            self.dust['latest'] = player_store.stardust
             if self.dust['start'] is None: self.dust['start'] = self.dust['latest']
+
+        response_dict = self.bot.api.get_inventory()
+        try:
             for item in response_dict['responses']['GET_INVENTORY']['inventory_delta']['inventory_items']:
                 if 'inventory_item_data' in item:
                     if 'player_stats' in item['inventory_item_data']:
                         playerdata = item['inventory_item_data']['player_stats']
+                        player_store.update_stats(playerdata)
 
                         self.xp['latest'] = playerdata.get('experience', 0)
                         if self.xp['start'] is None: self.xp['start'] = self.xp['latest']
@@ -119,3 +121,13 @@ class Metrics(object):
         except KeyError:
             # Nothing we can do if there's no player info.
             return
+
+    def snapshot(self):
+        counters = ('dust', 'xp', 'distance', 'encounters', 'throws', 'captures',
+                    'visits', 'unique_mons', 'evolutions')
+        state = {name: dict(getattr(self, name)) for name in counters}
+        state['start_time'] = self.start_time
+        state['releases'] = self.releases
+        state['highest_cp'] = dict(self.highest_cp)
+        state['most_perfect'] = dict(self.most_perfect)
+        return state
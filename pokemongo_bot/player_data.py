@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import time
+
+# fields tracked by the store, listeners are told when one of them changes
+FIELDS = ('username', 'team', 'level', 'pokecoins', 'stardust',
+          'max_pokemon_storage', 'max_item_storage')
+
+
+class PlayerData(object):
+    """
+    The player data of the account, as received in the last GET_PLAYER
+    response. The heartbeat requests it at every step of the walkers, and
+    the ticks send it when it gets older than a minute, so everything
+    needing the currencies, the storage limits or the team reads it from
+    here rather than requesting GET_PLAYER again. The level isn't part of
+    GET_PLAYER, it is updated from the player stats at every refresh of the
+    inventory.
+
+    Listeners subscribed with `subscribe` are called with the field name,
+    its new value and its previous value whenever a field changes.
+    """
+
+    def __init__(self):
+        # the player_data dict of the last response, as received
+        self.raw = {}
+        # time of the last response, None until the first one
+        self.time = None
+        self._values = dict.fromkeys(FIELDS)
+        self._listeners = []
+
+    def __getattr__(self, name):
+        if name in FIELDS:
+            return self._values[name]
+        raise AttributeError(name)
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def age(self):
+        """
+        Seconds since the last response, infinite before the first one.
+        """
+        if self.time is None:
+            return float('inf')
+        return time.time() - self.time
+
+    def update(self, player_data):
+        """
+        Updates the store from the player_data of a GET_PLAYER response.
+        """
+        self.raw = player_data
+        self.time = time.time()
+
+        currencies = {currency.get('name'): currency.get('amount', 0)
+                      for currency in player_data.get('currencies', [])}
+        self._set('username', player_data.get('username'))
+        self._set('team', player_data.get('team', 0))
+        self._set('pokecoins', currencies.get('POKECOIN', 0))
+        self._set('stardust', currencies.get('STARDUST', 0))
+        self._set('max_pokemon_storage', player_data.get('max_pokemon_storage'))
+        self._set('max_item_storage', player_data.get('max_item_storage'))
+
+    def update_stats(self, player_stats):
+        """
+        Updates the level from the player_stats of the inventory.
+        """
+        if 'level' in player_stats:
+            self._set('level', int(player_stats['level']))
+
+    def snapshot(self):
+        return dict(self._values)
+
+    def _set(self, field, value):
+        previous = self._values[field]
+        if value == previous:
+            return
+        self._values[field] = value
+        for listener in list(self._listeners):
+            listener(field, value, previous)
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import namedtuple
+
+import numpy as np
+
+# how the rule of a species decides
+NO_RULE, NEVER, ALWAYS, AND, OR = range(5)
+
+# keys of a config section and how they are resolved:
+# - above: the cp and iv have to be above the limits, else below them
+# - empty_matches: an empty rule of a species (`"Pidgey": {}`) matches every
+#   pokemon of the species
+# - fallback_on_empty: an empty rule falls back to the `any` rule
+# - inherit_logic: a rule without logic takes the one of the `any` rule
+RuleSyntax = namedtuple('RuleSyntax', [
+    'cp_key', 'iv_key', 'always_key', 'never_key', 'above',
+    'default_logic', 'empty_matches', 'fallback_on_empty', 'inherit_logic'
+])
+
+CATCH = RuleSyntax('catch_above_cp', 'catch_above_iv', 'always_catch', 'never_catch', True,
+                   'and', False, False, False)
+VIPS = CATCH._replace(default_logic='or', empty_matches=True)
+RELEASE = RuleSyntax('release_below_cp', 'release_below_iv', 'always_release', 'never_release', False,
+                     'and', False, True, True)
+
+
+def _predicate(mode, cp_limit, iv_limit, above):
+    if mode == ALWAYS:
+        return lambda cp, iv: True
+    if mode in (NO_RULE, NEVER):
+        return lambda cp, iv: False
+    if above:
+        if mode == AND:
+            return lambda cp, iv: cp > cp_limit and iv > iv_limit
+        return lambda cp, iv: cp > cp_limit or iv > iv_limit
+    if mode == AND:
+        return lambda cp, iv: cp < cp_limit and iv < iv_limit
+    return lambda cp, iv: cp < cp_limit or iv < iv_limit
+
+
+class Rule(object):
+    """
+    Rule of one species, `matches(cp, iv)` is specialized for its mode.
+    """
+
+    def __init__(self, mode, cp_limit, iv_limit, logic, config, syntax):
+        self.mode = mode
+        self.cp_limit = cp_limit
+        self.iv_limit = iv_limit
+        self.logic = logic
+        self.config = config
+        # the rule says something about the pokemon, unlike {} or a rule
+        # only keeping the best ones
+        self.has_condition = any(key in config for key in (
+            syntax.never_key, syntax.always_key, syntax.cp_key, syntax.iv_key
+        ))
+        self.matches = _predicate(mode, cp_limit, iv_limit, syntax.above)
+
+
+class RuleTable(object):
+    """
+    The rules of a config section (catch, release or vips) compiled for
+    every species, indexed by pokemon id. Row 0 holds the rule of the
+    species without their own rule, usually the `any` rule.
+    """
+
+    def __init__(self, section, syntax, pokemon_list):
+        self.section = section
+        self.syntax = syntax
+
+        names = {int(pokemon['Number']): pokemon['Name'] for pokemon in pokemon_list}
+        size = max(names) + 1 if names else 1
+        self.rules = [self._rule_for(names.get(pokemon_id)) for pokemon_id in range(size)]
+
+        self._modes = np.array([rule.mode for rule in self.rules], dtype=np.int8)
+        self._cp_limits = np.array([rule.cp_limit for rule in self.rules], dtype=np.float64)
+        self._iv_limits = np.array([rule.iv_limit for rule in self.rules], dtype=np.float64)
+
+    def _rule_for(self, name):
+        if self.syntax.fallback_on_empty:
+            config = self.section.get(name) or self.section.get('any') or {}
+        else:
+            config = self.section.get(name, self.section.get('any'))
+        return self._compile(config, own=name in self.section)
+
+    def _compile(self, config, own):
+        syntax = self.syntax
+        if not config and not syntax.fallback_on_empty:
+            mode = ALWAYS if own and config == {} and syntax.empty_matches else NO_RULE
+            return Rule(mode, 0, 0, syntax.default_logic, config or {}, syntax)
+
+        logic = config.get('logic')
+        if not logic and syntax.inherit_logic:
+            logic = (self.section.get('any') or {}).get('logic')
+        logic = logic or syntax.default_logic
+
+        if config.get(syntax.never_key, False):
+            mode = NEVER
+        elif config.get(syntax.always_key, False):
+            mode = ALWAYS
+        else:
+            mode = OR if logic == 'or' else AND
+        return Rule(mode, config.get(syntax.cp_key, 0), config.get(syntax.iv_key, 0), logic, config, syntax)
+
+    def rule(self, pokemon_id):
+        if 0 < pokemon_id < len(self.rules):
+            return self.rules[pokemon_id]
+        return self.rules[0]
+
+    def matches(self, pokemon):
+        return self.rule(pokemon.pokemon_id).matches(pokemon.cp, pokemon.iv)
+
+    def matches_many(self, pokemons):
+        """
+        Evaluates the rules of all the pokemons at once, returns an array of
+        booleans in the same order.
+        """
+        count = len(pokemons)
+        ids = np.fromiter((pokemon.pokemon_id for pokemon in pokemons), dtype=np.int64, count=count)
+        cps = np.fromiter((pokemon.cp for pokemon in pokemons), dtype=np.float64, count=count)
+        ivs = np.fromiter((pokemon.iv for pokemon in pokemons), dtype=np.float64, count=count)
+
+        # unknown species use the rule of row 0
+        ids[(ids < 0) | (ids >= len(self.rules))] = 0
+        modes = self._modes[ids]
+        if self.syntax.above:
+            cp_ok = cps > self._cp_limits[ids]
+            iv_ok = ivs > self._iv_limits[ids]
+        else:
+            cp_ok = cps < self._cp_limits[ids]
+            iv_ok = ivs < self._iv_limits[ids]
+
+        return (modes == ALWAYS) | \
+               ((modes == AND) & cp_ok & iv_ok) | \
+               ((modes == OR) & (cp_ok | iv_ok))
+
+
+CompiledRules = namedtuple('CompiledRules', ['catch', 'release', 'vips'])
+
+
+def compile_rules(config, pokemon_list):
+    return CompiledRules(
+        catch=RuleTable(config.catch, CATCH, pokemon_list),
+        release=RuleTable(config.release, RELEASE, pokemon_list),
+        vips=RuleTable(config.vips, VIPS, pokemon_list)
+    )
@@ -0,0 +1,152 @@
+import time
+from collections import namedtuple
+
+# a lucky egg doubles the xp earned during 30 minutes
+LUCKY_EGG_DURATION = 30 * 60
+LUCKY_EGG_MULTIPLIER = 2
+EVOLVE_XP = 500
+
+# - transfers: pokemons released before the egg, their candies pay for
+#   the evolutions
+# - evolutions: pokemons evolved in order during the window
+# - deferred: pokemons the candies allow to evolve but that don't fit in the
+#   window, or that wait for enough evolutions to be worth an egg
+EvolutionPlan = namedtuple('EvolutionPlan', ['transfers', 'evolutions', 'deferred', 'use_lucky_egg', 'expected_xp'])
+
+
+def window_capacity(evolve_latency, window=LUCKY_EGG_DURATION):
+    """
+    Number of evolutions fitting in the window of an egg.
+    """
+    if evolve_latency <= 0:
+        return None
+    return int(window // evolve_latency)
+
+
+def plan_lucky_egg_window(evolvable, candies, transfers=(), evolve_latency=20, lucky_eggs=0,
+                          minimum_evolutions=1, require_lucky_egg=False, window=LUCKY_EGG_DURATION,
+                          active_window=0):
+    """
+    Plans an evolution session around a lucky egg.
+
+    The candies of every family, plus one per pokemon transferred, are spent
+    on the evolvable pokemons, the cheapest evolutions first so a family
+    yields as many evolutions as possible, keeping the given order among
+    equal costs. All the evolutions are worth the same xp, so the egg pays
+    off the most when the window is filled: only the evolutions fitting in
+    it at `evolve_latency` seconds each are planned, the others are
+    deferred to the next egg.
+
+    The egg is used when there is one and at least `minimum_evolutions`
+    (at most a full window) are planned, otherwise the evolutions wait for
+    enough of them rather than being done without the egg. Without egg,
+    everything affordable is evolved unless `require_lucky_egg` is set.
+
+    While an egg is already in use, `active_window` being the seconds left
+    of it, no other egg is used: the evolutions fitting in what is left of
+    the window are planned, whatever their number, the others are deferred.
+
+    :param evolvable: pokemons that can evolve, in order of preference
+    :param candies: family id -> candies
+    :param transfers: pokemons released first, one candy each
+    :rtype: EvolutionPlan
+    """
+    budget = dict(candies)
+    for pokemon in transfers:
+        budget[pokemon.first_evolution_id] = budget.get(pokemon.first_evolution_id, 0) + 1
+
+    affordable = []
+    for pokemon in sorted(evolvable, key=lambda p: p.evolution_cost):
+        family_id = pokemon.first_evolution_id
+        if budget.get(family_id, 0) >= pokemon.evolution_cost:
+            budget[family_id] -= pokemon.evolution_cost
+            affordable.append(pokemon)
+
+    egg_active = active_window > 0
+    capacity = window_capacity(evolve_latency, active_window if egg_active else window)
+    if capacity is None:
+        capacity = len(affordable)
+    fitting = affordable[:capacity]
+    use_lucky_egg = (not egg_active and lucky_eggs > 0 and len(fitting) > 0 and
+                     len(fitting) >= min(minimum_evolutions, capacity))
+
+    if egg_active or use_lucky_egg:
+        evolutions, deferred = fitting, affordable[capacity:]
+    elif require_lucky_egg or lucky_eggs > 0:
+        evolutions, deferred = [], affordable
+    else:
+        evolutions, deferred = affordable, []
+
+    multiplier = LUCKY_EGG_MULTIPLIER if egg_active or use_lucky_egg else 1
+    return EvolutionPlan(list(transfers), evolutions, deferred, use_lucky_egg,
+                         len(evolutions) * EVOLVE_XP * multiplier)
+
+
+class EvolutionJob(object):
+    """
+    Runs an EvolutionPlan as one pipeline: the transfers, then the egg, then
+    the evolutions, which stop once the egg has expired.
+
+    The job is run in steps, one per run of its task, so the scheduler keeps
+    the bot ticking during the session: the first step does the transfers
+    and uses the egg, every step then evolves at most BATCH_SIZE of the
+    pokemons whose request is due. The task returns RUNNING until `run`
+    reports the job finished.
+
+    An egg already in use ends the session at `lucky_egg_until` instead.
+
+    The steps are callables so each task keeps its own requests and events:
+    `transfer(pokemons)`, `use_lucky_egg()` returning whether the egg was
+    used, and `evolve(pokemons, limit)` evolving the pokemons due, paced like
+    EvolveExecutor, and returning the pokemons evolved and the ones left for
+    a later step.
+    """
+
+    # evolutions requested by a step at most
+    BATCH_SIZE = 5
+
+    def __init__(self, plan, transfer, use_lucky_egg, evolve, window=LUCKY_EGG_DURATION, lucky_egg_until=None):
+        self.plan = plan
+        self.transfer = transfer
+        self.use_lucky_egg = use_lucky_egg
+        self.evolve = evolve
+        self.window = window
+
+        # pokemons still to evolve, None until the first step
+        self.queue = None
+        # end of the egg window, None without egg
+        self.until = lucky_egg_until
+        self.evolved = []
+        # pokemons the window of the egg ended before
+        self.left_over = []
+
+    @property
+    def finished(self):
+        return self.queue is not None and not self.queue
+
+    def run(self):
+        """
+        Runs the next step of the job.
+        :return: whether the job is finished
+        :rtype: bool
+        """
+        if self.queue is None:
+            if self.plan.transfers:
+                self.transfer(self.plan.transfers)
+
+            self.queue = list(self.plan.evolutions)
+            if not self.queue:
+                return True
+
+            if self.plan.use_lucky_egg and self.use_lucky_egg():
+                self.until = time.time() + self.window
+            elif self.until is not None and self.until <= time.time():
+                self.until = None
+
+        if self.until is not None and time.time() >= self.until:
+            self.left_over, self.queue = self.queue, []
+            return True
+
+        evolved, self.queue = self.evolve(self.queue, self.BATCH_SIZE)
+        self.evolved += evolved
+        return self.finished
@@ -0,0 +1,77 @@
+import time
+from collections import namedtuple
+
+from pokemongo_bot import inventory
+from pokemongo_bot.human_behaviour import jitter
+
+EVOLVE_POKEMON_RESULT_SUCCESS = 1
+
+EvolveResult = namedtuple('EvolveResult', ['pokemon', 'evolved', 'evolution', 'xp', 'candy_awarded'])
+
+
+class EvolveExecutor(object):
+    """
+    Evolves a queue of pokemons, one EVOLVE_POKEMON request each since the
+    responses of chained requests of the same type overwrite each other.
+
+    The requests are paced by deadlines: one is due `evolve_speed` seconds
+    (with some jitter) after the previous one was due, the time spent in the
+    previous request included. The executor never waits for them: `evolve`
+    sends the requests already due and hands back the other pokemons, for
+    the task to try again at its next run while the bot keeps ticking. A
+    pokemon whose family lacks the candies is skipped without request.
+
+    Every response is applied to the cached inventory: the candies spent,
+    minus those awarded, are consumed and the pokemon is replaced by the
+    evolved one, so long sessions need no inventory refresh.
+    """
+
+    def __init__(self, bot, evolve_speed):
+        self.bot = bot
+        self.evolve_speed = evolve_speed
+        # time at which the next request is due
+        self.due = time.time()
+
+    def evolve(self, pokemons, limit=None):
+        """
+        Evolves the pokemons in order as long as their request is due, with
+        at most `limit` requests.
+        :type pokemons: list of inventory.Pokemon
+        :return: an EvolveResult for each pokemon tried and the pokemons
+        left for a later call
+        :rtype: tuple of (list of EvolveResult, list of inventory.Pokemon)
+        """
+        results = []
+        requests = 0
+        for index, pokemon in enumerate(pokemons):
+            if inventory.candies().get(pokemon.pokemon_id).quantity < pokemon.evolution_cost:
+                results.append(EvolveResult(pokemon, False, None, 0, 0))
+                continue
+
+            if time.time() < self.due or (limit is not None and requests >= limit):
+                return results, pokemons[index:]
+
+            results.append(self._evolve_one(pokemon))
+            requests += 1
+            self.due = max(self.due, time.time() - self.evolve_speed) + jitter(self.evolve_speed, 0.1)
+
+        return results, []
+
+    def _evolve_one(self, pokemon):
+        response_dict = self.bot.api.evolve_pokemon(pokemon_id=pokemon.id)
+        try:
+            response = response_dict['responses']['EVOLVE_POKEMON']
+        except (KeyError, TypeError):
+            return EvolveResult(pokemon, False, None, 0, 0)
+
+        if response.get('result', 0) != EVOLVE_POKEMON_RESULT_SUCCESS:
+            return EvolveResult(pokemon, False, None, 0, 0)
+
+        candy_awarded = response.get('candy_awarded', 0)
+        evolution = inventory.Pokemon(response.get('evolved_pokemon_data', {}))
+
+        inventory.candies().get(pokemon.pokemon_id).consume(pokemon.evolution_cost - candy_awarded)
+        inventory.pokemons().remove(pokemon.id)
+        inventory.pokemons().add(evolution)
+
+        return EvolveResult(pokemon, True, evolution, response.get('experience_awarded', 0), candy_awarded)
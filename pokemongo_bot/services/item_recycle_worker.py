@@ -24,6 +24,7 @@ class ItemRecycler(BaseTask):
         self.item_to_recycle = item_to_recycle
         self.amount_to_recycle = amount_to_recycle
         self.recycle_item_request_result = None
+        self.new_count = None
 
     def work(self):
         """
@@ -61,15 +62,23 @@ class ItemRecycler(BaseTask):
                                                        count=self.amount_to_recycle)
         # Example of good request response
         # {'responses': {'RECYCLE_INVENTORY_ITEM': {'result': 1, 'new_count': 46}}, 'status_code': 1, 'auth_ticket': {'expire_timestamp_ms': 1469306228058L, 'start': '/HycFyfrT4t2yB2Ij+yoi+on778aymMgxY6RQgvrGAfQlNzRuIjpcnDd5dAxmfoTqDQrbz1m2dGqAIhJ+eFapg==', 'end': 'f5NOZ95a843tgzprJo4W7Q=='}, 'request_id': 8145806132888207460L}
-        self.recycle_item_request_result = response.get('responses', {}).get('RECYCLE_INVENTORY_ITEM', {}).get('result', 0)
+        response = response.get('responses', {}).get('RECYCLE_INVENTORY_ITEM', {})
+        self.recycle_item_request_result = response.get('result', 0)
+        self.new_count = response.get('new_count')
 
     def _update_inventory(self):
         """
-        Updates the inventory. Prevent an unnecessary call to the api
+        Updates the inventory with the count returned by the server. Prevent an unnecessary call to the api
         :return: Nothing.
         :rtype: None
         """
-        inventory.items().get(self.item_to_recycle.id).remove(self.amount_to_recycle)
+        item = inventory.items().get(self.item_to_recycle.id)
+        if self.new_count is None:
+            item.remove(self.amount_to_recycle)
+        elif self.new_count < item.count:
+            item.remove(item.count - self.new_count)
+        elif self.new_count > item.count:
+            item.add(self.new_count - item.count)
 
     def is_recycling_success(self):
         """
@@ -0,0 +1,44 @@
+from collections import OrderedDict
+
+
+def plan_recycling(counts, keep_by_item_id, category_caps):
+    """
+    Computes everything to recycle in one pass over the item counts.
+
+    The categories over their maximum are trimmed first, starting with the
+    first item of the category (the pokeballs before the greatballs), then
+    every item with an amount to keep is trimmed down to it. An item
+    concerned by both is recycled once, for the sum of both amounts.
+
+    Everything over the limits is recycled, whatever the space left: the
+    task only plans once the bag is short of `min_empty_space`.
+
+    :param counts: item id -> count
+    :param keep_by_item_id: item id -> amount to keep
+    :param category_caps: list of (maximum, list of item ids)
+    :return: item id -> amount to recycle, in the order to recycle them
+    :rtype: OrderedDict
+    """
+    remaining = dict(counts)
+    amounts = OrderedDict()
+
+    def recycle(item_id, amount):
+        remaining[item_id] -= amount
+        amounts[item_id] = amounts.get(item_id, 0) + amount
+
+    for maximum, item_ids in category_caps:
+        excess = sum(remaining.get(item_id, 0) for item_id in item_ids) - maximum
+        for item_id in item_ids:
+            if excess <= 0:
+                break
+            amount = min(excess, remaining.get(item_id, 0))
+            if amount > 0:
+                recycle(item_id, amount)
+                excess -= amount
+
+    for item_id, keep in keep_by_item_id.iteritems():
+        amount = remaining.get(item_id, 0) - keep
+        if amount > 0:
+            recycle(item_id, amount)
+
+    return amounts
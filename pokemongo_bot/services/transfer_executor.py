@@ -0,0 +1,100 @@
+import time
+from collections import namedtuple
+
+from pokemongo_bot import inventory
+from pokemongo_bot.human_behaviour import action_delay
+
+RELEASE_POKEMON_RESULT_SUCCESS = 1
+
+# candy_awarded is None when the pokemon was released with others, the
+# server only reports the candies of the whole batch
+ReleaseResult = namedtuple('ReleaseResult', ['pokemon', 'released', 'candy_awarded'])
+
+
+class TransferExecutor(object):
+    """
+    Releases pokemons, up to `batch_size` of them per request.
+
+    A batch of several pokemons is sent as RELEASE_POKEMON subrequests
+    chained in one request along with a GET_INVENTORY. The responses are
+    keyed by subrequest type, so the result of each release is read from the
+    inventory returned: a pokemon still in it was not released. The cached
+    inventory, candies included, is refreshed from that response. A single
+    pokemon is released alone and its candies added to the cached
+    inventory.
+
+    There is one human like delay per batch rather than per pokemon.
+    """
+
+    def __init__(self, bot, batch_size=None):
+        self.bot = bot
+        self.batch_size = max(1, batch_size or bot.config.transfer_batch_size)
+
+    def release(self, pokemons):
+        """
+        Releases the pokemons, returns a ReleaseResult for each of them in
+        the same order.
+        :type pokemons: list of inventory.Pokemon
+        :rtype: list of ReleaseResult
+        """
+        results = []
+        for start in range(0, len(pokemons), self.batch_size):
+            batch = pokemons[start:start + self.batch_size]
+            if self.bot.config.test:
+                results.extend(self._simulate(batch))
+            elif len(batch) == 1:
+                results.append(self._release_one(batch[0]))
+            else:
+                results.extend(self._release_batch(batch))
+            action_delay(self.bot.config.action_wait_min, self.bot.config.action_wait_max)
+        return results
+
+    def _simulate(self, batch):
+        results = []
+        for pokemon in batch:
+            self._apply(pokemon, 1)
+            results.append(ReleaseResult(pokemon, True, 1))
+        return results
+
+    def _release_one(self, pokemon):
+        response_dict = self.bot.api.release_pokemon(pokemon_id=pokemon.id)
+        try:
+            response = response_dict['responses']['RELEASE_POKEMON']
+        except (KeyError, TypeError):
+            return ReleaseResult(pokemon, False, 0)
+
+        if response.get('result', RELEASE_POKEMON_RESULT_SUCCESS) != RELEASE_POKEMON_RESULT_SUCCESS:
+            return ReleaseResult(pokemon, False, 0)
+
+        candy_awarded = response.get('candy_awarded', 0)
+        self._apply(pokemon, candy_awarded)
+        return ReleaseResult(pokemon, True, candy_awarded)
+
+    def _release_batch(self, batch):
+        request = self.bot.api.create_request()
+        for pokemon in batch:
+            request.release_pokemon(pokemon_id=pokemon.id)
+        request.get_inventory()
+        response_dict = request.call()
+
+        try:
+            inventory_items = response_dict['responses']['GET_INVENTORY']['inventory_delta']['inventory_items']
+        except (KeyError, TypeError):
+            # nothing tells which ones were released, the next inventory
+            # refresh will
+            return [ReleaseResult(pokemon, False, 0) for pokemon in batch]
+
+        remaining = set(
+            item['inventory_item_data']['pokemon_data'].get('id')
+            for item in inventory_items
+            if 'pokemon_data' in item.get('inventory_item_data', {})
+        )
+
+        inventory.refresh_inventory(response_dict)
+        self.bot.latest_inventory_time = time.time()
+
+        return [ReleaseResult(pokemon, pokemon.id not in remaining, None) for pokemon in batch]
+
+    def _apply(self, pokemon, candy_awarded):
+        inventory.candies().get(pokemon.pokemon_id).add(candy_awarded)
+        inventory.pokemons().remove(pokemon.id)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+# Minimum number of seconds between two writes of the same kind of file. A
+# change arriving sooner is kept and written once the interval has elapsed.
+DEFAULT_INTERVALS = {
+    'location': 1.0,
+    'cells': 5.0,
+    'last_location': 5.0,
+    'inventory': 2.0,
+    'catchable': 1.0
+}
+
+# Map cells around a position, published by the main thread at every map
+# refresh for the threads writing them. Must not be modified.
+MapSnapshot = namedtuple('MapSnapshot', ['version', 'lat', 'lng', 'alt', 'cells'])
+
+
+# MoveFileEx flags
+MOVEFILE_REPLACE_EXISTING = 0x1
+MOVEFILE_WRITE_THROUGH = 0x8
+
+
+def _replace(source, destination):
+    if os.name != 'nt':
+        os.rename(source, destination)
+        return
+
+    # os.rename doesn't replace an existing file on Windows, MoveFileEx does
+    # it atomically on the same volume
+    import ctypes
+    flags = MOVEFILE_REPLACE_EXISTING | MOVEFILE_WRITE_THROUGH
+    if not ctypes.windll.kernel32.MoveFileExW(unicode(source), unicode(destination), flags):
+        raise ctypes.WinError()
+
+
+class SnapshotWriter(object):
+    """
+    Writes the JSON files read by the web interface and the next run of the
+    bot (location, cells, inventory...).
+
+    A file is only written when its content changed since the last write,
+    through a temporary file renamed over it so readers never see a partial
+    file. Each kind of file has a minimum interval between two writes, the
+    latest content of a change coming sooner is written by a later call to
+    write() or flush().
+
+    Kinds of files in `disabled_kinds` are never written, e.g. the WEB_KINDS
+    when the web interface reads the state API instead.
+    """
+
+    # files only read by the web interface
+    WEB_KINDS = ('location', 'cells', 'inventory', 'catchable')
+
+    def __init__(self, intervals=None, disabled_kinds=()):
+        self.intervals = dict(DEFAULT_INTERVALS)
+        if intervals:
+            self.intervals.update(intervals)
+        self.disabled_kinds = frozenset(disabled_kinds)
+        self.logger = logging.getLogger(type(self).__name__)
+
+        self.counters = {
+            'written': 0,
+            'unchanged': 0,
+            'deferred': 0,
+            'errors': 0
+        }
+
+        self._lock = threading.Lock()
+        self._hashes = {}
+        self._last_write = {}
+        # path -> (kind, payload, digest) of the changes waiting for their interval
+        self._pending = {}
+
+    @staticmethod
+    def serialize(data):
+        return json.dumps(data)
+
+    def write(self, path, data=None, payload=None, kind=None):
+        """
+        Writes `data`, or the already serialized `payload`, to `path`.
+        Returns True when the file was written.
+        """
+        if kind in self.disabled_kinds:
+            return False
+        if payload is None:
+            payload = self.serialize(data)
+        if isinstance(payload, unicode):
+            payload = payload.encode('utf-8')
+        digest = hashlib.md5(payload).hexdigest()
+
+        with self._lock:
+            self._write_overdue(exclude=path)
+
+            if self._hashes.get(path) == digest:
+                # a change reverted before its write doesn't need one
+                self._pending.pop(path, None)
+                self.counters['unchanged'] += 1
+                return False
+
+            interval = self.intervals.get(kind, 0)
+            if interval and time.time() - self._last_write.get(path, 0) < interval:
+                self._pending[path] = (kind, payload, digest)
+                self.counters['deferred'] += 1
+                return False
+
+            self._pending.pop(path, None)
+            return self._write(path, payload, digest)
+
+    def flush(self):
+        """
+        Writes every pending change, whatever its interval.
+        """
+        with self._lock:
+            for path, (_, payload, digest) in self._pending.items():
+                self._write(path, payload, digest)
+            self._pending = {}
+
+    def _write_overdue(self, exclude=None):
+        # called with the lock acquired
+        now = time.time()
+        for path, (kind, payload, digest) in self._pending.items():
+            if path != exclude and now - self._last_write.get(path, 0) >= self.intervals.get(kind, 0):
+                del self._pending[path]
+                self._write(path, payload, digest)
+
+    def _write(self, path, payload, digest):
+        # called with the lock acquired
+        temp_path = '{}.tmp'.format(path)
+        try:
+            with open(temp_path, 'wb') as outfile:
+                outfile.write(payload)
+            _replace(temp_path, path)
+        except (IOError, OSError) as e:
+            self.counters['errors'] += 1
+            self.logger.info('[x] Error while writing %s: %s' % (path, e))
+            return False
+
+        self._hashes[path] = digest
+        self._last_write[path] = time.time()
+        self.counters['written'] += 1
+        return True
@@ -3,30 +3,132 @@ import logging
 import socketio
 from flask import Flask
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 
 sio = socketio.Server(async_mode='eventlet', logging=logging.NullHandler)
 app = Flask(__name__)
 
-# client asks for data
+# Clients that never subscribed stay in this room and receive every event of
+# every account, like before rooms existed
+BROADCAST_ROOM = 'broadcast'
+
+# Classes of events clients can subscribe to, with the room
+# account:<name>:<class>. Events not listed here are in the "other" class.
+EVENT_CLASSES = {
+    'catches': (
+        'catchable_pokemon', 'lured_pokemon_found', 'no_pokeballs', 'pokemon_appeared',
+        'pokemon_capture_failed', 'pokemon_catch_rate', 'pokemon_caught', 'pokemon_vanished',
+        'threw_berry', 'threw_pokeball', 'vip_pokemon'
+    ),
+    'position': (
+        'arrived_at_cluster', 'arrived_at_fort', 'found_cluster', 'location_found',
+        'moving_to_fort', 'moving_to_lured_fort', 'position_update'
+    ),
+    'forts': (
+        'pokestop_empty', 'pokestop_on_cooldown', 'pokestop_out_of_range', 'spun_fort',
+        'spun_pokestop'
+    ),
+    'inventory': (
+        'egg_hatched', 'incubate', 'item_discarded', 'level_up', 'level_up_reward',
+        'pokemon_evolved', 'pokemon_release', 'rename_pokemon', 'used_lucky_egg'
+    )
+}
+_CLASS_BY_EVENT = {event: name for name, events in EVENT_CLASSES.iteritems() for event in events}
+
+
+def account_room(account, event_class=None):
+    if event_class is None:
+        return 'account:{}'.format(account)
+    return 'account:{}:{}'.format(account, event_class)
+
+
+def bot_room(account):
+    return 'bot:{}'.format(account)
+
+
+@sio.on('connect')
+def connect(sid, environ):
+    sio.enter_room(sid, BROADCAST_ROOM)
+
+# client only wants the events of an account, optionally of some classes:
+# {"account": "name", "classes": ["catches", "position"]}
+@sio.on('client:subscribe')
+def subscribe(sid, subscription):
+    if not 'account' in subscription:
+        return False
+    sio.leave_room(sid, BROADCAST_ROOM)
+    account = subscription['account']
+    classes = subscription.get('classes')
+    if classes:
+        for event_class in classes:
+            sio.enter_room(sid, account_room(account, event_class))
+    else:
+        sio.enter_room(sid, account_room(account))
+
+@sio.on('client:unsubscribe')
+def unsubscribe(sid, subscription):
+    if not 'account' in subscription:
+        return False
+    account = subscription['account']
+    classes = subscription.get('classes') or list(EVENT_CLASSES) + ['other']
+    sio.leave_room(sid, account_room(account))
+    for event_class in classes:
+        sio.leave_room(sid, account_room(account, event_class))
+
+# bot connections don't receive the events, the remote control ones listen to
+# the requests sent to their account: {"account": "name", "remote_control": true}
+@sio.on('bot:register')
+def register_bot(sid, registration):
+    sio.leave_room(sid, BROADCAST_ROOM)
+    if registration.get('remote_control'):
+        sio.enter_room(sid, bot_room(registration['account']))
+
+# client asks for data, the reply only goes back to it
 @sio.on('remote:send_request')
 def remote_control(sid, command):
     if not 'account' in command:
         return False
     bot_name = command.pop('account')
+    command['sid'] = sid
     event = 'bot:process_request:{}'.format(bot_name)
-    sio.emit(event, data=command)
+    sio.emit(event, data=command, room=bot_room(bot_name))
 
 # sending bot response to client
 @sio.on('bot:send_reply')
 def request_reply(sid, response):
     event = response.pop('command')
     account = response['account']
+    client_sid = response.pop('sid', None)
     event = "{}:{}".format(event, account)
-    sio.emit(event, response)
+    sio.emit(event, response, room=client_sid or BROADCAST_ROOM)
 
 @sio.on('bot:broadcast')
 def bot_broadcast(sid, env):
     event = env['event']
     account = env['account']
     event_name = "{}:{}".format(event, account)
-    sio.emit(event_name, data=env)
+    sio.emit(event_name, data=env, room=account_room(account))
+    sio.emit(event_name, data=env, room=account_room(account, _CLASS_BY_EVENT.get(event, 'other')))
+    sio.emit(event_name, data=env, room=BROADCAST_ROOM)
+
+# batched events, unpacked and sent to the clients like single broadcasts
+@sio.on('bot:broadcast_batch')
+def bot_broadcast_batch(sid, frame):
+    if isinstance(frame, (bytes, bytearray)):
+        if msgpack is None:
+            logging.getLogger('socketio_server').error('Received a msgpack frame but msgpack is not installed')
+            return
+        try:
+            frame = msgpack.unpackb(bytes(frame), raw=False)
+        except TypeError:
+            # msgpack < 0.5.2
+            frame = msgpack.unpackb(bytes(frame), encoding='utf-8')
+
+    account = frame['account']
+    for entry in frame['events']:
+        entry['account'] = account
+        bot_broadcast(sid, entry)
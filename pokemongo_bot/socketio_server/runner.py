@@ -32,3 +32,15 @@ class SocketIoRunner(object):
         # deploy as an eventlet WSGI server
         listener = eventlet.listen((self.host, self.port))
         self.server = wsgi.server(listener, self.app, log_output=False, debug=False)
+
+
+# url -> runner, the embedded server is only started once when the bot is
+# re-created or several accounts run in the process
+_runners = {}
+
+
+def start_embedded_server(url):
+    if url not in _runners:
+        _runners[url] = SocketIoRunner(url)
+        _runners[url].start_listening_async()
+    return _runners[url]
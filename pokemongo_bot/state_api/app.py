@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+import urlparse
+
+STATUSES = {
+    200: str('200 OK'),
+    304: str('304 Not Modified'),
+    400: str('400 Bad Request'),
+    404: str('404 Not Found'),
+    405: str('405 Method Not Allowed')
+}
+
+
+class StateApi(object):
+    """
+    WSGI application serving the state store as JSON:
+
+      GET /state              every section: {"version", "since", "sections"}
+      GET /state?since=<v>    only the sections changed after version v
+      GET /state/<section>    one section: {"version", "data"}
+
+    Responses carry an ETag, a request with a matching If-None-Match header
+    gets an empty 304 response. HEAD requests get the headers only.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __call__(self, environ, start_response):
+        response = self._handle(environ, start_response)
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return [b'']
+        return response
+
+    def _handle(self, environ, start_response):
+        if environ.get('REQUEST_METHOD', 'GET') not in ('GET', 'HEAD'):
+            return self._respond(start_response, 405, {'error': 'Only GET is supported'})
+
+        path = environ.get('PATH_INFO', '').strip('/')
+        query = urlparse.parse_qs(environ.get('QUERY_STRING', ''))
+
+        if path in ('', 'state'):
+            try:
+                since = int(query.get('since', [0])[0])
+            except ValueError:
+                return self._respond(start_response, 400, {'error': 'since must be a version number'})
+            version, sections = self.store.changes(since)
+            body = {'version': version, 'since': since, 'sections': sections}
+            etag = '"{}-{}"'.format(version, since)
+
+        elif path.startswith('state/'):
+            section = path[len('state/'):]
+            entry = self.store.get(section)
+            if entry is None:
+                return self._respond(start_response, 404, {'error': 'Unknown section {}'.format(section)})
+            body = {'version': entry[0], 'data': entry[1]}
+            etag = '"{}"'.format(entry[0])
+
+        else:
+            return self._respond(start_response, 404, {'error': 'Not found'})
+
+        if environ.get('HTTP_IF_NONE_MATCH') == etag:
+            return self._respond(start_response, 304, None, etag)
+        return self._respond(start_response, 200, body, etag)
+
+    def _respond(self, start_response, status, body, etag=None):
+        headers = [
+            (str('Cache-Control'), str('no-cache')),
+            (str('Access-Control-Allow-Origin'), str('*'))
+        ]
+        if etag is not None:
+            headers.append((str('ETag'), str(etag)))
+
+        payload = b''
+        if body is not None:
+            payload = json.dumps(body)
+            headers.append((str('Content-Type'), str('application/json')))
+        headers.append((str('Content-Length'), str(len(payload))))
+
+        start_response(STATUSES[status], headers)
+        return [payload]
@@ -0,0 +1,39 @@
+import threading
+
+import eventlet
+from eventlet import wsgi
+
+from app import StateApi
+
+
+class StateApiRunner(object):
+    def __init__(self, url, store):
+        self.host, port_str = url.split(':')
+        self.port = int(port_str)
+        self.app = StateApi(store)
+
+        self.thread = threading.Thread(target=self._start_listening_blocking)
+        self.thread.daemon = True
+
+    def start_listening_async(self):
+        self.thread.start()
+
+    def _start_listening_blocking(self):
+        listener = eventlet.listen((self.host, self.port))
+        wsgi.server(listener, self.app, log_output=False, debug=False)
+
+
+# url -> runner, the bot is re-created after API errors but the server keeps
+# listening and serves the store of the new bot
+_runners = {}
+
+
+def serve(url, store):
+    runner = _runners.get(url)
+    if runner is None:
+        runner = _runners[url] = StateApiRunner(url, store)
+        runner.start_listening_async()
+    elif runner.app.store is not store:
+        store.continue_from(runner.app.store)
+        runner.app.store = store
+    return runner
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+
+
+class StateStore(object):
+    """
+    Latest state of the bot, split in sections (position, cell, inventory...).
+
+    Every change of a section bumps the global version and tags the section
+    with it, which lets readers ask for the sections changed since the
+    version they already have. Updating a section with an equal value is not
+    a change.
+
+    The values are handed over to the HTTP server thread, so the publisher
+    has to give away its own copy and never modify it afterwards.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = 0
+        # section name -> (version, value)
+        self._sections = {}
+
+    def update(self, section, value):
+        """
+        Returns True when the section changed.
+        """
+        with self._lock:
+            current = self._sections.get(section)
+            if current is not None and current[1] == value:
+                return False
+            self.version += 1
+            self._sections[section] = (self.version, value)
+            return True
+
+    def get(self, section):
+        """
+        Returns the (version, value) of a section, None if it is unknown.
+        """
+        with self._lock:
+            return self._sections.get(section)
+
+    def changes(self, since=0):
+        """
+        Returns the current version and the sections changed after `since`.
+        """
+        with self._lock:
+            return self.version, {
+                name: value
+                for name, (version, value) in self._sections.iteritems()
+                if version > since
+            }
+
+    def continue_from(self, previous):
+        """
+        Numbers the versions of this store after those of `previous`, the
+        store it replaces, so readers holding a version of the previous
+        store still see every section of this one as changed.
+        """
+        with self._lock:
+            offset = previous.version
+            self.version += offset
+            self._sections = {
+                name: (version + offset, value)
+                for name, (version, value) in self._sections.iteritems()
+            }
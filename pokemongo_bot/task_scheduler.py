@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+import time
+
+from pokemongo_bot.cell_workers.utils import distance
+from pokemongo_bot.event_manager import EventHandler
+from pokemongo_bot.worker_result import WorkerResult
+
+# Pseudo event that can be used as a trigger, it is fired by every event
+# changing the content of the bag, the pokemon list or the candies.
+INVENTORY_CHANGED = 'inventory_changed'
+INVENTORY_EVENTS = (
+    'pokemon_caught',
+    'pokemon_release',
+    'pokemon_evolved',
+    'egg_hatched',
+    'spun_pokestop',
+    'item_discarded',
+    'level_up_reward',
+    'used_lucky_egg',
+    'incubate',
+    'gained_candy',
+)
+
+# A deferred task runs anyway once it has been pushed back that many ticks
+MAX_DEFERRALS = 10
+
+
+class _TaskState(object):
+    def __init__(self, task, index):
+        schedule = getattr(task, 'config', {}).get('schedule', {})
+
+        self.task = task
+        self.index = index
+        self.interval = float(schedule.get('interval', getattr(task, 'RUN_INTERVAL', 0)))
+        self.min_distance = float(schedule.get('min_distance', getattr(task, 'TRIGGER_DISTANCE', 0)))
+        self.priority = schedule.get('priority', getattr(task, 'PRIORITY', 0))
+        self.budget = schedule.get('budget', getattr(task, 'TIME_BUDGET', None))
+
+        self.triggers = set()
+        for event in schedule.get('triggers', getattr(task, 'TRIGGER_EVENTS', ())):
+            if event == INVENTORY_CHANGED:
+                self.triggers.update(INVENTORY_EVENTS)
+            else:
+                self.triggers.add(event)
+
+        self.last_run = None
+        self.last_position = None
+        self.triggered = False
+        self.deferred = 0
+        self.duration = None
+
+    @property
+    def scheduled(self):
+        """
+        Tasks without interval, trigger or distance run at every tick, like
+        they always did.
+        """
+        return bool(self.interval or self.triggers or self.min_distance)
+
+    def is_due(self, now, position):
+        if not self.scheduled or self.last_run is None or self.triggered:
+            return True
+        if self.interval and now - self.last_run >= self.interval:
+            return True
+        if self.min_distance and distance(
+                self.last_position[0], self.last_position[1],
+                position[0], position[1]) >= self.min_distance:
+            return True
+        return False
+
+    def expected_duration(self):
+        if self.duration is None:
+            return self.budget or 0
+        return max(self.duration, self.budget or 0)
+
+
+class TaskScheduler(EventHandler):
+    """
+    Decides which tasks run at each tick.
+
+    Every task can declare, through class attributes or the "schedule" key of
+    its configuration, an interval in seconds, the events that make it due
+    ("inventory_changed" being a shortcut for every event changing the
+    inventory), a distance in metres after which it is due again, a priority
+    (higher runs first, ties keep the configuration order) and a time budget
+    in seconds.
+
+    Tasks that declare nothing run at every tick. A task returning RUNNING
+    still prevents the following ones from running, and is due again at the
+    next tick to carry on.
+
+    When a tick budget is configured, scheduled tasks whose expected duration
+    would exceed what is left of it are pushed back to the next tick (at most
+    MAX_DEFERRALS times in a row), so they never starve movement and catching.
+    """
+
+    def __init__(self, bot, tick_budget=0):
+        self.bot = bot
+        self.tick_budget = tick_budget
+        self._workers = None
+        self._states = {}
+        self._ordered = []
+
+    def min_level(self):
+        # trigger events have to be emitted at the info level or above
+        return logging.INFO
+
+    def handle_event(self, event, sender, level, formatted_msg, data):
+        for state in self._ordered:
+            if event in state.triggers:
+                state.triggered = True
+
+    def due_tasks(self, workers):
+        """
+        Yields the tasks to run during this tick in order. It is a generator so
+        the remaining budget is evaluated right before each task.
+        """
+        self._update_workers(workers)
+
+        tick_start = time.time()
+        position = self.bot.position[0:2]
+        for state in self._ordered:
+            now = time.time()
+            if not state.is_due(now, position):
+                continue
+
+            if (self.tick_budget and state.scheduled and state.deferred < MAX_DEFERRALS and
+                    now - tick_start + state.expected_duration() > self.tick_budget):
+                state.deferred += 1
+                continue
+
+            yield state.task
+
+    def run_task(self, task):
+        state = self._states[task]
+
+        start = time.time()
+        result = task.work()
+        now = time.time()
+
+        elapsed = now - start
+        state.duration = elapsed if state.duration is None else 0.8 * state.duration + 0.2 * elapsed
+        state.last_run = now
+        state.last_position = self.bot.position[0:2]
+        # a task returning RUNNING isn't done yet
+        state.triggered = result == WorkerResult.RUNNING
+        state.deferred = 0
+
+        return result
+
+    def _update_workers(self, workers):
+        if workers is self._workers and len(workers) == len(self._ordered):
+            return
+
+        self._workers = workers
+        states = {}
+        for index, task in enumerate(workers):
+            states[task] = self._states.get(task) or _TaskState(task, index)
+            states[task].index = index
+        self._states = states
+        self._ordered = sorted(states.values(), key=lambda s: (-s.priority, s.index))
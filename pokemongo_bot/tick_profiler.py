@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import cProfile
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+
+from pokemongo_bot.base_dir import _base_dir
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+try:
+    # Part of the standard library since python 3.4, available on python 2
+    # through the `pytracemalloc` backport
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# The real time.sleep, kept aside so that a new profiler (the bot is
+# re-created after API errors) replaces the hook of the previous one instead of
+# wrapping it. Looked up on first start so eventlet's patched sleep is used.
+_time_sleep = None
+
+
+def _cpu_time():
+    # user + system time of the whole process
+    times = os.times()
+    return times[0] + times[1]
+
+
+def _memory_usage():
+    """
+    Returns the memory currently used by the process in bytes.
+    Uses tracemalloc when it is available, the peak RSS otherwise (which means
+    the allocation deltas only show growth in that case).
+    """
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on OS X, in kilobytes everywhere else
+        return rss if sys.platform == 'darwin' else rss * 1024
+    return 0
+
+
+class _NullPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _Phase(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._begin_phase(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler._end_phase()
+        return False
+
+
+class _PhaseRecord(object):
+    __slots__ = ('wall', 'cpu', 'sleep', 'rpc_count', 'rpc_time', 'alloc')
+
+    def __init__(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.sleep = 0.0
+        self.rpc_count = 0
+        self.rpc_time = 0.0
+        self.alloc = 0
+
+    def to_dict(self):
+        return {
+            'wall': self.wall,
+            'cpu': self.cpu,
+            'sleep': self.sleep,
+            'rpc_count': self.rpc_count,
+            'rpc_time': self.rpc_time,
+            'alloc': self.alloc
+        }
+
+
+class TickProfiler(object):
+    """
+    Records, for every tick and for each of its phases (heartbeat, map refresh,
+    session check and every worker), the wall time, the CPU time, the time
+    spent sleeping, the number of RPCs with their latency and the memory
+    allocated.
+
+    A rolling summary over the last `window` ticks is written to
+    data/profile-<username>.json every `dump_interval` seconds. When
+    `sample_stacks` is set, every `sample_every`th tick runs under cProfile
+    and, if it took longer than `slow_tick` seconds, its stats are dumped as a
+    .prof file and as folded stacks usable by flamegraph.pl / speedscope.
+
+    When disabled all the hooks are no-ops.
+    """
+
+    def __init__(self, bot, enabled=False, window=100, dump_interval=60,
+                 slow_tick=5.0, sample_stacks=False, sample_every=10):
+        self.bot = bot
+        self.enabled = enabled
+        self.window = window
+        self.dump_interval = dump_interval
+        self.slow_tick = slow_tick
+        self.sample_stacks = sample_stacks
+        self.sample_every = max(1, sample_every)
+        self.logger = logging.getLogger(type(self).__name__)
+
+        self.ticks = deque(maxlen=window)
+        self.rpc_by_type = {}
+        self.tick_count = 0
+        self.last_dump = time.time()
+
+        self._thread = None
+        self._tick = None
+        self._tick_start = None
+        self._phase_name = None
+        self._phase_start = None
+        self._cprofile = None
+
+    @classmethod
+    def from_config(cls, bot, config):
+        return cls(
+            bot,
+            enabled=config.profiler_enabled,
+            window=config.profiler_window,
+            dump_interval=config.profiler_dump_interval,
+            slow_tick=config.profiler_slow_tick,
+            sample_stacks=config.profiler_sample_stacks,
+            sample_every=config.profiler_sample_every
+        )
+
+    def start(self):
+        """
+        Installs the sleep hook and starts allocation tracing. Time spent in
+        time.sleep is only accounted for the thread calling start(), which
+        should be the one running the ticks.
+        """
+        global _time_sleep
+        if not self.enabled or self._thread is not None:
+            return
+
+        if _time_sleep is None:
+            _time_sleep = time.sleep
+        self._thread = threading.current_thread()
+        time.sleep = self._sleep
+
+        if tracemalloc is not None and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        if time.sleep == self._sleep:
+            time.sleep = _time_sleep
+        self._thread = None
+        self.dump()
+
+    #
+    # Hooks
+
+    def start_tick(self):
+        if not self.enabled:
+            return
+
+        self.tick_count += 1
+        self._tick = {'phases': {}}
+        self._tick_start = self._snapshot()
+
+        if self.sample_stacks and self.tick_count % self.sample_every == 0:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def end_tick(self):
+        if not self.enabled or self._tick is None:
+            return
+
+        if self._phase_name is not None:
+            self._end_phase()
+
+        wall, cpu, sleep, alloc = self._delta(self._tick_start)
+        tick = self._tick
+        tick['tick'] = self.tick_count
+        tick['wall'] = wall
+        tick['cpu'] = cpu
+        tick['sleep'] = sleep
+        tick['alloc'] = alloc
+        tick['rpc_count'] = sum(p.rpc_count for p in tick['phases'].itervalues())
+        tick['rpc_time'] = sum(p.rpc_time for p in tick['phases'].itervalues())
+        self.ticks.append(tick)
+        self._tick = None
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            if wall >= self.slow_tick:
+                self._dump_stacks(self._cprofile, tick)
+            self._cprofile = None
+
+        if time.time() - self.last_dump >= self.dump_interval:
+            self.dump()
+
+    def phase(self, name):
+        if not self.enabled or self._tick is None:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def record_rpc(self, request_types, latency):
+        if not self.enabled or threading.current_thread() is not self._thread:
+            return
+
+        for request_type in request_types:
+            stats = self.rpc_by_type.setdefault(request_type, {'count': 0, 'time': 0.0})
+            stats['count'] += 1
+            stats['time'] += latency / len(request_types)
+
+        record = self._current_record()
+        if record is not None:
+            record.rpc_count += 1
+            record.rpc_time += latency
+
+    def _sleep(self, seconds):
+        start = time.time()
+        try:
+            _time_sleep(seconds)
+        finally:
+            if threading.current_thread() is self._thread:
+                record = self._current_record()
+                if record is not None:
+                    record.sleep += time.time() - start
+
+    #
+    # Internals
+
+    def _snapshot(self):
+        return time.time(), _cpu_time(), self._sleep_total(), _memory_usage()
+
+    def _delta(self, snapshot):
+        wall, cpu, sleep, memory = self._snapshot()
+        return (
+            wall - snapshot[0],
+            cpu - snapshot[1],
+            sleep - snapshot[2],
+            memory - snapshot[3]
+        )
+
+    def _sleep_total(self):
+        if self._tick is None:
+            return 0.0
+        return sum(p.sleep for p in self._tick['phases'].itervalues())
+
+    def _current_record(self):
+        if self._tick is None or self._phase_name is None:
+            return None
+        return self._tick['phases'][self._phase_name]
+
+    def _begin_phase(self, name):
+        if self._phase_name is not None:
+            self._end_phase()
+        # the same worker can run several times in one tick
+        self._tick['phases'].setdefault(name, _PhaseRecord())
+        self._phase_name = name
+        self._phase_start = time.time(), _cpu_time(), _memory_usage()
+
+    def _end_phase(self):
+        record = self._tick['phases'][self._phase_name]
+        record.wall += time.time() - self._phase_start[0]
+        record.cpu += _cpu_time() - self._phase_start[1]
+        record.alloc += _memory_usage() - self._phase_start[2]
+        self._phase_name = None
+        self._phase_start = None
+
+    def summary(self):
+        ticks = list(self.ticks)
+        phases = {}
+        for tick in ticks:
+            for name, record in tick['phases'].iteritems():
+                stats = phases.setdefault(name, {
+                    'runs': 0, 'wall': 0.0, 'wall_max': 0.0, 'cpu': 0.0,
+                    'sleep': 0.0, 'rpc_count': 0, 'rpc_time': 0.0, 'alloc': 0
+                })
+                stats['runs'] += 1
+                stats['wall'] += record.wall
+                stats['wall_max'] = max(stats['wall_max'], record.wall)
+                stats['cpu'] += record.cpu
+                stats['sleep'] += record.sleep
+                stats['rpc_count'] += record.rpc_count
+                stats['rpc_time'] += record.rpc_time
+                stats['alloc'] += record.alloc
+
+        for stats in phases.itervalues():
+            runs = float(stats['runs'])
+            for key in ('wall', 'cpu', 'sleep', 'rpc_count', 'rpc_time', 'alloc'):
+                stats[key + '_avg'] = stats[key] / runs
+            stats['rpc_latency_avg'] = stats['rpc_time'] / stats['rpc_count'] if stats['rpc_count'] else 0.0
+
+        count = len(ticks)
+        walls = [t['wall'] for t in ticks]
+        return {
+            'timestamp': time.time(),
+            'ticks_total': self.tick_count,
+            'ticks_in_window': count,
+            'allocation_source': 'tracemalloc' if tracemalloc is not None and tracemalloc.is_tracing() else 'maxrss',
+            'tick': {
+                'wall_avg': sum(walls) / count if count else 0.0,
+                'wall_max': max(walls) if walls else 0.0,
+                'cpu_avg': sum(t['cpu'] for t in ticks) / count if count else 0.0,
+                'sleep_avg': sum(t['sleep'] for t in ticks) / count if count else 0.0,
+                'rpc_count_avg': sum(t['rpc_count'] for t in ticks) / float(count) if count else 0.0,
+                'alloc_avg': sum(t['alloc'] for t in ticks) / float(count) if count else 0.0
+            },
+            'phases': phases,
+            'rpc_by_type': self.rpc_by_type,
+            'slowest_ticks': [
+                {
+                    'tick': t['tick'],
+                    'wall': t['wall'],
+                    'phases': {name: r.to_dict() for name, r in t['phases'].iteritems()}
+                }
+                for t in sorted(ticks, key=lambda t: t['wall'], reverse=True)[:5]
+            ]
+        }
+
+    def dump(self):
+        self.last_dump = time.time()
+        path = self._output_path('json')
+        try:
+            with open(path, 'w') as outfile:
+                json.dump(self.summary(), outfile, indent=2)
+        except IOError as e:
+            self.logger.info('[x] Error while writing profile summary: %s' % e)
+
+    def _dump_stacks(self, profile, tick):
+        suffix = 'tick{}'.format(tick['tick'])
+        try:
+            profile.dump_stats(self._output_path('prof', suffix))
+            stats = pstats.Stats(profile)
+            with open(self._output_path('folded', suffix), 'w') as outfile:
+                for line in _folded_stacks(stats):
+                    outfile.write(line + '\n')
+        except IOError as e:
+            self.logger.info('[x] Error while writing profile stacks: %s' % e)
+
+    def _output_path(self, extension, suffix=None):
+        name = 'profile-{}'.format(self.bot.config.username)
+        if suffix:
+            name = '{}-{}'.format(name, suffix)
+        return os.path.join(_base_dir, 'data', '{}.{}'.format(name, extension))
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def _function_label(func):
+    filename, line, name = func
+    return '{}:{}:{}'.format(os.path.basename(filename), line, name)
+
+
+def _folded_stacks(stats, max_depth=64):
+    """
+    cProfile only keeps caller -> callee edges, so full stacks are rebuilt by
+    following the most expensive caller of every function up to a root. The
+    weight of each stack is the own time of its leaf in microseconds.
+    """
+    entries = stats.stats
+    for func, (_, _, own_time, _, callers) in entries.iteritems():
+        weight = int(own_time * 1e6)
+        if weight <= 0:
+            continue
+
+        stack = [func]
+        seen = {func}
+        current = callers
+        while current and len(stack) < max_depth:
+            # caller values are (cc, nc, tt, ct) tuples, heaviest by cumulative time
+            caller = max(current.iteritems(), key=lambda c: c[1][3])[0]
+            if caller in seen:
+                break
+            seen.add(caller)
+            stack.append(caller)
+            current = entries.get(caller, (None, None, None, None, {}))[4]
+
+        yield '{} {}'.format(';'.join(_function_label(f) for f in reversed(stack)), weight)
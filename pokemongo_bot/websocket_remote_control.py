@@ -1,9 +1,16 @@
 import threading
 from socketIO_client import SocketIO, BaseNamespace
 
+# Age in seconds of the cached player data and inventory above which a query
+# makes the bot refresh them
+DEFAULT_MAX_AGE = 60
+# Seconds to wait for the bot to refresh them, the cached state is sent after
+REFRESH_TIMEOUT = 30
 
-class WebsocketRemoteControl(object):
 
+class WebsocketRemoteControl(object):
+    # methods which can be called remotely
+    COMMANDS = ('get_player_info',)
 
     def __init__(self, bot):
         self.bot = bot
@@ -14,7 +21,19 @@ class WebsocketRemoteControl(object):
             'bot:process_request:{}'.format(self.bot.config.username),
             self.on_remote_command
         )
+        # the server forgets the registration when the connection drops
+        self.sio.on('connect', self.register)
+        self.sio.on('reconnect', self.register)
         self.thread = threading.Thread(target=self.process_messages)
+        self._emit_lock = threading.RLock()
+        self.register()
+
+    def register(self, *args):
+        with self._emit_lock:
+            self.sio.emit(
+                'bot:register',
+                {'account': self.bot.config.username, 'remote_control': True}
+            )
 
     def start(self):
         self.thread.start()
@@ -24,35 +43,49 @@ class WebsocketRemoteControl(object):
         self.sio.wait()
 
     def on_remote_command(self, command):
+        # commands can wait for the bot, don't block the socket meanwhile
+        thread = threading.Thread(target=self.run_command, args=(command,))
+        thread.daemon = True
+        thread.start()
+
+    def run_command(self, command):
         name = command['name']
-        command_handler = getattr(self, name, None)
-        if not command_handler or not callable(command_handler):
-            self.sio.emit(
-                'bot:send_reply',
-                {
-                    'response': '',
-                    'command': 'command_not_found',
-                    'account': self.bot.config.username
-                }
-            )
-            return
-        if 'args' in command:
-            command_handler(*args)
+        # the server routes the reply back to the client which sent the request
+        sid = command.get('sid')
+        command_handler = getattr(self, name, None) if name in self.COMMANDS else None
+        if not command_handler:
+            self.reply({
+                'response': '',
+                'command': 'command_not_found',
+                'account': self.bot.config.username,
+                'sid': sid
+            })
             return
-        command_handler()
-
-    def get_player_info(self):
-        request = self.bot.api.create_request()
-        request.get_player()
-        request.get_inventory()
-        response_dict = request.call()
-        inventory = response_dict['responses'].get('GET_INVENTORY', {})
-        player_info = response_dict['responses'].get('GET_PLAYER', {})
-        self.sio.emit(
-            'bot:send_reply',
-            {
-                'result': {'inventory': inventory, 'player': player_info},
-                'command': 'get_player_info',
-                'account': self.bot.config.username
-            }
-        )
+        result = command_handler(*command.get('args', []), **command.get('kwargs', {}))
+        self.reply({
+            'result': result,
+            'command': name,
+            'account': self.bot.config.username,
+            'sid': sid
+        })
+
+    def reply(self, reply):
+        # the commands run in their own threads
+        with self._emit_lock:
+            self.sio.emit('bot:send_reply', reply)
+
+    def get_player_info(self, max_age=DEFAULT_MAX_AGE):
+        """
+        Answers from the player data and inventory cached by the bot. They are
+        only refreshed when older than `max_age` seconds, by the main thread,
+        with a single RPC for all the queries waiting for it.
+        """
+        if self.bot.player_state_age() > max_age:
+            self.bot.request_player_refresh().wait(REFRESH_TIMEOUT)
+
+        latest_inventory = self.bot.latest_inventory or {}
+        return {
+            'inventory': latest_inventory.get('responses', {}).get('GET_INVENTORY', {}),
+            'player': {'player_data': self.bot.player_data},
+            'age': self.bot.player_state_age()
+        }
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+import time
+
+from cell_workers.utils import distance
+
+# the Pokémon of a cell, which depend on the position and time of the request
+POKEMON_KEYS = ('wild_pokemons', 'catchable_pokemons', 'nearby_pokemons')
+
+
+class WorldCache(object):
+    """
+    Map cells received by the accounts running in this process, by S2 cell
+    id, so an account standing next to another one can reuse its
+    GET_MAP_OBJECTS response instead of sending its own.
+
+    Only the most recent observation of a cell is kept, according to the
+    `current_timestamp_ms` of the server. The forts and their lures are the
+    same for everyone and are used whatever the age of the observation, but
+    the Pokémon returned depend on where the request was sent from: they
+    are only used by an account close to the position the observation was
+    made from, and while it is younger than the maximum age asked for.
+    Pokémon and lures which expired since are left out.
+
+    The cells returned are new dicts and lists, the forts and Pokémon in them
+    are shared between the accounts and must not be modified.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # cell id -> (observation time, latitude, longitude, cell)
+        self._cells = {}
+        self.counters = {
+            'hits': 0,
+            'misses': 0
+        }
+
+    def store(self, map_cells, latitude, longitude):
+        now = time.time()
+        with self._lock:
+            for cell in map_cells:
+                cell_id = cell.get('s2_cell_id')
+                if cell_id is None:
+                    continue
+                current = self._cells.get(cell_id)
+                if current is not None and \
+                        current[3].get('current_timestamp_ms', 0) >= cell.get('current_timestamp_ms', 0):
+                    continue
+                cell = {key: list(value) if isinstance(value, list) else value
+                        for key, value in cell.iteritems()}
+                self._cells[cell_id] = (now, latitude, longitude, cell)
+
+    def lookup(self, cell_ids, latitude, longitude, max_age, max_distance, pokemons_required=True):
+        """
+        Returns the cells for a request sent from (latitude, longitude), None
+        when one of them was never observed.
+
+        The Pokémon of a cell are only returned when it was observed less
+        than `max_age` seconds ago within `max_distance` meters, the other
+        cells only keep their forts. With `pokemons_required`, None is
+        returned unless every cell has its Pokémon.
+        """
+        now = time.time()
+        with self._lock:
+            entries = [self._cells.get(cell_id) for cell_id in cell_ids]
+            if any(entry is None for entry in entries):
+                self.counters['misses'] += 1
+                return None
+            pokemons_fresh = [
+                now - observed <= max_age and
+                distance(latitude, longitude, entry_latitude, entry_longitude) <= max_distance
+                for observed, entry_latitude, entry_longitude, _ in entries
+            ]
+            if pokemons_required and not all(pokemons_fresh):
+                self.counters['misses'] += 1
+                return None
+            self.counters['hits'] += 1
+
+        return [self._fresh_cell(observed, cell, now, fresh)
+                for (observed, _, _, cell), fresh in zip(entries, pokemons_fresh)]
+
+    @staticmethod
+    def _fresh_cell(observed, cell, now, pokemons_fresh=True):
+        # the time of the server now, from the time of the observation
+        server_now = cell.get('current_timestamp_ms', 0) + int((now - observed) * 1000)
+
+        fresh = dict(cell)
+        if not pokemons_fresh:
+            for key in POKEMON_KEYS:
+                fresh.pop(key, None)
+        if 'catchable_pokemons' in fresh:
+            fresh['catchable_pokemons'] = [
+                pokemon for pokemon in cell['catchable_pokemons']
+                if pokemon.get('expiration_timestamp_ms', server_now) >= server_now
+            ]
+        if 'wild_pokemons' in fresh:
+            fresh['wild_pokemons'] = [
+                pokemon for pokemon in cell['wild_pokemons']
+                if pokemon.get('time_till_hidden_ms', 0) <= 0 or
+                pokemon.get('last_modified_timestamp_ms', server_now) + pokemon['time_till_hidden_ms'] >= server_now
+            ]
+        if 'forts' in cell:
+            fresh['forts'] = [WorldCache._fresh_fort(fort, server_now) for fort in cell['forts']]
+        return fresh
+
+    @staticmethod
+    def _fresh_fort(fort, server_now):
+        lure_info = fort.get('lure_info')
+        if lure_info is None or lure_info.get('lure_expires_timestamp_ms', server_now) >= server_now:
+            return fort
+        fort = dict(fort)
+        del fort['lure_info']
+        return fort
+
+
+# shared by the bots of all the accounts of the process
+_cache = WorldCache()
+
+
+def shared_cache():
+    return _cache
@@ -4,6 +4,10 @@ from mock import MagicMock
 from pokemongo_bot.event_manager import EventManager
 from pokemongo_bot.api_wrapper import ApiWrapper, ApiRequest
 from pokemongo_bot import PokemonGoBot
+from pokemongo_bot.encounter_cache import EncounterCache
+from pokemongo_bot.player_data import PlayerData
+from pokemongo_bot.snapshot_writer import SnapshotWriter
+from pokemongo_bot.tick_profiler import TickProfiler
 
 class FakeApi(ApiWrapper):
     def create_request(self, return_value='mock return'):
@@ -14,7 +18,13 @@ class FakeApi(ApiWrapper):
 
 class FakeBot(PokemonGoBot):
     def __init__(self):
-        self.config = MagicMock(websocket_server_url=False, show_events=False)
+        self.config = MagicMock(websocket_server_url=False, show_events=False, scheduler_tick_budget=0)
+        self.tick_profiler = TickProfiler(self)
+        self.snapshot_writer = SnapshotWriter()
+        self.state_store = None
+        self.world_cache = None
+        self.encounter_cache = EncounterCache()
+        self.player_store = PlayerData()
         self.api = FakeApi()
         self.event_manager = EventManager()
         self._setup_event_system()
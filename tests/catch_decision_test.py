@@ -0,0 +1,33 @@
+import unittest
+
+from pokemongo_bot.catch_decision import (BERRY_MULTIPLIER, POKEMON_VALUE, VIP_VALUE,
+                                          inventory_bucket, probability_bucket, table_for)
+
+
+class CatchDecisionTest(unittest.TestCase):
+    def test_buckets(self):
+        self.assertEqual(probability_bucket(0.0), 0)
+        self.assertEqual(probability_bucket(0.52), 10)
+        self.assertEqual(probability_bucket(1.2), 20)
+        self.assertEqual([inventory_bucket(count) for count in (0, 1, 9, 10, 49, 50, 500)],
+                         [0, 1, 1, 2, 2, 3, 3])
+
+    def test_easy_catch_uses_a_poke_ball_without_berry(self):
+        throw = table_for(0.1, POKEMON_VALUE).decide([0, 0.9, 0.95, 0.99], {1: 100, 2: 100, 3: 100}, 100)
+        self.assertEqual((throw.ball, throw.use_berry), (1, False))
+        self.assertEqual(throw.catch_rate, 0.9)
+
+    def test_hard_vip_catch_uses_better_balls_and_berries(self):
+        throw = table_for(0.1, VIP_VALUE).decide([0, 0.1, 0.15, 0.2], {1: 100, 2: 100, 3: 100}, 100)
+        self.assertNotEqual(throw.ball, 1)
+        self.assertTrue(throw.use_berry)
+        self.assertAlmostEqual(throw.catch_rate, [0, 0.1, 0.15, 0.2][throw.ball] * BERRY_MULTIPLIER)
+
+    def test_only_available_items_are_used(self):
+        table = table_for(0.1, VIP_VALUE)
+        throw = table.decide([0, 0.1, 0.15, 0.2], {1: 5, 2: 0, 3: 0}, 0)
+        self.assertEqual((throw.ball, throw.use_berry), (1, False))
+        self.assertIsNone(table.decide([0, 0.1, 0.15, 0.2], {1: 0, 2: 0, 3: 0}, 10))
+
+    def test_tables_are_shared(self):
+        self.assertIs(table_for(0.101, POKEMON_VALUE), table_for(0.1, POKEMON_VALUE))
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from pokemongo_bot.coordination import Coordinator, MemoryLeaseStore, SqliteLeaseStore
+
+
+class LeaseStoreTests(object):
+    def test_claim_is_exclusive_until_expiration(self):
+        with patch('time.time', return_value=1000):
+            self.assertTrue(self.store.claim('fort', 'a', 'first', 60))
+            self.assertTrue(self.store.claim('fort', 'a', 'first', 60))
+            self.assertFalse(self.store.claim('fort', 'a', 'second', 60))
+            self.assertEqual(self.store.holders('fort'), {'a': 'first'})
+            self.assertEqual(self.store.holders('region'), {})
+
+        with patch('time.time', return_value=1061):
+            self.assertEqual(self.store.holders('fort'), {})
+            self.assertTrue(self.store.claim('fort', 'a', 'second', 60))
+
+    def test_only_the_owner_releases(self):
+        self.store.claim('fort', 'a', 'first', 60)
+        self.store.release('fort', 'a', 'second')
+        self.assertFalse(self.store.claim('fort', 'a', 'second', 60))
+        self.store.release('fort', 'a', 'first')
+        self.assertTrue(self.store.claim('fort', 'a', 'second', 60))
+
+
+class MemoryLeaseStoreTest(LeaseStoreTests, unittest.TestCase):
+    def setUp(self):
+        self.store = MemoryLeaseStore()
+
+
+class SqliteLeaseStoreTest(LeaseStoreTests, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = SqliteLeaseStore(os.path.join(self.directory, 'coordination.db'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_stores_on_the_same_file_share_leases(self):
+        other = SqliteLeaseStore(self.store.path)
+        self.assertTrue(self.store.claim('fort', 'a', 'first', 60))
+        self.assertFalse(other.claim('fort', 'a', 'second', 60))
+
+    def test_locked_database_does_not_give_the_lease(self):
+        other = SqliteLeaseStore(self.store.path, timeout=0)
+        connection = self.store._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.assertFalse(other.claim('fort', 'a', 'second', 60))
+        finally:
+            connection.execute('ROLLBACK')
+        self.assertTrue(other.claim('fort', 'a', 'second', 60))
+
+
+class CoordinatorTest(unittest.TestCase):
+    def setUp(self):
+        store = MemoryLeaseStore()
+        self.first = Coordinator(store, 'first')
+        self.second = Coordinator(store, 'second')
+        self.fort = {'id': 'a', 'latitude': 40.7580, 'longitude': -73.9855}
+        self.same_region = {'id': 'b', 'latitude': 40.7581, 'longitude': -73.9856}
+        self.far_away = {'id': 'c', 'latitude': 40.7829, 'longitude': -73.9654}
+
+    def test_forts_in_a_leased_region_are_not_available(self):
+        forts = [self.fort, self.same_region, self.far_away]
+        self.assertTrue(self.first.claim_fort(self.fort))
+
+        self.assertEqual(self.first.available_forts(forts), forts)
+        self.assertEqual(self.second.available_forts(forts), [self.far_away])
+        self.assertFalse(self.second.claim_fort(self.same_region))
+
+    def test_region_is_not_kept_without_the_fort(self):
+        self.second.store.claim('fort', self.fort['id'], 'second', 60)
+        self.assertFalse(self.first.claim_fort(self.fort))
+        self.assertTrue(self.second.claim_fort(self.same_region))
+
+        self.second.release_fort(self.same_region)
+        self.assertEqual(self.first.available_forts([self.same_region]), [self.same_region])
+
+    def test_without_store_everything_is_available(self):
+        coordinator = Coordinator(None, 'first')
+        self.assertTrue(coordinator.claim_fort(self.fort))
+        self.assertEqual(coordinator.available_pokemon([{'encounter_id': 1}]), [{'encounter_id': 1}])
@@ -0,0 +1,32 @@
+import unittest
+
+from mock import patch
+
+from pokemongo_bot.encounter_cache import EncounterCache
+
+
+class EncounterCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = EncounterCache(max_size=2)
+
+    @patch('time.time', return_value=1000)
+    def test_outcome_lasts_until_the_pokemon_disappears(self, time):
+        self.cache.record({'encounter_id': 1, 'expiration_timestamp_ms': 1100000}, EncounterCache.REJECTED)
+        self.assertEqual(self.cache.outcome(1), EncounterCache.REJECTED)
+
+        time.return_value = 1100
+        self.assertIsNone(self.cache.outcome(1))
+
+    @patch('time.time', return_value=1000)
+    def test_out_of_range_is_short_lived(self, time):
+        self.cache.record({'encounter_id': 1, 'disappear_time': 1500}, EncounterCache.OUT_OF_RANGE)
+        time.return_value = 1059
+        self.assertTrue(self.cache.known({'encounter_id': 1}))
+        time.return_value = 1061
+        self.assertFalse(self.cache.known({'encounter_id': 1}))
+
+    def test_is_bounded(self):
+        for encounter_id in (1, 2, 3):
+            self.cache.record({'encounter_id': encounter_id}, EncounterCache.CAUGHT)
+        self.assertEqual(self.cache.unknown([{'encounter_id': 1}, {'encounter_id': 3}, {'encounter_id': 4}]),
+                         [{'encounter_id': 1}, {'encounter_id': 4}])
@@ -0,0 +1,33 @@
+import logging
+import unittest
+
+from mock import MagicMock
+
+from pokemongo_bot.event_manager import EventHandler, EventManager, EventMalformedException
+
+
+class EventManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = MagicMock(spec=EventHandler)
+        self.handler.min_level.return_value = logging.INFO
+        self.manager = EventManager(self.handler)
+        self.manager.register_event('test', parameters=('value',))
+
+    def test_filtered_levels_are_dropped_before_formatting(self):
+        data = MagicMock()
+        self.manager.emit('test', sender=self, level='debug', formatted='{value}', data=data)
+
+        self.assertFalse(self.handler.handle_event.called)
+        self.assertFalse(data.method_calls)
+
+    def test_message_is_formatted_lazily(self):
+        self.manager.emit('test', sender=self, level='info', formatted='value {value}', data={'value': 42})
+
+        args = self.handler.handle_event.call_args[0]
+        self.assertEqual(args[:3], ('test', self, 'info'))
+        self.assertEqual(unicode(args[3]), 'value 42')
+        self.assertEqual('[test] {}'.format(args[3]), '[test] value 42')
+
+    def test_unknown_parameters_are_rejected(self):
+        with self.assertRaises(EventMalformedException):
+            self.manager.emit('test', sender=self, data={'other': 1})
@@ -0,0 +1,83 @@
+import unittest
+
+from mock import MagicMock, patch
+
+from pokemongo_bot.services.evolution_planner import EvolutionJob, plan_lucky_egg_window
+
+
+def pokemon(pokemon_id, family_id, cost):
+    return MagicMock(id=pokemon_id, first_evolution_id=family_id, evolution_cost=cost)
+
+
+class EvolutionPlannerTest(unittest.TestCase):
+    def test_fills_the_window_of_the_egg(self):
+        pidgeys = [pokemon(index, 16, 12) for index in range(10)]
+        pidgeotto = pokemon(10, 16, 50)
+
+        # 100 candies and 2 transfers pay for 8 pidgeys, cheaper than the pidgeotto
+        plan = plan_lucky_egg_window([pidgeotto] + pidgeys, {16: 100}, transfers=[pokemon(20, 16, 12)] * 2,
+                                     evolve_latency=300, lucky_eggs=1, minimum_evolutions=4)
+
+        self.assertTrue(plan.use_lucky_egg)
+        self.assertEqual(plan.evolutions, pidgeys[:6])
+        self.assertEqual(plan.deferred, pidgeys[6:8])
+        self.assertEqual(plan.expected_xp, 6 * 1000)
+
+    def test_waits_for_enough_evolutions(self):
+        pidgeys = [pokemon(index, 16, 12) for index in range(3)]
+
+        plan = plan_lucky_egg_window(pidgeys, {16: 100}, lucky_eggs=1, minimum_evolutions=90,
+                                     require_lucky_egg=True)
+        self.assertFalse(plan.use_lucky_egg)
+        self.assertEqual((plan.evolutions, plan.deferred), ([], pidgeys))
+
+        # an egg is available, the evolutions wait for it even when not required
+        plan = plan_lucky_egg_window(pidgeys, {16: 100}, lucky_eggs=1, minimum_evolutions=90)
+        self.assertFalse(plan.use_lucky_egg)
+        self.assertEqual((plan.evolutions, plan.deferred), ([], pidgeys))
+
+        plan = plan_lucky_egg_window(pidgeys, {16: 100}, minimum_evolutions=90)
+        self.assertEqual((plan.evolutions, plan.expected_xp), (pidgeys, 1500))
+
+    @patch('time.time')
+    def test_job_evolves_in_steps_until_the_egg_expires(self, time):
+        time.return_value = 1000
+        pidgeys = [pokemon(index, 16, 12) for index in range(5)]
+        plan = plan_lucky_egg_window(pidgeys, {16: 100}, lucky_eggs=1)
+        transfer, use_lucky_egg = MagicMock(), MagicMock(return_value=True)
+        # one evolution due at each step
+        evolve = MagicMock(side_effect=lambda pokemons, limit: (pokemons[:1], pokemons[1:]))
+
+        job = EvolutionJob(plan._replace(transfers=['transfer']), transfer, use_lucky_egg, evolve)
+
+        self.assertFalse(job.run())
+        self.assertFalse(job.run())
+        transfer.assert_called_once_with(['transfer'])
+        use_lucky_egg.assert_called_once_with()
+        self.assertEqual(evolve.call_args[0], (pidgeys[1:], EvolutionJob.BATCH_SIZE))
+
+        time.return_value = 1000 + 30 * 60
+        self.assertTrue(job.run())
+        self.assertEqual((job.evolved, job.left_over), (pidgeys[:2], pidgeys[2:]))
+
+    @patch('time.time')
+    def test_active_egg_is_filled_before_another_one(self, time):
+        time.return_value = 1000
+        pidgeys = [pokemon(index, 16, 12) for index in range(5)]
+
+        # 10 minutes left fit 2 evolutions, done with the egg in use
+        plan = plan_lucky_egg_window(pidgeys, {16: 100}, evolve_latency=300, lucky_eggs=1,
+                                     minimum_evolutions=90, active_window=600)
+        self.assertFalse(plan.use_lucky_egg)
+        self.assertEqual((plan.evolutions, plan.deferred), (pidgeys[:2], pidgeys[2:]))
+        self.assertEqual(plan.expected_xp, 2 * 1000)
+
+        use_lucky_egg = MagicMock()
+        evolve = MagicMock(side_effect=lambda pokemons, limit: (pokemons[:1], pokemons[1:]))
+        job = EvolutionJob(plan, None, use_lucky_egg, evolve, lucky_egg_until=1600)
+
+        self.assertFalse(job.run())
+        time.return_value = 1600
+        self.assertTrue(job.run())
+        self.assertFalse(use_lucky_egg.called)
+        self.assertEqual((job.evolved, job.left_over), (pidgeys[:1], pidgeys[1:2]))
@@ -0,0 +1,76 @@
+import unittest
+
+from mock import MagicMock, patch
+
+from pokemongo_bot.services.evolve_executor import EvolveExecutor
+
+
+@patch('pokemongo_bot.services.evolve_executor.jitter', side_effect=lambda value, delta: value)
+@patch('pokemongo_bot.services.evolve_executor.inventory')
+@patch('time.time')
+class EvolveExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = [1000.0]
+        self.bot = MagicMock()
+        self.pokemons = [MagicMock(id=index, pokemon_id=16, evolution_cost=12) for index in range(5)]
+
+    def start_clock(self, time):
+        time.side_effect = lambda: self.clock[0]
+
+    def test_only_the_due_requests_are_sent(self, time, inventory, jitter):
+        self.start_clock(time)
+        inventory.candies.return_value.get.return_value.quantity = 100
+
+        def evolve_pokemon(pokemon_id):
+            # every request takes a second of the 10 between evolutions
+            self.clock[0] += 1
+            return {'responses': {'EVOLVE_POKEMON': {
+                'result': 1, 'candy_awarded': 1, 'experience_awarded': 500,
+                'evolved_pokemon_data': {'id': pokemon_id, 'pokemon_id': 17}
+            }}}
+        self.bot.api.evolve_pokemon.side_effect = evolve_pokemon
+
+        executor = EvolveExecutor(self.bot, 10)
+        results, left = executor.evolve(self.pokemons)
+        self.assertEqual([(result.pokemon, result.evolved, result.xp) for result in results],
+                         [(self.pokemons[0], True, 500)])
+        self.assertEqual(left, self.pokemons[1:])
+
+        # not due yet
+        self.clock[0] = 1009
+        self.assertEqual(executor.evolve(left), ([], left))
+
+        # the time of the request counts, the next one is due 10 seconds after
+        # the previous one was due
+        self.clock[0] = 1010
+        results, left = executor.evolve(left)
+        self.assertEqual([result.pokemon for result in results], [self.pokemons[1]])
+        self.assertEqual(executor.due, 1020)
+
+        # the evolved pokemons replace the old ones, the candies are spent
+        self.assertEqual(inventory.pokemons.return_value.remove.call_count, 2)
+        self.assertEqual(inventory.pokemons.return_value.add.call_count, 2)
+        inventory.candies.return_value.get.return_value.consume.assert_called_with(11)
+
+    def test_limit(self, time, inventory, jitter):
+        self.start_clock(time)
+        inventory.candies.return_value.get.return_value.quantity = 100
+        self.bot.api.evolve_pokemon.return_value = {'responses': {'EVOLVE_POKEMON': {'result': 1}}}
+
+        results, left = EvolveExecutor(self.bot, 0).evolve(self.pokemons, limit=2)
+        self.assertEqual((len(results), left), (2, self.pokemons[2:]))
+
+    def test_skips_without_candies_or_on_failure(self, time, inventory, jitter):
+        self.start_clock(time)
+        candy = inventory.candies.return_value.get.return_value
+        candy.quantity = 12
+        self.bot.api.evolve_pokemon.return_value = {'responses': {'EVOLVE_POKEMON': {'result': 3}}}
+
+        results, left = EvolveExecutor(self.bot, 10).evolve(self.pokemons[:1])
+        self.assertEqual((results[0].evolved, left), (False, []))
+
+        candy.quantity = 0
+        results, _ = EvolveExecutor(self.bot, 10).evolve(self.pokemons[:1])
+        self.assertFalse(results[0].evolved)
+        self.assertEqual(self.bot.api.evolve_pokemon.call_count, 1)
+        self.assertFalse(candy.consume.called)
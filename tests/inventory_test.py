@@ -1,6 +1,10 @@
+import threading
 import unittest
 
+from mock import MagicMock
+
 from pokemongo_bot.inventory import *
+from pokemongo_bot.player_data import PlayerData
 
 
 class InventoryTest(unittest.TestCase):
@@ -156,6 +160,51 @@ class InventoryTest(unittest.TestCase):
         self.assertAlmostEqual(poke.moveset.attack_perfection, 0.835172881385)
         self.assertAlmostEqual(poke.moveset.defense_perfection, 0.603137650999)
 
+    def test_change_events(self):
+        events = []
+        listener = lambda event, **kwargs: events.append((event, kwargs))
+        for event in (POKEMON_ADDED, POKEMON_REMOVED, EGG_HATCHED, CANDY_CHANGED):
+            subscribe(event, listener)
+            self.addCleanup(unsubscribe, event, listener)
+
+        rattata = {
+            "move_1": 221, "move_2": 129, "pokemon_id": 19, "cp": 106,
+            "individual_attack": 6, "stamina_max": 22, "individual_defense": 14,
+            "cp_multiplier": 0.37523558735847473, "id": 7841053399}
+        egg = {"id": 42, "is_egg": True}
+        wrap = lambda key, data: {'inventory_item_data': {key: data}}
+
+        pokemons = Pokemons()
+        pokemons.refresh([wrap('pokemon_data', egg)])
+        self.assertEqual(events, [])  # nothing is published on the first load
+
+        pokemons.refresh([wrap('pokemon_data', rattata)])
+        self.assertEqual([e[0] for e in events], [EGG_HATCHED, POKEMON_ADDED])
+        added = events[1][1]['pokemon']
+        self.assertEqual(added.id, 7841053399)
+
+        # unchanged pokemons are kept as they are
+        del events[:]
+        pokemons.refresh([wrap('pokemon_data', dict(rattata))])
+        self.assertIs(pokemons.get(7841053399), added)
+        self.assertEqual(events, [])
+
+        # renames made by the bot don't queue the pokemon again
+        added.update_nickname('Rattata1')
+        self.assertEqual(events, [])
+
+        pokemons.remove(7841053399)
+        self.assertEqual(events, [(POKEMON_REMOVED, {'pokemon': added})])
+
+        del events[:]
+        candies = Candies()
+        candies.refresh([wrap('candy', {'family_id': 19, 'candy': 3})])
+        candies.get(19).consume(2)
+        candies.refresh([wrap('candy', {'family_id': 19, 'candy': 7})])
+        self.assertEqual(
+            [(e, kwargs['candy'].family_id, kwargs['previous']) for e, kwargs in events],
+            [(CANDY_CHANGED, 19, 3), (CANDY_CHANGED, 19, 1)])
+
     def test_levels_to_cpm(self):
         l2c = LevelToCPm
         self.assertIs(levels_to_cpm(), l2c)
@@ -213,3 +262,41 @@ class InventoryTest(unittest.TestCase):
             assert (attack in clazz.list_for_type(attack.type.name))
             self.assertIsInstance(attack, ChargedAttack if charged else Attack)
             prev_dps = attack.dps
+
+    def test_item_space_used(self):
+        wrap = lambda item_id, count: {'inventory_item_data': {'item': {'item_id': item_id, 'count': count}}}
+
+        items = Items()
+        items.refresh([wrap(1, 10), wrap(701, 5)])
+        self.assertEqual(items.space_used, 16)
+
+        items.get(1).remove(3)
+        items.get(2).add(4)
+        self.assertEqual(items.space_used, 17)
+
+        items.refresh([wrap(1, 2)])
+        self.assertEqual(items.space_used, 3)
+
+    def test_refresh_updates_the_level(self):
+        bot = MagicMock(player_store=PlayerData())
+        bot.get_inventory.return_value = {'responses': {'GET_INVENTORY': {'inventory_delta': {'inventory_items': [
+            {'inventory_item_data': {'player_stats': {'level': 12, 'experience': 42000}}}
+        ]}}}}
+
+        Inventory(bot)
+        self.assertEqual(bot.player_store.level, 12)
+
+    def test_listeners_are_per_thread(self):
+        events = []
+        listener = lambda event, **kwargs: events.append(event)
+        subscribe(CANDY_CHANGED, listener)
+        self.addCleanup(unsubscribe, CANDY_CHANGED, listener)
+
+        # the bot of another account runs in another thread
+        other_account = threading.Thread(target=lambda: Candy(19, 0).add(1))
+        other_account.start()
+        other_account.join()
+        self.assertEqual(events, [])
+
+        Candy(19, 0).add(1)
+        self.assertEqual(events, [CANDY_CHANGED])
@@ -0,0 +1,41 @@
+import unittest
+
+from pokemongo_bot.player_data import PlayerData
+
+
+class PlayerDataTest(unittest.TestCase):
+    player_data = {
+        'username': 'Username',
+        'team': 1,
+        'max_pokemon_storage': 250,
+        'max_item_storage': 350,
+        'currencies': [{'name': 'POKECOIN'}, {'name': 'STARDUST', 'amount': 1000}]
+    }
+
+    def setUp(self):
+        self.store = PlayerData()
+        self.changes = []
+        self.store.subscribe(lambda field, value, previous: self.changes.append((field, value, previous)))
+
+    def test_fields(self):
+        self.assertEqual(self.store.age(), float('inf'))
+        self.store.update(self.player_data)
+        self.store.update_stats({'level': 25, 'experience': 1337500})
+
+        self.assertIs(self.store.raw, self.player_data)
+        self.assertLess(self.store.age(), 1)
+        self.assertEqual((self.store.pokecoins, self.store.stardust), (0, 1000))
+        self.assertEqual(self.store.snapshot(), {
+            'username': 'Username', 'team': 1, 'level': 25, 'pokecoins': 0, 'stardust': 1000,
+            'max_pokemon_storage': 250, 'max_item_storage': 350
+        })
+        with self.assertRaises(AttributeError):
+            self.store.experience
+
+    def test_notifies_changes_only(self):
+        self.store.update(self.player_data)
+        del self.changes[:]
+
+        self.store.update(dict(self.player_data, max_item_storage=400))
+        self.store.update(dict(self.player_data, max_item_storage=400))
+        self.assertEqual(self.changes, [('max_item_storage', 400, 350)])
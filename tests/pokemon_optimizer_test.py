@@ -0,0 +1,66 @@
+import unittest
+
+from mock import MagicMock, patch
+
+from pokemongo_bot import inventory
+from pokemongo_bot.cell_workers.pokemon_optimizer import PokemonOptimizer
+
+
+def pokemon(pokemon_id, family_id):
+    return MagicMock(id=pokemon_id, first_evolution_id=family_id)
+
+
+def transfer_everything(family_id, family):
+    return sorted(family, key=lambda p: p.id), [], []
+
+
+class PokemonOptimizerTest(unittest.TestCase):
+    def setUp(self):
+        self.pidgeys = [pokemon(1, 16), pokemon(2, 16)]
+        self.rattata = pokemon(3, 19)
+        self.weedle = pokemon(4, 13)
+
+        patcher = patch('pokemongo_bot.cell_workers.pokemon_optimizer.inventory')
+        self.inventory = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.inventory.POKEMON_ADDED = inventory.POKEMON_ADDED
+        self.inventory.POKEMON_REMOVED = inventory.POKEMON_REMOVED
+        self.inventory.pokemons.return_value.all.return_value = self.pidgeys + [self.rattata, self.weedle]
+        self.inventory.pokemons.return_value._data = range(10)
+
+        bot = MagicMock()
+        bot.player_store.max_pokemon_storage = 10
+        self.optimizer = PokemonOptimizer(bot, {})
+        self.optimizer.get_family_optimized = MagicMock(side_effect=transfer_everything)
+        self.optimizer.apply_optimization = MagicMock()
+
+    def planned_families(self):
+        families = [args[0] for args, _ in self.optimizer.get_family_optimized.call_args_list]
+        self.optimizer.get_family_optimized.reset_mock()
+        return sorted(families)
+
+    def transferred(self):
+        transfer, _ = self.optimizer.apply_optimization.call_args[0]
+        return sorted(p.id for p in transfer)
+
+    def test_only_changed_families_are_planned_again(self):
+        self.optimizer.work()
+        self.assertEqual(self.planned_families(), [13, 16, 19])
+        self.assertEqual(self.transferred(), [1, 2, 3, 4])
+
+        self.optimizer._on_inventory_changed(inventory.POKEMON_REMOVED, pokemon=self.rattata)
+        self.optimizer._on_inventory_changed(inventory.POKEMON_ADDED, pokemon=pokemon(5, 16))
+        self.optimizer.work()
+
+        # the emptied family loses its plan, the weedle keeps its own
+        self.assertEqual(self.planned_families(), [16])
+        self.assertEqual(self.transferred(), [1, 2, 4, 5])
+        self.assertNotIn(19, self.optimizer.plan_by_family_id)
+
+    def test_nothing_is_planned_without_change(self):
+        self.optimizer.work()
+        self.planned_families()
+
+        self.optimizer.work()
+        self.assertEqual(self.planned_families(), [])
+        self.assertEqual(self.optimizer.apply_optimization.call_count, 1)
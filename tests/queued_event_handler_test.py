@@ -0,0 +1,52 @@
+import threading
+import time
+import unittest
+
+from mock import MagicMock
+
+from pokemongo_bot.event_handlers import QueuedEventHandler
+
+
+class BlockedHandler(object):
+    def __init__(self):
+        self.release = threading.Event()
+        self.events = []
+
+    def min_level(self):
+        return 0
+
+    def handle_event(self, event, sender, level, formatted_msg, data):
+        self.release.wait()
+        self.events.append((event, data))
+
+
+class QueuedEventHandlerTest(unittest.TestCase):
+    def emit_all(self, overflow):
+        handler = BlockedHandler()
+        queued = QueuedEventHandler(handler, max_size=2, overflow=overflow, block_timeout=0.01)
+        sender = MagicMock()
+        # the first event is taken by the delivery thread, which then waits
+        queued.handle_event('first', sender, 'info', '', {})
+        while queued.stats()['pending']:
+            time.sleep(0.001)
+        for event, data in (('position_update', 1), ('other', 2), ('position_update', 3)):
+            queued.handle_event(event, sender, 'info', '', {'value': data})
+
+        handler.release.set()
+        queued.stop()
+        return handler.events, queued.stats()
+
+    def test_drop_oldest(self):
+        events, stats = self.emit_all('drop_oldest')
+        self.assertEqual(events, [('first', {}), ('other', {'value': 2}), ('position_update', {'value': 3})])
+        self.assertEqual(stats['dropped'], 1)
+
+    def test_coalesce(self):
+        events, stats = self.emit_all('coalesce')
+        self.assertEqual(events, [('first', {}), ('other', {'value': 2}), ('position_update', {'value': 3})])
+        self.assertEqual(stats['coalesced'], 1)
+        self.assertEqual(stats['dropped'], 0)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            QueuedEventHandler(BlockedHandler(), overflow='whatever')
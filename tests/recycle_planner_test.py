@@ -0,0 +1,41 @@
+import unittest
+
+from pokemongo_bot.services.recycle_planner import plan_recycling
+
+BALLS = [1, 2, 3, 4]
+POTIONS = [101, 102, 103, 104]
+BERRIES = [701, 702, 703, 704, 705]
+
+
+class RecyclePlannerTest(unittest.TestCase):
+    def test_category_caps_then_item_filter(self):
+        counts = {1: 40, 2: 30, 3: 10, 101: 15, 701: 5}
+        amounts = plan_recycling(counts, {2: 5, 101: 10, 701: 10}, [(50, BALLS)])
+
+        # the 30 balls over the maximum are pokeballs, the greatballs are
+        # then trimmed to what the filter keeps
+        self.assertEqual(list(amounts.items())[0], (1, 30))
+        self.assertEqual(dict(amounts), {1: 30, 2: 25, 101: 5})
+
+    def test_several_categories(self):
+        counts = {1: 20, 2: 20, 101: 30, 102: 10, 701: 5, 703: 5}
+        amounts = plan_recycling(counts, {}, [(30, BALLS), (20, POTIONS), (10, BERRIES)])
+
+        self.assertEqual(dict(amounts), {1: 10, 101: 20})
+
+    def test_item_in_a_category_and_the_filter(self):
+        # the cap leaves 10 pokeballs, the filter 5 of them
+        amounts = plan_recycling({1: 30, 2: 10}, {1: 5}, [(20, BALLS)])
+        self.assertEqual(dict(amounts), {1: 25})
+
+        # the filter keeps less than the cap, the cap recycles nothing more
+        amounts = plan_recycling({1: 30, 2: 10}, {2: 5}, [(20, BALLS)])
+        self.assertEqual(dict(amounts), {1: 20, 2: 5})
+
+    def test_items_missing_from_counts(self):
+        amounts = plan_recycling({1: 10}, {2: 0, 701: 5}, [(5, [3, 1]), (10, BERRIES)])
+        self.assertEqual(dict(amounts), {1: 5})
+
+    def test_nothing_to_recycle(self):
+        amounts = plan_recycling({1: 10}, {1: 20}, [(50, BALLS)])
+        self.assertEqual(dict(amounts), {})
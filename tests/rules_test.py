@@ -0,0 +1,71 @@
+import unittest
+from collections import namedtuple
+
+from mock import MagicMock
+
+from pokemongo_bot.rules import compile_rules
+
+FakePokemon = namedtuple('FakePokemon', ['pokemon_id', 'cp', 'iv'])
+
+POKEMON_LIST = [
+    {'Number': '001', 'Name': 'Bulbasaur'},
+    {'Number': '016', 'Name': 'Pidgey'},
+    {'Number': '147', 'Name': 'Dratini'}
+]
+
+
+class RulesTest(unittest.TestCase):
+    def compile(self, catch=None, release=None, vips=None):
+        config = MagicMock(catch=catch or {}, release=release or {}, vips=vips or {})
+        return compile_rules(config, POKEMON_LIST)
+
+    def test_catch_rules(self):
+        catch = self.compile(catch={
+            'any': {'catch_above_cp': 100, 'catch_above_iv': 0.5, 'logic': 'or'},
+            'Pidgey': {'never_catch': True},
+            'Dratini': {'always_catch': True}
+        }).catch
+
+        self.assertTrue(catch.matches(FakePokemon(1, 200, 0.1)))
+        self.assertFalse(catch.matches(FakePokemon(1, 50, 0.1)))
+        self.assertFalse(catch.matches(FakePokemon(16, 500, 1.0)))
+        self.assertTrue(catch.matches(FakePokemon(147, 10, 0.0)))
+        # species unknown to the static data use the any rule
+        self.assertTrue(catch.matches(FakePokemon(999, 200, 0.1)))
+
+    def test_without_rule_nothing_is_caught(self):
+        self.assertFalse(self.compile().catch.matches(FakePokemon(1, 5000, 1.0)))
+
+    def test_empty_vip_rule_matches_the_species(self):
+        vips = self.compile(vips={'Dratini': {}, 'any': {'catch_above_cp': 1000, 'catch_above_iv': 0.9}}).vips
+        self.assertTrue(vips.matches(FakePokemon(147, 10, 0.0)))
+        self.assertFalse(vips.matches(FakePokemon(16, 10, 0.5)))
+        self.assertTrue(vips.matches(FakePokemon(16, 10, 0.95)))
+
+    def test_release_rules_inherit_any(self):
+        release = self.compile(release={
+            'any': {'release_below_cp': 100, 'release_below_iv': 0.5, 'logic': 'or'},
+            'Pidgey': {},
+            'Dratini': {'release_below_cp': 300},
+        }).release
+
+        self.assertTrue(release.matches(FakePokemon(16, 500, 0.1)))
+        # logic of the any rule, and no iv limit
+        self.assertTrue(release.matches(FakePokemon(147, 200, 0.9)))
+        self.assertFalse(release.matches(FakePokemon(147, 400, 0.1)))
+
+    def test_batch_evaluation_matches_single_evaluation(self):
+        rules = self.compile(
+            catch={'any': {'catch_above_cp': 100, 'catch_above_iv': 0.5}, 'Pidgey': {'never_catch': True}},
+            release={'any': {'release_below_cp': 100, 'release_below_iv': 0.5, 'logic': 'or'},
+                     'Dratini': {'never_release': True}}
+        )
+        pokemons = [FakePokemon(pokemon_id, cp, iv)
+                    for pokemon_id in (1, 16, 147, 999)
+                    for cp in (50, 150)
+                    for iv in (0.2, 0.8)]
+
+        for table in (rules.catch, rules.release):
+            self.assertEqual(list(table.matches_many(pokemons)),
+                             [table.matches(pokemon) for pokemon in pokemons])
+        self.assertEqual(len(rules.catch.matches_many([])), 0)
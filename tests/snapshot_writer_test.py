@@ -0,0 +1,56 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from pokemongo_bot.snapshot_writer import SnapshotWriter
+
+
+class SnapshotWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'location.json')
+        self.writer = SnapshotWriter({'location': 10})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def test_unchanged_content_is_not_written(self):
+        self.assertTrue(self.writer.write(self.path, {'lat': 1}))
+        self.assertFalse(self.writer.write(self.path, {'lat': 1}))
+        self.assertTrue(self.writer.write(self.path, {'lat': 2}))
+
+        self.assertEqual(self.read(), {'lat': 2})
+        self.assertEqual(self.writer.counters['written'], 2)
+        self.assertEqual(self.writer.counters['unchanged'], 1)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_changes_are_deferred_until_the_interval(self):
+        with patch('pokemongo_bot.snapshot_writer.time.time', return_value=100):
+            self.assertTrue(self.writer.write(self.path, {'lat': 1}, kind='location'))
+            self.assertFalse(self.writer.write(self.path, {'lat': 2}, kind='location'))
+            self.assertFalse(self.writer.write(self.path, {'lat': 3}, kind='location'))
+        self.assertEqual(self.read(), {'lat': 1})
+
+        # the latest pending change is written by the next write once overdue
+        with patch('pokemongo_bot.snapshot_writer.time.time', return_value=111):
+            self.writer.write(os.path.join(self.directory, 'other.json'), {})
+        self.assertEqual(self.read(), {'lat': 3})
+
+    def test_flush_writes_pending_changes(self):
+        self.writer.write(self.path, {'lat': 1}, kind='location')
+        self.writer.write(self.path, {'lat': 2}, kind='location')
+        self.writer.flush()
+        self.assertEqual(self.read(), {'lat': 2})
+
+    def test_serialized_payload(self):
+        payload = '{{"cells": {}}}'.format(SnapshotWriter.serialize([1, 2]))
+        self.writer.write(self.path, payload=payload)
+        self.assertEqual(self.read(), {'cells': [1, 2]})
@@ -0,0 +1,80 @@
+import json
+import unittest
+
+from pokemongo_bot.state_api.app import StateApi
+from pokemongo_bot.state_api.store import StateStore
+
+
+class StateApiTest(unittest.TestCase):
+    def setUp(self):
+        self.store = StateStore()
+        self.app = StateApi(self.store)
+
+    def request(self, path, query='', etag=None, method='GET'):
+        environ = {'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query}
+        if etag:
+            environ['HTTP_IF_NONE_MATCH'] = etag
+        response = {}
+
+        def start_response(status, headers):
+            response['status'] = int(status.split()[0])
+            response['headers'] = dict(headers)
+
+        body = ''.join(self.app(environ, start_response))
+        response['body'] = json.loads(body) if body else None
+        return response
+
+    def test_unchanged_values_keep_their_version(self):
+        self.assertTrue(self.store.update('position', {'lat': 1}))
+        self.assertFalse(self.store.update('position', {'lat': 1}))
+        self.assertEqual(self.store.version, 1)
+
+    def test_since_only_returns_changed_sections(self):
+        self.store.update('position', {'lat': 1})
+        self.store.update('metrics', {'xp': 10})
+        self.store.update('position', {'lat': 2})
+
+        response = self.request('/state', 'since=2')
+        self.assertEqual(response['status'], 200)
+        self.assertEqual(response['body']['version'], 3)
+        self.assertEqual(response['body']['sections'], {'position': {'lat': 2}})
+
+        response = self.request('/state')
+        self.assertEqual(set(response['body']['sections']), {'position', 'metrics'})
+
+    def test_section_and_etag(self):
+        self.store.update('position', {'lat': 1})
+
+        response = self.request('/state/position')
+        self.assertEqual(response['body'], {'version': 1, 'data': {'lat': 1}})
+
+        etag = response['headers']['ETag']
+        self.assertEqual(self.request('/state/position', etag=etag)['status'], 304)
+
+        self.store.update('position', {'lat': 2})
+        self.assertEqual(self.request('/state/position', etag=etag)['status'], 200)
+
+    def test_head_has_no_body(self):
+        self.store.update('position', {'lat': 1})
+
+        response = self.request('/state/position', method='HEAD')
+        self.assertEqual(response['status'], 200)
+        self.assertIsNone(response['body'])
+        self.assertNotEqual(response['headers']['Content-Length'], '0')
+
+    def test_new_store_continues_the_versions(self):
+        self.store.update('position', {'lat': 1})
+        self.store.update('position', {'lat': 2})
+
+        store = StateStore()
+        store.update('position', {'lat': 3})
+        store.continue_from(self.store)
+        self.app.store = store
+
+        response = self.request('/state', 'since=2')
+        self.assertEqual(response['body']['version'], 3)
+        self.assertEqual(response['body']['sections'], {'position': {'lat': 3}})
+
+    def test_errors(self):
+        self.assertEqual(self.request('/state/unknown')['status'], 404)
+        self.assertEqual(self.request('/state', 'since=abc')['status'], 400)
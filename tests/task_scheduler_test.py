@@ -0,0 +1,80 @@
+import unittest
+
+from mock import patch
+
+from pokemongo_bot.base_task import BaseTask
+from pokemongo_bot.task_scheduler import TaskScheduler
+from pokemongo_bot.worker_result import WorkerResult
+from tests import FakeBot
+
+
+class FakeTask(BaseTask):
+    SUPPORTED_TASK_API_VERSION = 1
+
+    def work(self):
+        pass
+
+
+class IntervalTask(FakeTask):
+    RUN_INTERVAL = 60
+
+
+class TriggeredTask(FakeTask):
+    TRIGGER_EVENTS = ('inventory_changed',)
+
+
+class LongTask(TriggeredTask):
+    def initialize(self):
+        self.steps = 2
+
+    def work(self):
+        self.steps -= 1
+        return WorkerResult.RUNNING if self.steps else WorkerResult.SUCCESS
+
+
+class TaskSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = FakeBot()
+        self.bot.position = (0, 0, 0)
+        self.scheduler = TaskScheduler(self.bot)
+
+    def run_tick(self, workers):
+        ran = []
+        for task in self.scheduler.due_tasks(workers):
+            self.scheduler.run_task(task)
+            ran.append(task)
+        return ran
+
+    def test_unscheduled_tasks_run_every_tick(self):
+        task = FakeTask(self.bot, {})
+        self.assertEqual(self.run_tick([task]), [task])
+        self.assertEqual(self.run_tick([task]), [task])
+
+    @patch('pokemongo_bot.task_scheduler.time.time')
+    def test_interval(self, mock_time):
+        task = IntervalTask(self.bot, {})
+        mock_time.return_value = 1000
+        self.assertEqual(self.run_tick([task]), [task])
+        mock_time.return_value = 1030
+        self.assertEqual(self.run_tick([task]), [])
+        mock_time.return_value = 1061
+        self.assertEqual(self.run_tick([task]), [task])
+
+    def test_triggers(self):
+        task = TriggeredTask(self.bot, {})
+        self.assertEqual(self.run_tick([task]), [task])
+        self.assertEqual(self.run_tick([task]), [])
+
+        self.scheduler.handle_event('pokemon_caught', self.bot, 'info', '', {})
+        self.assertEqual(self.run_tick([task]), [task])
+
+    def test_running_task_is_due_again(self):
+        task = LongTask(self.bot, {})
+        self.assertEqual(self.run_tick([task]), [task])
+        self.assertEqual(self.run_tick([task]), [task])
+        self.assertEqual(self.run_tick([task]), [])
+
+    def test_schedule_config_and_priority(self):
+        first = FakeTask(self.bot, {})
+        second = FakeTask(self.bot, {'schedule': {'priority': 1}})
+        self.assertEqual(self.run_tick([first, second]), [second, first])
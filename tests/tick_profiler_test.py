@@ -0,0 +1,46 @@
+import time
+import unittest
+
+from mock import patch
+
+from pokemongo_bot.tick_profiler import TickProfiler
+from tests import FakeBot
+
+
+class TickProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = FakeBot()
+        self.profiler = TickProfiler(self.bot, enabled=True, dump_interval=3600)
+        self.profiler.start()
+
+    def tearDown(self):
+        with patch.object(self.profiler, 'dump'):
+            self.profiler.stop()
+
+    def test_phases_are_recorded(self):
+        self.profiler.start_tick()
+        with self.profiler.phase('Worker'):
+            time.sleep(0.01)
+            self.profiler.record_rpc(['GET_PLAYER', 'GET_INVENTORY'], 0.2)
+        self.profiler.end_tick()
+
+        summary = self.profiler.summary()
+        self.assertEqual(summary['ticks_in_window'], 1)
+
+        phase = summary['phases']['Worker']
+        self.assertEqual(phase['runs'], 1)
+        self.assertEqual(phase['rpc_count'], 1)
+        self.assertAlmostEqual(phase['rpc_time'], 0.2)
+        self.assertGreater(phase['sleep'], 0)
+        self.assertGreaterEqual(phase['wall'], phase['sleep'])
+        self.assertEqual(summary['rpc_by_type']['GET_PLAYER']['count'], 1)
+
+    def test_disabled_profiler_records_nothing(self):
+        profiler = TickProfiler(self.bot)
+        profiler.start_tick()
+        with profiler.phase('Worker'):
+            profiler.record_rpc(['GET_PLAYER'], 0.2)
+        profiler.end_tick()
+
+        self.assertEqual(profiler.summary()['ticks_in_window'], 0)
+        self.assertEqual(profiler.rpc_by_type, {})
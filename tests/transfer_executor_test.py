@@ -0,0 +1,48 @@
+import unittest
+
+from mock import MagicMock, patch
+
+from pokemongo_bot.services.transfer_executor import TransferExecutor
+
+
+def pokemon_item(pokemon_id):
+    return {'inventory_item_data': {'pokemon_data': {'id': pokemon_id}}}
+
+
+@patch('pokemongo_bot.services.transfer_executor.action_delay')
+@patch('pokemongo_bot.services.transfer_executor.inventory')
+class TransferExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = MagicMock()
+        self.bot.config.test = False
+        self.pokemons = [MagicMock(id=index, pokemon_id=16) for index in range(1, 6)]
+
+    def test_batches_share_a_request_and_a_delay(self, inventory, action_delay):
+        request = self.bot.api.create_request.return_value
+        request.call.return_value = {'responses': {
+            'RELEASE_POKEMON': {'result': 1},
+            'GET_INVENTORY': {'inventory_delta': {'inventory_items': [pokemon_item(2)]}}
+        }}
+        self.bot.api.release_pokemon.return_value = {'responses': {
+            'RELEASE_POKEMON': {'result': 1, 'candy_awarded': 1}
+        }}
+
+        results = TransferExecutor(self.bot, batch_size=2).release(self.pokemons)
+
+        self.assertEqual([(result.pokemon.id, result.released, result.candy_awarded) for result in results],
+                         [(1, True, None), (2, False, None), (3, True, None), (4, True, None), (5, True, 1)])
+        # two batches of two chained with an inventory, and a single release
+        self.assertEqual(request.release_pokemon.call_count, 4)
+        self.assertEqual(request.get_inventory.call_count, 2)
+        self.assertEqual(inventory.refresh_inventory.call_count, 2)
+        self.bot.api.release_pokemon.assert_called_once_with(pokemon_id=5)
+        inventory.pokemons.return_value.remove.assert_called_once_with(5)
+        self.assertEqual(action_delay.call_count, 3)
+
+    def test_failed_single_release(self, inventory, action_delay):
+        self.bot.api.release_pokemon.return_value = {'responses': {'RELEASE_POKEMON': {'result': 2}}}
+
+        results = TransferExecutor(self.bot, batch_size=2).release(self.pokemons[:1])
+
+        self.assertFalse(results[0].released)
+        self.assertFalse(inventory.pokemons.return_value.remove.called)
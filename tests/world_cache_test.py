@@ -0,0 +1,68 @@
+import unittest
+
+from mock import patch
+
+from pokemongo_bot.world_cache import WorldCache
+
+LAT, LNG = 40.7580, -73.9855
+
+
+def make_cell(cell_id, timestamp, **content):
+    cell = {'s2_cell_id': cell_id, 'current_timestamp_ms': timestamp}
+    cell.update(content)
+    return cell
+
+
+class WorldCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = WorldCache()
+
+    def test_needs_every_cell_fresh_and_close(self):
+        with patch('time.time', return_value=1000):
+            self.cache.store([make_cell(1, 5000), make_cell(2, 5000)], LAT, LNG)
+
+        with patch('time.time', return_value=1005):
+            self.assertEqual(len(self.cache.lookup([1, 2], LAT, LNG, 10, 50)), 2)
+            self.assertIsNone(self.cache.lookup([1, 2, 3], LAT, LNG, 10, 50))
+            self.assertIsNone(self.cache.lookup([1, 2], LAT + 0.01, LNG, 10, 50))
+            self.assertIsNone(self.cache.lookup([1, 2], LAT, LNG, 2, 50))
+
+        self.assertEqual(self.cache.counters, {'hits': 1, 'misses': 3})
+
+    def test_old_cells_keep_their_forts(self):
+        cell = make_cell(1, 5000, forts=[{'id': 'a', 'lure_info': {'lure_expires_timestamp_ms': 900000}}],
+                         wild_pokemons=[{'encounter_id': 1}], nearby_pokemons=[{'pokemon_id': 16}])
+        with patch('time.time', return_value=1000):
+            self.cache.store([cell], LAT, LNG)
+
+        with patch('time.time', return_value=1100):
+            self.assertIsNone(self.cache.lookup([1], LAT, LNG, 10, 50))
+            old = self.cache.lookup([1], LAT + 0.01, LNG, 10, 50, pokemons_required=False)[0]
+
+        self.assertEqual(old['forts'], cell['forts'])
+        self.assertNotIn('wild_pokemons', old)
+        self.assertNotIn('nearby_pokemons', old)
+
+    def test_keeps_the_latest_observation(self):
+        self.cache.store([make_cell(1, 5000, forts=[{'id': 'new'}])], LAT, LNG)
+        self.cache.store([make_cell(1, 4000, forts=[{'id': 'old'}])], LAT, LNG)
+        self.assertEqual(self.cache.lookup([1], LAT, LNG, 10, 50)[0]['forts'], [{'id': 'new'}])
+
+    def test_expired_pokemon_and_lures_are_left_out(self):
+        cell = make_cell(
+            1, 5000,
+            catchable_pokemons=[{'encounter_id': 1, 'expiration_timestamp_ms': 6000},
+                                {'encounter_id': 2, 'expiration_timestamp_ms': 9000}],
+            forts=[{'id': 'a', 'lure_info': {'lure_expires_timestamp_ms': 6000}}]
+        )
+        with patch('time.time', return_value=1000):
+            self.cache.store([cell], LAT, LNG)
+
+        with patch('time.time', return_value=1002):
+            fresh = self.cache.lookup([1], LAT, LNG, 10, 50)[0]
+
+        self.assertEqual([p['encounter_id'] for p in fresh['catchable_pokemons']], [2])
+        self.assertEqual(fresh['forts'], [{'id': 'a'}])
+        # the cached cell is left untouched
+        self.assertEqual(len(cell['catchable_pokemons']), 2)
+        self.assertIn('lure_info', cell['forts'][0])